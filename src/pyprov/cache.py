@@ -0,0 +1,104 @@
+'''
+Bounded in-memory cache for lookups in the provenance store.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import collections
+import threading
+import time
+
+CACHE_SIZE = 10000
+CACHE_TTL = 300.0
+
+class LookupCache(object):
+    """A thread-safe cache which evicts the least recently used entries.
+
+    Entries can expire after a time-to-live, so changes made by other
+    clients of the store become visible after a while.
+
+    parameters:
+    size -- maximum number of entries
+    ttl -- seconds until an entry expires or None if entries never expire
+    entries -- cached values and their expiry time by key (OrderedDict)
+    hits -- number of successful lookups
+    misses -- number of lookups without a valid entry
+    evictions -- number of entries removed because the cache was full
+    """
+    def __init__(self, size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached value for a key or None if there is no valid entry"""
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None or (entry[1] is not None and entry[1] < time.time()):
+                self.misses += 1
+                return None
+            self.entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """Add or replace the value for a key"""
+        expires = time.time() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (value, expires)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def take(self, key):
+        """Remove the entry for a key and return its value or None if there is no valid entry"""
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None or (entry[1] is not None and entry[1] < time.time()):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def refresh(self, key, value):
+        """Replace the value for a key, but only if the key is cached already"""
+        with self.lock:
+            if key in self.entries:
+                self.entries[key] = (value, self.entries[key][1])
+
+    def invalidate(self, key):
+        """Remove the entry for a key"""
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        """Remove all entries"""
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """Return a dictionary with the size and the hit and miss counts of the cache"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'size':len(self.entries), 'hits':self.hits, 'misses':self.misses,
+                    'evictions':self.evictions,
+                    'hit_rate':float(self.hits) / lookups if lookups else 0.0}
@@ -0,0 +1,284 @@
+'''
+Combining the store calls of concurrent requests.
+
+Most of the time of a write is spent waiting for the database. With many requests
+in flight, the lookups and batches of all requests which arrive while the previous
+ones are written are combined into a single call to the store, so the number of
+round trips grows with the number of combined calls instead of the number of requests.
+
+The calls work with threads and with greenlets of a server patched by gevent alike.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import collections
+import logging
+import threading
+from pyprov.cache import LookupCache
+from pyprov.pool import PoolTimeout
+from pyprov.store import NODE, BatchReference, WriteBatch
+
+logger = logging.getLogger(__name__)
+
+MAX_CALLS = 500
+WORKERS = 2
+
+# the property which identifies a node of a provenance type, nodes with the same value are created once
+IDENTITY_KEYS = {'ENTITY':'entity', 'AGENT':'identifier'}
+
+class InvalidBatch(ValueError):
+    """The operations of a batch can't be combined with the others, nothing was sent to the store"""
+
+def _unsent(error):
+    """Return True if a failed combined write surely didn't reach the store"""
+    return isinstance(error, (InvalidBatch, PoolTimeout))
+
+class Pending(object):
+    """The result of a call which is run later (see Coalescer.call_async).
+
+    parameters:
+    value -- the result of the call, once it's done
+    error -- the exception raised by the call or None
+    """
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+    def done(self):
+        """Return True if the call is done"""
+        return self.event.is_set()
+
+    def set_result(self, value):
+        self.value = value
+        self.event.set()
+
+    def set_error(self, error):
+        self.error = error
+        self.event.set()
+
+    def result(self, timeout=None):
+        """Wait until the call is done and return its result or raise its exception.
+
+        keyword arguments:
+        timeout -- seconds to wait at most or None to wait until the call is done
+        """
+        if not self.event.wait(timeout):
+            raise RuntimeError('the call is not done after %s s' % timeout)
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+class Coalescer(object):
+    """Run the calls of concurrent callers combined.
+
+    A call is never delayed to wait for others: an idle worker runs it right away.
+    While all workers are busy, the calls arriving meanwhile are collected and
+    the next free worker runs up to 'max_calls' of them with a single call of 'combine'.
+    If a combined call fails and 'split' allows it for the error, its calls are run one
+    by one, so a bad call fails alone. Otherwise all of them fail with the error.
+
+    parameters:
+    combine -- function which takes a list of arguments and returns a list with the result for every argument
+    split -- function which returns True if the calls of a combined call which raised an error
+             may be run again one by one, None to run them again after any error
+    max_calls -- maximum number of calls combined
+    calls -- number of calls
+    combined -- number of combined calls of 'combine'
+    """
+    def __init__(self, combine, max_calls=MAX_CALLS, workers=WORKERS, name='coalesce', split=None):
+        self.combine = combine
+        self.split = split
+        self.max_calls = max_calls
+        self.queue = collections.deque()
+        self.condition = threading.Condition(threading.Lock())
+        self.workers = [threading.Thread(target=self._work, name='%s-%d' % (name, i)) for i in xrange(workers)]
+        self.running = False
+        self.calls = 0
+        self.combined = 0
+
+    def start(self):
+        """Start all workers"""
+        self.running = True
+        for worker in self.workers:
+            worker.daemon = True
+            worker.start()
+
+    def stop(self):
+        """Run all collected calls, then stop the workers"""
+        if not self.running:
+            return
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        for worker in self.workers:
+            worker.join()
+
+    def call_async(self, argument):
+        """Collect a call and return its result (Pending), run it right away if the workers are stopped"""
+        pending = Pending()
+        with self.condition:
+            if self.running:
+                self.queue.append((argument, pending))
+                self.condition.notify()
+                return pending
+        self._run([(argument, pending)])
+        return pending
+
+    def call(self, argument):
+        """Run a call combined with the concurrent ones and return its result"""
+        return self.call_async(argument).result()
+
+    def _work(self):
+        """Run the collected calls until the coalescer is stopped and no call is left"""
+        while True:
+            with self.condition:
+                while not self.queue and self.running:
+                    self.condition.wait()
+                if not self.queue:
+                    return
+                items = [self.queue.popleft() for _ in xrange(min(len(self.queue), self.max_calls))]
+            self._run(items)
+
+    def _run(self, items):
+        with self.condition:
+            self.calls += len(items)
+            self.combined += 1
+        try:
+            results = self.combine([argument for argument, _ in items])
+        # the store may raise anything, it's passed on to the callers
+        except Exception as e:
+            if len(items) > 1 and (self.split is None or self.split(e)):
+                logger.debug('combined call of %d failed, running them one by one: %r', len(items), e)
+                for item in items:
+                    self._run([item])
+            else:
+                for _, pending in items:
+                    pending.set_error(e)
+            return
+        for (_, pending), result in zip(items, results):
+            pending.set_result(result)
+
+    def stats(self):
+        """Return the number of calls and of combined calls"""
+        with self.condition:
+            return {'calls':self.calls, 'combined':self.combined, 'waiting':len(self.queue)}
+
+class CoalescingStore(object):
+    """The asynchronous interface of a provenance store, combining the calls of concurrent requests.
+
+    'find_nodes_async' and 'submit_batch_async' return a Pending result at once.
+    'find_nodes' and 'submit_batch' wait for it, so the DevFactory can use this
+    store like any other one. All other attributes are the ones of the store.
+
+    Combined batches are written one after another and create nodes which identify
+    the same entity or actor (see IDENTITY_KEYS) only once. Nodes created by earlier
+    combined batches are remembered and reused, so concurrent processes of the same
+    entity are connected although none of them found it when they looked it up.
+    A combined batch which failed may be written nevertheless, e.g. if the connection
+    broke after it was sent, so its batches are only written one by one again if it
+    surely didn't reach the store (see '_unsent'), otherwise all of them fail.
+
+    parameters:
+    store -- the provenance store to write to (ProvenanceStore)
+    lookups -- the coalescer of the calls of 'find_nodes' (Coalescer)
+    writes -- the coalescer of the calls of 'submit_batch' (Coalescer)
+    created -- the latest nodes created by combined batches by identity (LookupCache)
+    """
+    def __init__(self, store, max_calls=MAX_CALLS, workers=WORKERS):
+        self.store = store
+        self.lookups = Coalescer(self._find_all, max_calls, workers, 'coalesce-lookups')
+        self.writes = Coalescer(self._submit_all, max_calls, 1, 'coalesce-writes', _unsent)
+        self.created = LookupCache()
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def start(self):
+        self.lookups.start()
+        self.writes.start()
+
+    def stop(self):
+        """Write all collected batches and stop combining calls"""
+        self.lookups.stop()
+        self.writes.stop()
+
+    def create_batch(self):
+        return WriteBatch(self)
+
+    def find_nodes_async(self, pairs):
+        """Find the latest node for every key-value pair later, return the list of nodes (Pending)"""
+        return self.lookups.call_async(pairs)
+
+    def find_nodes(self, pairs):
+        return self.find_nodes_async(pairs).result()
+
+    def submit_batch_async(self, batch):
+        """Write a batch later, return the list of created items (Pending)"""
+        return self.writes.call_async(batch)
+
+    def submit_batch(self, batch):
+        return self.submit_batch_async(batch).result()
+
+    def _find_all(self, calls):
+        """Look up the pairs of all calls with a single call of the store"""
+        pairs = list(set(pair for pairs in calls for pair in pairs))
+        nodes = dict(zip(pairs, self.store.find_nodes(pairs)))
+        return [[nodes[pair] for pair in pairs] for pairs in calls]
+
+    def _submit_all(self, batches):
+        """Write the operations of all batches with a single batch of the store"""
+        combined = self.store.create_batch()
+        identities = {}
+        references = []
+        for batch in batches:
+            translated = []
+            for operation in batch.operations:
+                if operation[0] == NODE:
+                    _, prov_type, sdm_type, properties = operation
+                    key = IDENTITY_KEYS.get(prov_type)
+                    identity = (key, properties[key]) if key in properties else None
+                    reference = None
+                    if identity:
+                        reference = identities.get(identity) or self.created.get(identity)
+                    if reference is None:
+                        reference = combined.create_node(prov_type, sdm_type, **properties)
+                        if identity:
+                            identities[identity] = reference
+                else:
+                    _, rel_type, start_node, end_node, properties = operation
+                    try:
+                        if isinstance(start_node, BatchReference):
+                            start_node = translated[start_node.index]
+                        if isinstance(end_node, BatchReference):
+                            end_node = translated[end_node.index]
+                    except IndexError:
+                        raise InvalidBatch('a relationship refers to a later node of its batch')
+                    reference = combined.create_relationship(rel_type, start_node, end_node, **properties)
+                translated.append(reference)
+            references.append(translated)
+        results = self.store.submit_batch(combined)
+        for identity, reference in identities.iteritems():
+            self.created.put(identity, results[reference.index])
+        return [[results[reference.index] if isinstance(reference, BatchReference) else reference
+                 for reference in translated] for translated in references]
+
+    def stats(self):
+        """Return the statistics of the lookup and write coalescers by kind"""
+        return {'lookup':self.lookups.stats(), 'write':self.writes.stats()}
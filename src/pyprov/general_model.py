@@ -20,29 +20,123 @@ Created on 05.04.2013
 '''
 
 import provenance_model as pm
-   
+from pyprov.store import entity_key
+
+# maximum number of interned identifiers, the table starts anew when it's full
+INTERNED_SIZE = 100000
+
+_interned = {}
+
+def intern_identifier(identifier):
+    """Return the same object for equal identifiers
+    
+    Actors and entities recur in many requests, so the identifiers kept by caches
+    and indexes are shared instead of being copied for every request.
+    """
+    try:
+        return _interned[identifier]
+    except KeyError:
+        if len(_interned) >= INTERNED_SIZE:
+            _interned.clear()
+        _interned[identifier] = identifier
+        return identifier
+
+def _entities(cls, items, param):
+    """Return an entity of class 'cls' for every decoded JSON object of 'items' or raise a ValueError"""
+    if not isinstance(items, list):
+        raise ValueError(param + ' must be a list')
+    entities = []
+    for item in items:
+        try:
+            entities.append(cls(item['identifier'], item['version']))
+        except (KeyError, TypeError):
+            raise ValueError('every ' + param + ' needs an identifier and a version')
+    return entities
+
 class Process(pm.Activity):
+    __slots__ = ('name', 'actor', 'inp', 'outp')
+    
     def __init__(self, name, inps, outps, actor):
         self.name = name
         self.actor = Actor(actor)
+        self.inp = [Inp(inp['identifier'], inp['version']) for inp in inps]
+        self.outp = [Outp(outp['identifier'], outp['version']) for outp in outps]
+    
+    @classmethod
+    def from_json(cls, record):
+        """Create a process from its decoded JSON object in one pass, validating it on the way.
+        
+        Raise a ValueError with a short description if the record is incomplete.
+        
+        arguments:
+        record -- the decoded JSON object of one process (dict)
+        """
+        if not isinstance(record, dict):
+            raise ValueError('a process must be a JSON object')
+        try:
+            name, inps, outps, actor = record['process'], record['input'], record['output'], record['actor']
+        except KeyError as e:
+            raise ValueError('missing parameter: ' + e.args[0])
+        process = cls.__new__(cls)
+        process.name = name
+        process.inp = _entities(Inp, inps, 'input')
+        process.outp = _entities(Outp, outps, 'output')
+        process.actor = Actor(actor)
+        return process
+    
+    @classmethod
+    def of(cls, *args, **kwargs):
+        """Return the process given by the arguments of a general process
         
-        self.inp = []
-        self.outp = []
-        for inp in inps:
-            self.inp.append(Inp(inp['identifier'], inp['version']))
-        for outp in outps:
-            self.outp.append(Outp(outp['identifier'], outp['version']))
+        These are a Process, its decoded JSON object or the name, inputs, outputs and actor.
+        """
+        if len(args) == 1 and not kwargs:
+            if isinstance(args[0], cls):
+                return args[0]
+            if isinstance(args[0], dict):
+                return cls.from_json(args[0])
+        return cls(*args, **kwargs)
+    
+    def to_json(self):
+        """Return the JSON object of the process, as accepted by 'from_json'"""
+        return {'process':self.name, 'actor':self.actor.identifier,
+                'input':[{'identifier':inp.identifier, 'version':inp.version} for inp in self.inp],
+                'output':[{'identifier':outp.identifier, 'version':outp.version} for outp in self.outp]}
 
 class Inp(pm.Entity):
+    __slots__ = ('identifier', 'version', '_key')
+    
     def __init__(self, identifier, version):
-        self.identifier = identifier
+        self.identifier = intern_identifier(identifier)
         self.version = version
+    
+    @property
+    def key(self):
+        """The value of the 'entity' property of the input (see entity_key)"""
+        try:
+            return self._key
+        except AttributeError:
+            self._key = entity_key(self.identifier, self.version)
+            return self._key
 
 class Outp(pm.Entity):
+    __slots__ = ('identifier', 'version', '_key')
+    
     def __init__(self, identifier, version):
-        self.identifier = identifier
+        self.identifier = intern_identifier(identifier)
         self.version = version
+    
+    @property
+    def key(self):
+        """The value of the 'entity' property of the output (see entity_key)"""
+        try:
+            return self._key
+        except AttributeError:
+            self._key = entity_key(self.identifier, self.version)
+            return self._key
         
 class Actor(pm.Agent):
+    __slots__ = ('identifier',)
+    
     def __init__(self, identifier):
-        self.identifier = identifier
+        self.identifier = intern_identifier(identifier)
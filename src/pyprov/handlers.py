@@ -0,0 +1,208 @@
+'''
+The handlers of the DevFactory, one for every type of provenance it writes.
+
+A handler decodes the records of its model type, names the nodes they refer to,
+so the factory looks them up with a single call for a whole batch, and plans the
+nodes and relationships of every record into a WriteBatch. Besides general processes,
+every relation of PROV-DM between two elements has a handler, so clients write a
+derivation or an attribution with one call.
+
+Handlers are registered by model type (see 'register'), which is also the name
+of their route below '/prov'.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import abc
+
+import pyprov.general_model as genm
+import pyprov.provenance_model as pm
+from pyprov.store import entity_key
+
+# the handlers of the DevFactory by model type
+HANDLERS = {}
+
+def register(model_type, handler):
+    """Register the handler of a model type, replacing the one registered before"""
+    HANDLERS[model_type] = handler
+
+def element_pair(kind, reference):
+    """Return the key-value pair which finds the latest node of a referred element"""
+    if kind == pm.ENTITY:
+        return ('entity', entity_key(*reference))
+    if kind == pm.AGENT:
+        return ('identifier', reference)
+    return ('name', reference)
+
+class Handler(object):
+    """Write the records of one model type.
+
+    'decode' returns the record of the arguments of DevFactory.create, 'lookups' the
+    key-value pairs of the stored nodes a record refers to and 'plan' adds the nodes
+    and relationships of a record to a batch. Observers of the DevFactory are informed
+    about every written record with their method named by 'event', if they have one.
+    """
+    __metaclass__ = abc.ABCMeta
+
+    event = None
+
+    @abc.abstractmethod
+    def decode(self, *args, **kwargs):
+        """Return the record of the arguments of DevFactory.create"""
+        pass
+
+    @abc.abstractmethod
+    def from_json(self, record):
+        """Return the record of a decoded JSON object, raise a ValueError if it's invalid"""
+        pass
+
+    def lookups(self, record):
+        return ()
+
+    @abc.abstractmethod
+    def plan(self, batch, record, known):
+        """Add all nodes and relationships of a record to a batch
+
+        Nodes which are already known are reused, all others are created with the
+        batch and added to the known ones, so the following records of the same batch
+        reuse them as well.
+
+        arguments:
+        batch -- the batch to collect the nodes and relationships (WriteBatch)
+        record -- the record to write
+        known -- dictionary of stored or batched nodes by key-value pair (see 'lookups')
+        """
+        pass
+
+class GeneralHandler(Handler):
+    """Save general process information.
+
+    required params:
+        process - the name of the process
+        input   - a list of inputs with an identifier and a version number
+        output  - a list of outputs with an identifier and a version number
+        actor   - the associated user
+
+    optional params:
+        None
+    """
+    event = 'process_written'
+
+    def decode(self, *args, **kwargs):
+        return genm.Process.of(*args, **kwargs)
+
+    def from_json(self, record):
+        return genm.Process.from_json(record)
+
+    def lookups(self, process):
+        """Entities are identified by their identifier and version, so an entity which
+        was already used or generated by another process is not written again."""
+        pairs = [('identifier', process.actor.identifier)]
+        for entity in process.inp:
+            pairs.append(('entity', entity.key))
+        for entity in process.outp:
+            pairs.append(('entity', entity.key))
+        return pairs
+
+    def plan(self, batch, process, known):
+        process_node = batch.create_process(process.name)
+
+        actor_node = known.get(('identifier', process.actor.identifier))
+        if not actor_node:
+            actor_node = known[('identifier', process.actor.identifier)] = batch.create_actor(process.actor)
+
+        for inp in process.inp:
+            key = ('entity', inp.key)
+            input_node = known.get(key)
+            if not input_node:
+                input_node = known[key] = batch.create_input(inp)
+            batch.create_relationship('USED', process_node, input_node)
+
+        for outp in process.outp:
+            key = ('entity', outp.key)
+            output_node = known.get(key)
+            if not output_node:
+                output_node = known[key] = batch.create_output(outp)
+            batch.create_relationship('WAS_GENERATED_BY', output_node, process_node)
+
+        batch.create_relationship('WAS_ASSOCIATED_WITH', process_node, actor_node)
+
+class RelationHandler(Handler):
+    """Write a relation of PROV-DM as one relationship between the nodes of its elements.
+
+    Entities are referred to by identifier and version (a JSON object like the inputs of
+    a general process), activities by the name of their latest process and agents by
+    their identifier. Elements which are not stored yet are created. All other params
+    of the relation are stored as properties of the relationship.
+
+    parameters:
+    relation -- the class of the relation (provenance_model.Relation)
+    rel_type -- the type of its relationship
+    """
+    def __init__(self, relation, rel_type, event=None):
+        self.relation = relation
+        self.rel_type = rel_type
+        self.event = event
+        roles = [name for name, _ in relation.ROLES]
+        self.__doc__ = 'Save a relation %s.\n\nrequired params:\n%s\n\noptional params:\n%s\n' % (
+            rel_type, '\n'.join('    ' + name for name in roles),
+            '\n'.join('    ' + name for name in relation.__slots__ if name not in roles))
+
+    def decode(self, *args, **kwargs):
+        if len(args) == 1 and not kwargs:
+            if isinstance(args[0], self.relation):
+                return args[0]
+            if isinstance(args[0], dict):
+                return self.relation.from_json(args[0])
+        return self.relation(*args, **kwargs)
+
+    def from_json(self, record):
+        return self.relation.from_json(record)
+
+    def lookups(self, relation):
+        return [element_pair(kind, getattr(relation, name)) for name, kind in relation.ROLES]
+
+    def plan(self, batch, relation, known):
+        nodes = []
+        for name, kind in relation.ROLES:
+            reference = getattr(relation, name)
+            pair = element_pair(kind, reference)
+            node = known.get(pair)
+            if not node:
+                node = known[pair] = self._create_element(batch, kind, reference)
+            nodes.append(node)
+        roles = dict(relation.ROLES)
+        properties = dict((name, getattr(relation, name)) for name in relation.__slots__
+                          if name not in roles and getattr(relation, name) is not None)
+        batch.create_relationship(self.rel_type, nodes[0], nodes[1], **properties)
+
+    def _create_element(self, batch, kind, reference):
+        if kind == pm.ENTITY:
+            identifier, version = reference
+            return batch.create_node('ENTITY', 'ENTITY', identifier=identifier, version=version,
+                                     entity=entity_key(identifier, version))
+        if kind == pm.AGENT:
+            return batch.create_node('AGENT', 'ACTOR', identifier=reference)
+        return batch.create_process(reference)
+
+register('general', GeneralHandler())
+register('used', RelationHandler(pm.Usage, 'USED'))
+register('wasGeneratedBy', RelationHandler(pm.Generation, 'WAS_GENERATED_BY'))
+register('wasInformedBy', RelationHandler(pm.Communication, 'WAS_INFORMED_BY'))
+register('wasDerivedFrom', RelationHandler(pm.Derivation, 'WAS_DERIVED_FROM', 'derivation_written'))
+register('wasAttributedTo', RelationHandler(pm.Attribution, 'WAS_ATTRIBUTED_TO'))
+register('wasAssociatedWith', RelationHandler(pm.Association, 'WAS_ASSOCIATED_WITH'))
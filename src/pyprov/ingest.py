@@ -0,0 +1,168 @@
+'''
+Asynchronous ingest of provenance records.
+
+Records are put on a bounded queue and written to the provenance store by a pool
+of background threads, so clients don't have to wait for the database.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import collections
+import threading
+import uuid
+import Queue
+
+QUEUE_SIZE = 10000
+WORKERS = 4
+RECEIPTS = 100000
+
+QUEUED, WRITTEN, FAILED = 'queued', 'written', 'failed'
+
+_STOP = object()
+
+class QueueFull(Exception):
+    """Raised if a record is submitted while the ingest queue is full"""
+    pass
+
+class IngestQueue(object):
+    """Queue provenance records and write them with a pool of background threads.
+
+    Every submitted record gets a receipt to look up its status later.
+    The writers take as many queued records as fit into one batch and write them together.
+
+    parameters:
+    dev_factory -- the factory to write the records (DevFactory)
+    queue -- the bounded queue of records to write (Queue)
+    batch_size -- maximum number of records written together
+    receipts -- status of the latest submitted records by receipt (OrderedDict)
+    max_receipts -- maximum number of remembered receipts
+    workers -- list of writer threads
+    """
+    def __init__(self, dev_factory, size=QUEUE_SIZE, workers=WORKERS, batch_size=None, max_receipts=RECEIPTS):
+        self.dev_factory = dev_factory
+        self.queue = Queue.Queue(size)
+        self.batch_size = batch_size or dev_factory.batch_size
+        self.receipts = collections.OrderedDict()
+        self.max_receipts = max_receipts
+        self.workers = [threading.Thread(target=self._work, name='ingest-%d' % i) for i in xrange(workers)]
+        self.lock = threading.Lock()
+        self.running = False
+
+    def start(self):
+        """Start all writer threads"""
+        for worker in self.workers:
+            worker.daemon = True
+            worker.start()
+        self.running = True
+
+    def stop(self):
+        """Write all queued records, then stop the writer threads"""
+        if not self.running:
+            return
+        self.running = False
+        for _ in self.workers:
+            self.queue.put(_STOP)
+        for worker in self.workers:
+            worker.join()
+
+    def depth(self):
+        """Return the number of records waiting to be written"""
+        return self.queue.qsize()
+
+    def submit(self, model_type, args):
+        """Put a record on the queue and return its receipt.
+
+        arguments:
+        model_type -- the type of the record, as passed to DevFactory.create
+        args -- tuple of arguments, as passed to DevFactory.create
+
+        raises:
+        QueueFull -- if the queue has no space left or the writers are stopped
+        """
+        if not self.running:
+            raise QueueFull('ingest queue is not running')
+        receipt = uuid.uuid4().hex
+        self._set_status(receipt, QUEUED)
+        try:
+            self.queue.put_nowait((receipt, model_type, args))
+        except Queue.Full:
+            with self.lock:
+                del self.receipts[receipt]
+            raise QueueFull('ingest queue is full')
+        return receipt
+
+    def submit_many(self, model_type, records):
+        """Put many records on the queue and return a receipt for every record.
+        
+        Instead of a receipt, a QueueFull error is returned for every rejected record.
+        
+        arguments:
+        model_type -- the type of the records, as passed to DevFactory.create_many
+        records -- list of argument tuples, as passed to DevFactory.create_many
+        """
+        results = []
+        for args in records:
+            try:
+                results.append(self.submit(model_type, args))
+            except QueueFull as e:
+                results.append(e)
+        return results
+
+    def status(self, receipt):
+        """Return the status of a submitted record or None if the receipt is unknown"""
+        with self.lock:
+            return self.receipts.get(receipt)
+
+    def _set_status(self, receipt, status, error=None):
+        with self.lock:
+            self.receipts[receipt] = {'receipt':receipt, 'status':status}
+            if error is not None:
+                self.receipts[receipt]['error'] = str(error)
+            while len(self.receipts) > self.max_receipts:
+                self.receipts.popitem(last=False)
+
+    def _work(self):
+        """Take records from the queue and write them until a stop marker is found"""
+        stop = False
+        while not stop:
+            item = self.queue.get()
+            if item is _STOP:
+                break
+            items = [item]
+            while len(items) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except Queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                items.append(item)
+            self._write(items)
+
+    def _write(self, items):
+        """Write queued records grouped by their model type and update their receipts"""
+        by_type = collections.OrderedDict()
+        for receipt, model_type, args in items:
+            by_type.setdefault(model_type, []).append((receipt, args))
+        for model_type, records in by_type.iteritems():
+            try:
+                errors = self.dev_factory.create_many(model_type, [args for _, args in records])
+            except ValueError as e:
+                errors = [e] * len(records)
+            for (receipt, _), error in zip(records, errors):
+                self._set_status(receipt, WRITTEN if error is None else FAILED, error)
@@ -0,0 +1,379 @@
+'''
+Conversion between the provenance store and PROV documents.
+
+A document is handled as a stream of records (Record), one for every element and
+relation. Readers (see pyprov.provjson and pyprov.provn) yield records, the Importer
+writes them to a store, the Exporter yields the records of a store and writers turn
+them into a document again. All of them are generators or consume generators, so
+a pipeline keeps only a bounded number of records in memory, however large the
+document is.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import calendar
+import collections
+import datetime
+import itertools
+import re
+import time
+from pyprov.cache import LookupCache, CACHE_SIZE
+from pyprov.store import BatchReference, entity_key, time_partition, PAGE_SIZE
+
+PREFIX = 'pyprov'
+NAMESPACE = 'https://github.com/onyame/pyprov#'
+
+# number of records written with one batch
+BATCH_SIZE = 500
+
+# number of relations kept back at most because an element they refer to is not declared yet
+DEFERRED_SIZE = 100000
+
+# version of imported entities which have none
+DEFAULT_VERSION = 1
+
+ENTITY, ACTIVITY, AGENT = 'entity', 'activity', 'agent'
+
+# the provenance node type and the default type from the software development model of every kind of element
+ELEMENTS = collections.OrderedDict([
+    (ENTITY, ('ENTITY', 'ENTITY')),
+    (ACTIVITY, ('ACTIVITY', 'PROCESS')),
+    (AGENT, ('AGENT', 'ACTOR')),
+])
+
+# the relationship type, the role and kind of its start node and the role and kind of its end node of every relation
+RELATIONS = collections.OrderedDict([
+    ('used', ('USED', 'prov:activity', ACTIVITY, 'prov:entity', ENTITY)),
+    ('wasGeneratedBy', ('WAS_GENERATED_BY', 'prov:entity', ENTITY, 'prov:activity', ACTIVITY)),
+    ('wasAssociatedWith', ('WAS_ASSOCIATED_WITH', 'prov:activity', ACTIVITY, 'prov:agent', AGENT)),
+    ('wasDerivedFrom', ('WAS_DERIVED_FROM', 'prov:generatedEntity', ENTITY, 'prov:usedEntity', ENTITY)),
+    ('wasAttributedTo', ('WAS_ATTRIBUTED_TO', 'prov:entity', ENTITY, 'prov:agent', AGENT)),
+    ('wasInformedBy', ('WAS_INFORMED_BY', 'prov:informed', ACTIVITY, 'prov:informant', ACTIVITY)),
+])
+
+# node properties which are written as attributes of their own or not at all
+ENTITY_KEY, PROV_ID = 'entity', 'prov_id'
+
+class Record(collections.namedtuple('Record', 'kind id attributes')):
+    """An element or relation of a PROV document.
+
+    parameters:
+    kind -- the kind of the record, e.g. 'entity' or 'used'
+    id -- the qualified name of the record or None
+    attributes -- the attributes by qualified name, the nodes of a relation are given
+                  by their role, e.g. {'prov:activity':'ex:a1', 'prov:entity':'ex:e1'}
+    """
+    __slots__ = ()
+
+class QualifiedName(unicode):
+    """An attribute value which is a qualified name, e.g. the value of 'prov:type'"""
+    __slots__ = ()
+
+XSD_TYPES = {
+    'xsd:int':int, 'xsd:integer':int, 'xsd:long':int, 'xsd:short':int, 'xsd:byte':int,
+    'xsd:double':float, 'xsd:float':float, 'xsd:decimal':float,
+    'xsd:boolean':lambda value: value in ('true', '1'),
+    'prov:QUALIFIED_NAME':QualifiedName, 'xsd:QName':QualifiedName,
+}
+
+def literal(value, datatype=None):
+    """Return the Python value of a typed literal, values of unknown types stay strings"""
+    convert = XSD_TYPES.get(datatype)
+    if convert is None:
+        return value
+    try:
+        return convert(value)
+    except ValueError:
+        return value
+
+TIME = re.compile(r'^(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(\.\d+)?(Z|[+-]\d\d:?\d\d)?$')
+
+def epoch_time(text):
+    """Return the seconds since the epoch of an xsd:dateTime or None if it's no valid time, times without zone are UTC"""
+    match = TIME.match(text.strip()) if isinstance(text, basestring) else None
+    if not match:
+        return None
+    year, month, day, hour, minute, second, fraction, zone = match.groups()
+    seconds = calendar.timegm((int(year), int(month), int(day), int(hour), int(minute), int(second)))
+    if fraction:
+        seconds += float(fraction)
+    if zone and zone != 'Z':
+        offset = int(zone[1:3]) * 3600 + int(zone[-2:]) * 60
+        seconds -= offset if zone[0] == '+' else -offset
+    return seconds
+
+def iso_time(seconds):
+    """Return the xsd:dateTime in UTC of seconds since the epoch"""
+    moment = datetime.datetime.utcfromtimestamp(float(seconds))
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.%fZ' if moment.microsecond else '%Y-%m-%dT%H:%M:%SZ')
+
+def _chunks(iterable, size):
+    """Yield lists of up to 'size' items of an iterable"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _value(value):
+    """Return an attribute value as a property value of the store"""
+    if isinstance(value, QualifiedName):
+        return unicode(value)
+    if isinstance(value, list):
+        return [_value(item) for item in value]
+    return value
+
+def _properties(attributes, roles=()):
+    """Return the type from the software development model (or None) and the properties of attributes
+
+    Attributes of the pyprov namespace are stored without their prefix, all others with their qualified name.
+    """
+    sdm_type = None
+    properties = {}
+    for key, value in attributes.iteritems():
+        if key in roles:
+            continue
+        if key == 'prov:type':
+            # the type of the pyprov namespace is the one of the model, other types are kept as they are
+            types = []
+            for item in value if isinstance(value, list) else [value]:
+                if isinstance(item, basestring) and item.startswith(PREFIX + ':'):
+                    sdm_type = item[len(PREFIX) + 1:]
+                else:
+                    types.append(item)
+            if types:
+                properties[key] = _value(types if len(types) > 1 else types[0])
+        elif key.startswith(PREFIX + ':'):
+            properties[key[len(PREFIX) + 1:]] = _value(value)
+        else:
+            properties[key] = _value(value)
+    return sdm_type, properties
+
+def _attributes(properties):
+    """Return the attributes of the properties of a node or relationship (the reverse of '_properties')"""
+    attributes = {}
+    for key, value in properties.iteritems():
+        # the partition of an activity is derived from its timestamp again when it's imported
+        if key in (ENTITY_KEY, PROV_ID, 'partition'):
+            continue
+        attributes[key if ':' in key else '%s:%s' % (PREFIX, key)] = value
+    return attributes
+
+def node_id(node):
+    """Return the qualified name of a node, the one it was imported with or one made from its identifier"""
+    return node.properties.get(PROV_ID) or '%s:n%d' % (PREFIX, node.id)
+
+class Importer(object):
+    """Write a stream of records to a provenance store with batched writes.
+
+    The records are written in chunks of 'batch_size' with one WriteBatch each,
+    after all nodes the chunk refers to were looked up with one call of 'find_nodes'.
+
+    Qualified names are resolved to nodes by a bounded cache of the latest ones
+    ('symbols'). Names which are not cached any more are looked up in the store by
+    the property 'prov_id', which every imported node gets. Elements which are
+    referred to but never declared are created with the kind given by their role,
+    as PROV allows. As elements may be declared after the relations which refer to
+    them, such relations are kept back until the end of the stream (or until
+    'max_deferred' of them are kept) and only then the missing elements are created,
+    so the attributes of elements declared late are not lost. Entities are identified by identifier and version like the ones
+    written by the REST interface, so an entity which is stored already is reused.
+
+    parameters:
+    store -- the provenance store to write to (ProvenanceStore)
+    batch_size -- maximum number of records written with one batch
+    symbols -- the latest nodes by qualified name (LookupCache)
+    deferred -- the relations which refer to elements not found yet
+    counts -- number of written records by kind, 'reused' and 'implicit' elements and 'skipped' records (Counter)
+    """
+    def __init__(self, store, batch_size=BATCH_SIZE, cache_size=CACHE_SIZE, max_deferred=DEFERRED_SIZE):
+        self.store = store
+        self.batch_size = batch_size
+        self.max_deferred = max_deferred
+        self.symbols = LookupCache(cache_size, None)
+        self.deferred = []
+        self.counts = collections.Counter()
+
+    def run(self, records):
+        """Write all records and return the counts"""
+        for chunk in _chunks(records, self.batch_size):
+            self.write(chunk)
+            if len(self.deferred) >= self.max_deferred:
+                self.flush()
+        self.flush()
+        return self.counts
+
+    def flush(self):
+        """Write the relations kept back and create the elements they refer to which are still missing"""
+        deferred, self.deferred = self.deferred, []
+        for chunk in _chunks(deferred, self.batch_size):
+            self.write(chunk, True)
+
+    def _element(self, kind, ident, attributes):
+        """Return the provenance node type, the software development model type and the properties of an element"""
+        prov_type, default_type = ELEMENTS[kind]
+        sdm_type, properties = _properties(attributes)
+        properties[PROV_ID] = ident
+        if kind == ENTITY:
+            properties.setdefault('identifier', ident)
+            properties.setdefault('version', DEFAULT_VERSION)
+            properties[ENTITY_KEY] = entity_key(properties['identifier'], properties['version'])
+        elif kind == AGENT:
+            properties.setdefault('identifier', ident)
+        else:
+            properties.setdefault('name', properties.get('prov:label') or ident)
+            try:
+                timestamp = float(properties['timestamp'])
+            except (KeyError, TypeError, ValueError):
+                started = epoch_time(properties.get('prov:startTime'))
+                timestamp = float(started) if started is not None else time.time()
+            properties['timestamp'] = timestamp
+            properties['partition'] = time_partition(timestamp)
+        return prov_type, sdm_type or default_type, properties
+
+    def _identity(self, kind, properties):
+        """Return the key-value pair which identifies an element of a kind in the store or None"""
+        if kind == ENTITY:
+            return (ENTITY_KEY, properties[ENTITY_KEY])
+        if kind == AGENT:
+            return ('identifier', properties['identifier'])
+        return None
+
+    def write(self, records, implicit=False):
+        """Write a chunk of records with a single batch.
+
+        keyword arguments:
+        implicit -- create the elements which relations refer to but which are not found,
+                    instead of keeping these relations back
+        """
+        elements, relations = [], []
+        for record in records:
+            if record.kind in ELEMENTS and record.id:
+                elements.append((record.kind, record.id) + self._element(record.kind, record.id, record.attributes))
+            elif record.kind in RELATIONS:
+                relations.append(record)
+            else:
+                self.counts['skipped'] += 1
+
+        # look up all names which are not cached with a single call
+        candidates = collections.OrderedDict()
+        for kind, ident, _, _, properties in elements:
+            if self.symbols.get(ident) is None:
+                pairs = candidates.setdefault(ident, [(PROV_ID, ident)])
+                identity = self._identity(kind, properties)
+                if identity and identity not in pairs:
+                    pairs.append(identity)
+        declared = set(element[1] for element in elements)
+        for record in relations:
+            _, _, start_kind, _, end_kind = RELATIONS[record.kind]
+            for role, kind in ((RELATIONS[record.kind][1], start_kind), (RELATIONS[record.kind][3], end_kind)):
+                ident = record.attributes.get(role)
+                if ident and ident not in declared and ident not in candidates and self.symbols.get(ident) is None:
+                    candidates[ident] = [(PROV_ID, ident)]
+        pairs = list(set(pair for pairs in candidates.itervalues() for pair in pairs))
+        found = dict(zip(pairs, self.store.find_nodes(pairs))) if pairs else {}
+
+        batch = self.store.create_batch()
+        nodes = {}
+        def lookup(ident):
+            node = nodes.get(ident) or self.symbols.get(ident)
+            if node is None:
+                for pair in candidates.get(ident, ()):
+                    node = found.get(pair)
+                    if node is not None:
+                        break
+            return node
+
+        for kind, ident, prov_type, sdm_type, properties in elements:
+            node = lookup(ident)
+            if node is None:
+                node = batch.create_node(prov_type, sdm_type, **properties)
+                self.counts[kind] += 1
+            else:
+                self.counts['reused'] += 1
+            nodes[ident] = node
+
+        for record in relations:
+            rel_type, start_role, start_kind, end_role, end_kind = RELATIONS[record.kind]
+            idents = [record.attributes.get(start_role), record.attributes.get(end_role)]
+            if not implicit and any(ident and lookup(ident) is None for ident in idents):
+                self.deferred.append(record)
+                continue
+            ends = []
+            for ident, kind in zip(idents, (start_kind, end_kind)):
+                if not ident:
+                    break
+                node = lookup(ident)
+                if node is None:
+                    prov_type, sdm_type, properties = self._element(kind, ident, {})
+                    node = batch.create_node(prov_type, sdm_type, **properties)
+                    self.counts['implicit'] += 1
+                nodes[ident] = node
+                ends.append(node)
+            if len(ends) < 2:
+                self.counts['skipped'] += 1
+                continue
+            _, properties = _properties(record.attributes, (start_role, end_role))
+            batch.create_relationship(rel_type, ends[0], ends[1], **properties)
+            self.counts[record.kind] += 1
+
+        results = batch.submit()
+        for ident, node in nodes.iteritems():
+            self.symbols.put(ident, results[node.index] if isinstance(node, BatchReference) else node)
+
+class Exporter(object):
+    """Yield the records of all elements and relations of a provenance store.
+
+    The nodes and relationships are read page by page (see ProvenanceStore.iter_all_nodes),
+    all records of one kind follow each other. Relationships of other types than
+    the ones of RELATIONS are not exported.
+
+    parameters:
+    store -- the provenance store to read (ProvenanceStore)
+    page_size -- number of nodes or relationships read with one call
+    """
+    def __init__(self, store, page_size=PAGE_SIZE):
+        self.store = store
+        self.page_size = page_size
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self):
+        for kind, (prov_type, _) in ELEMENTS.iteritems():
+            for node in self.store.iter_all_nodes(prov_type, self.page_size):
+                yield self._element(kind, node)
+        for name, (rel_type, start_role, _, end_role, _) in RELATIONS.iteritems():
+            for relationship in self.store.iter_all_relationships(rel_type, self.page_size):
+                attributes = _attributes(relationship.properties)
+                attributes[start_role] = node_id(relationship.start_node)
+                attributes[end_role] = node_id(relationship.end_node)
+                yield Record(name, '_:r%d' % relationship.id, attributes)
+
+    def _element(self, kind, node):
+        attributes = _attributes(node.properties)
+        stored = attributes.get('prov:type', [])
+        types = [QualifiedName(item) for item in (stored if isinstance(stored, list) else [stored])]
+        types.append(QualifiedName('%s:%s' % (PREFIX, node.type)))
+        attributes['prov:type'] = types if len(types) > 1 else types[0]
+        if kind == ACTIVITY and 'pyprov:timestamp' in attributes:
+            try:
+                attributes.setdefault('prov:startTime', iso_time(attributes['pyprov:timestamp']))
+            except (TypeError, ValueError):
+                pass
+        return Record(kind, node_id(node), attributes)
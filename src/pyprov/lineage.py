@@ -0,0 +1,105 @@
+'''
+Lineage queries over the provenance store.
+
+The lineage of an entity are all entities it was derived from (upstream)
+or which were derived from it (downstream), following the USED and
+WAS_GENERATED_BY relationships between entities and processes.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import collections
+from pyprov.store import index_value
+
+UPSTREAM, DOWNSTREAM = 'upstream', 'downstream'
+
+# relationships from an entity to a process and from the process to the next entities
+STEPS = {
+    UPSTREAM: (('WAS_GENERATED_BY', False), ('USED', False)),
+    DOWNSTREAM: (('USED', True), ('WAS_GENERATED_BY', True)),
+}
+
+ENTITY_KEYS = ('identifier', 'version')
+
+class Lineage(object):
+    """Traverse the lineage of entities breadth-first.
+
+    Entities are identified by their identifier and version. All nodes of an entity
+    are taken into account, so the lineage also connects processes which wrote
+    the same entity to different nodes.
+
+    parameters:
+    graph_db -- the provenance store to traverse (ProvenanceStore)
+    """
+    def __init__(self, graph_db):
+        self.graph_db = graph_db
+
+    def _entity_nodes(self, identifier, version=None):
+        """Iterate over all nodes of an entity, or of all its versions if no version is given"""
+        for node, (_, node_version) in self.graph_db.iter_nodes('identifier', identifier, ENTITY_KEYS):
+            if node_version is not None and (version is None or index_value(node_version) == index_value(version)):
+                yield node, node_version
+
+    def traverse(self, identifier, direction, version=None, max_depth=None):
+        """Yield every entity of the lineage once, nearest first.
+
+        Every entity is returned as a dictionary with its identifier, version,
+        its distance to the start ('depth') in processes, the process connecting it
+        and the entity it was reached from. Only the entities of the current depth
+        and the identifiers of the visited ones are kept in memory.
+        The iterator holds no results of the store between two entities, so it may be
+        continued later and by another thread, e.g. for the next page of a result.
+
+        arguments:
+        identifier -- the identifier of the entity to start from
+        direction -- UPSTREAM or DOWNSTREAM
+
+        keyword arguments:
+        version -- the version of the entity to start from or None for all versions
+        max_depth -- maximum number of processes between the start and a returned entity or None
+        """
+        first, second = STEPS[direction]
+        seen = set()
+        processes = set()
+        frontier = collections.deque()
+        for _, node_version in self._entity_nodes(identifier, version):
+            key = (identifier, index_value(node_version))
+            if key not in seen:
+                seen.add(key)
+                frontier.append((identifier, node_version, 0))
+
+        while frontier:
+            entity, entity_version, depth = frontier.popleft()
+            if max_depth is not None and depth >= max_depth:
+                continue
+            found = []
+            for node, _ in self._entity_nodes(entity, entity_version):
+                for process, (name,) in self.graph_db.neighbours(node, first[0], first[1], ('name',)):
+                    if process.id in processes:
+                        continue
+                    processes.add(process.id)
+                    for _, (next_entity, next_version) in self.graph_db.neighbours(process, second[0], second[1], ENTITY_KEYS):
+                        key = (next_entity, index_value(next_version))
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                        frontier.append((next_entity, next_version, depth + 1))
+                        found.append({'identifier':next_entity, 'version':next_version, 'depth':depth + 1,
+                                      'process':name, 'from':{'identifier':entity, 'version':entity_version}})
+            # the neighbours of an entity are read completely before its results are yielded
+            for record in found:
+                yield record
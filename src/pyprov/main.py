@@ -19,8 +19,18 @@ Created on 26.03.2013
    See the License for the specific language governing permissions and
    limitations under the License.
 '''
-import pyprov.server, pyprov.neo4j
-import pyprov.general_model as genm
+import argparse
+import threading
+import pyprov.server, pyprov.ingest, pyprov.wal, pyprov.cache, pyprov.lineage, pyprov.reachability, pyprov.metrics
+import pyprov.pool, pyprov.coalesce, pyprov.handlers, pyprov.traversal
+import pyprov.wsgi
+
+BATCH_SIZE = 500
+
+# number of locks the key-value pairs of looked up nodes are spread over
+KEY_LOCKS = 1024
+
+PROCESS_TIMER = pyprov.metrics.histogram('model.process')
 
 class Controller(object):
     """Control the entire program (data flow, process chain etc.)
@@ -29,32 +39,241 @@ class Controller(object):
     server -- the webserver for the REST-Interface
     graph_db -- the (graph) database to store provenance information
     dev_factory -- interface between server (provenance input) and database (provenance store)
+    lineage -- traversal of the stored provenance (Lineage)
+    queries -- compiles and runs traversal queries over the stored provenance (QueryEngine)
+    reachability -- transitive closure of the derivation between entities (ReachabilityIndex) or None
+    coalescing -- the store of the factory combining the calls of concurrent requests (CoalescingStore) or None
+    ingest -- queue or log to write provenance in the background (IngestQueue, WriteAheadLog)
+              or None to write immediately
+    profiler -- profiler for a sample of the requests (SlowRequestProfiler) or None
+    
+    keyword arguments:
+    store -- the kind of provenance store ('neo4j', 'memory', 'sqlite' or 'sharded')
+    url -- the URL of the REST API of the Neo4J server or None for the default one
+    database -- the database file of the SQLite store
+    shards -- the shards of the sharded store, like 'sqlite:a.db,neo4j:http://host:7474/db/data/'
+              (see pyprov.shard.parse_shards)
+    shard_directory -- the SQLite database file of the relationships across shards, needed unless all shards are kept in memory
+    rebalance -- True to move the nodes of the sharded store to the shards owning them in the background after start
+    batch_size -- maximum number of records written with one batch
+    async_ingest -- True if provenance should be written in the background
+    queue_size -- maximum number of records waiting to be written in the background
+    writers -- number of threads writing in the background
+    wal_dir -- directory of a write-ahead log to write provenance in the background,
+               takes precedence over 'async_ingest'
+    segment_size -- size of the segments of the write-ahead log in bytes
+    cache_size -- maximum number of nodes the store keeps in memory for lookups
+    cache_ttl -- seconds until a node kept for lookups has to be searched again
+    pool_size -- maximum number of connections to the Neo4J server used at once
+    pool_timeout -- seconds to wait for a connection to the Neo4J server and for every response
+    coalesce -- True to combine the lookups and batches of concurrent requests into single calls to the store
+    query_cache_size -- maximum number of compiled traversal queries kept
+    reachability -- True to maintain a reachability index of all written processes
+    reachability_file -- file to load the reachability index from at start and save it to at stop
+    profile_threshold -- seconds a profiled request has to take to keep its profile or None to profile nothing
+    profile_rate -- fraction of the requests to profile
+    profile_dir -- directory for the profiles of slow requests or None to log them
     """
-    def __init__(self):
+    def __init__(self, store='neo4j', url=None, database='pyprov.db', shards=None, shard_directory=None, rebalance=False,
+                 batch_size=BATCH_SIZE, async_ingest=False,
+                 queue_size=pyprov.ingest.QUEUE_SIZE, writers=pyprov.ingest.WORKERS,
+                 wal_dir=None, segment_size=pyprov.wal.SEGMENT_SIZE,
+                 cache_size=pyprov.cache.CACHE_SIZE, cache_ttl=pyprov.cache.CACHE_TTL,
+                 pool_size=pyprov.pool.POOL_SIZE, pool_timeout=pyprov.pool.TIMEOUT, coalesce=False,
+                 query_cache_size=pyprov.traversal.QUERY_CACHE_SIZE, reachability=False, reachability_file=None,
+                 profile_threshold=None, profile_rate=0.01, profile_dir=None):
         self.server = pyprov.server.Server(self)
-        self.graph_db = pyprov.neo4j.Neo4JServer(self)
-        self.dev_factory = DevFactory(self.graph_db)
+        self.store_options = (cache_size, cache_ttl, pool_size, pool_timeout)
+        if rebalance and store != 'sharded':
+            raise ValueError('only a sharded store can be rebalanced')
+        self.rebalance = rebalance
+        if store == 'sharded':
+            self.graph_db = self._create_sharded_store(shards, shard_directory)
+        else:
+            self.graph_db = self._create_store(store, url, database, *self.store_options)
+        self.coalescing = pyprov.coalesce.CoalescingStore(self.graph_db, batch_size) if coalesce else None
+        self.dev_factory = DevFactory(self.coalescing or self.graph_db, batch_size)
+        self.lineage = pyprov.lineage.Lineage(self.graph_db)
+        self.queries = pyprov.traversal.QueryEngine(self.graph_db, query_cache_size)
+        self.reachability = None
+        self.reachability_file = reachability_file
+        if reachability or reachability_file:
+            self.reachability = pyprov.reachability.ReachabilityIndex()
+            self.dev_factory.observers.append(self.reachability)
+        self.ingest = None
+        if wal_dir:
+            self.ingest = pyprov.wal.WriteAheadLog(self.dev_factory, wal_dir, segment_size)
+        elif async_ingest:
+            self.ingest = pyprov.ingest.IngestQueue(self.dev_factory, queue_size, writers)
+        self.profiler = None
+        if profile_threshold is not None:
+            self.profiler = pyprov.metrics.SlowRequestProfiler(profile_threshold, profile_rate, profile_dir)
         self.running = False
     
-    def start(self):
+    def _create_store(self, store, url, database, cache_size, cache_ttl, pool_size, pool_timeout):
+        """Create the provenance store of the given kind
+        
+        The stores are imported here, so only the dependencies of the chosen one are needed.
+        """
+        if store == 'neo4j':
+            import pyprov.neo4j
+            return pyprov.neo4j.Neo4JServer(self, cache_size, cache_ttl, url or pyprov.neo4j.URL, pool_size, pool_timeout)
+        elif store == 'memory':
+            import pyprov.memory
+            return pyprov.memory.MemoryStore(self)
+        elif store == 'sqlite':
+            import pyprov.sqlite
+            return pyprov.sqlite.SQLiteStore(self, database)
+        raise ValueError('unknown store: ' + store)
+    
+    def _create_sharded_store(self, shards, directory=None):
+        """Create the sharded store of a list of shards, the argument of every shard is its URL or database
+        
+        The relationships across shards are kept in the SQLite database 'directory'. Only if all shards
+        are kept in memory, the directory may be kept in memory as well. The file '<directory>.lock'
+        makes sure that a single process uses the store.
+        """
+        import pyprov.shard
+        if not shards:
+            raise ValueError('the sharded store needs a list of shards')
+        shards = pyprov.shard.parse_shards(shards)
+        if directory:
+            directory_store = self._create_store('sqlite', None, directory, *self.store_options)
+        elif all(kind == 'memory' for _, kind, _ in shards):
+            directory_store = self._create_store('memory', None, None, *self.store_options)
+        else:
+            raise ValueError('the sharded store needs a shard directory, a database file for the relationships across shards')
+        return pyprov.shard.ShardedStore(self, [(name, self.create_shard(kind, argument)) for name, kind, argument in shards],
+                                         directory_store, *self.store_options[:2],
+                                         lock_path=directory + '.lock' if directory else None)
+    
+    def create_shard(self, kind, argument=None):
+        """Create the store of a shard, with the store options of the controller (see ShardedStore.add_shard)"""
+        if kind == 'sqlite' and not argument:
+            raise ValueError('a SQLite shard needs its own database file, like sqlite:shard.db')
+        if kind not in ('neo4j', 'memory', 'sqlite'):
+            raise ValueError('unknown store of a shard: ' + kind)
+        return self._create_store(kind, argument, argument, *self.store_options)
+    
+    def prepare(self):
+        """Create the application, connect to the store and start writing in the background
+        
+        Everything but serving requests, so the application can be served by any WSGI server (see pyprov.wsgi).
+        """
         self.server.create_app()
         
         self.graph_db.run()
-        self.server.run()
+        if self.rebalance:
+            self.graph_db.start_rebalance()
+        if self.reachability is not None:
+            self.reachability.restore(self.graph_db, self.reachability_file)
+        if self.coalescing:
+            self.coalescing.start()
+        if self.ingest:
+            self.ingest.start()
+    
+    def start(self, host=pyprov.wsgi.HOST, port=pyprov.wsgi.PORT):
+        """Prepare the application and serve it with the development server of Flask"""
+        self.prepare()
+        self.server.run(host, port)
         if self.graph_db.running and self.server.running:
             self.running = True
+    
+    def stop(self):
+        """Stop the application after all queued provenance is written"""
+        if self.ingest:
+            self.ingest.stop()
+        if self.coalescing:
+            self.coalescing.stop()
+        if self.reachability_file:
+            self.reachability.save(self.reachability_file)
+        self.graph_db.close()
+        self.running = False
+    
+    def metrics(self):
+        """Return the metric families of the store, its cache, the query plans, the ingest and the profiler (see pyprov.metrics.render)"""
+        families = [('pyprov_store_round_trips_total', 'counter', 'Requests sent to the database',
+                     [('', (), self.graph_db.round_trips)])]
+        cache = getattr(self.graph_db, 'node_cache', None)
+        if cache is not None:
+            stats = cache.stats()
+            families.extend([
+                ('pyprov_cache_entries', 'gauge', 'Nodes kept for lookups', [('', (), stats['size'])]),
+                ('pyprov_cache_hits_total', 'counter', 'Lookups answered by the cache', [('', (), stats['hits'])]),
+                ('pyprov_cache_misses_total', 'counter', 'Lookups not answered by the cache', [('', (), stats['misses'])]),
+                ('pyprov_cache_evictions_total', 'counter', 'Nodes removed from the full cache', [('', (), stats['evictions'])]),
+                ('pyprov_cache_hit_ratio', 'gauge', 'Fraction of the lookups answered by the cache', [('', (), stats['hit_rate'])])])
+        pool = getattr(self.graph_db, 'pool', None)
+        if pool is not None:
+            status = pool.status()
+            families.extend([
+                ('pyprov_pool_connections', 'gauge', 'Connections to the database by state',
+                 [('', (('state', 'in_use'),), status['in_use']), ('', (('state', 'idle'),), status['idle'])]),
+                ('pyprov_pool_connections_created_total', 'counter', 'Connections opened to the database',
+                 [('', (), status['connections'])]),
+                ('pyprov_pool_connections_reused_total', 'counter', 'Requests sent over a kept-alive connection',
+                 [('', (), status['reused'])]),
+                ('pyprov_pool_retries_total', 'counter', 'Requests repeated after a transient error',
+                 [('', (), status['retries'])]),
+                ('pyprov_pool_failures_total', 'counter', 'Requests which failed', [('', (), status['failures'])]),
+                ('pyprov_pool_timeouts_total', 'counter', 'Requests which found no free connection in time',
+                 [('', (), status['timeouts'])]),
+                ('pyprov_pool_healthy', 'gauge', 'Result of the latest health check of the database (1 healthy, 0 failed)',
+                 [('', (), int(status['healthy'] is not False))])])
+        stats, texts = self.queries.plans.stats(), self.queries.texts.stats()
+        families.extend([
+            ('pyprov_query_plans', 'gauge', 'Compiled traversal queries kept', [('', (), stats['size'])]),
+            ('pyprov_query_plan_hits_total', 'counter', 'Traversal queries run without compiling them',
+             [('', (), texts['hits'] + stats['hits'])]),
+            ('pyprov_query_plan_misses_total', 'counter', 'Traversal queries which were compiled',
+             [('', (), stats['misses'])])])
+        if self.coalescing:
+            stats = self.coalescing.stats()
+            families.extend([
+                ('pyprov_coalesced_requests_total', 'counter', 'Store calls of requests which were combined',
+                 [('', (('kind', kind),), stats[kind]['calls']) for kind in sorted(stats)]),
+                ('pyprov_coalesced_calls_total', 'counter', 'Combined calls to the store',
+                 [('', (('kind', kind),), stats[kind]['combined']) for kind in sorted(stats)])])
+        if self.ingest:
+            families.append(('pyprov_ingest_queue_depth', 'gauge', 'Records waiting to be written',
+                             [('', (), self.ingest.depth())]))
+        if self.profiler:
+            families.extend([
+                ('pyprov_profiled_requests_total', 'counter', 'Profiled requests', [('', (), self.profiler.profiled)]),
+                ('pyprov_slow_requests_total', 'counter', 'Profiled requests slower than the threshold',
+                 [('', (), self.profiler.slow)])])
+        return families
             
 
         
 class DevFactory(object):
     """Transform input data to internal objects and store them into the database
     
+    Every model type is written by its handler (see pyprov.handlers), which
+    decodes the records and plans their nodes and relationships into a batch.
+    
     parameters:
     graph_db -- the underlying database to provide 'write' or 'create'-methods    
+    batch_size -- maximum number of records written with one batch by 'create_many'
+    handlers -- the handlers by model type (dict of Handler)
+    observers -- objects to be informed about every written record (see Handler.event)
+    key_locks -- serialize looking up and creating the nodes of a key-value pair, by its hash
     """
-    def __init__(self, graph_db):
+    def __init__(self, graph_db, batch_size=BATCH_SIZE):
         self.graph_db = graph_db
+        self.batch_size = batch_size
+        self.handlers = dict(pyprov.handlers.HANDLERS)
+        self.observers = []
+        self.key_locks = [threading.Lock() for _ in xrange(KEY_LOCKS)]
     
+    def handler(self, model_type):
+        """Return the handler of a model type, raise a ValueError if it's unknown"""
+        try:
+            return self.handlers[model_type]
+        except KeyError:
+            raise ValueError('unknown model type: ' + model_type)
+    
+    @pyprov.metrics.timed('factory.create')
     def create(self, model_type, *args, **kwargs):
         """Determine process type and start storing
         
@@ -64,43 +283,140 @@ class DevFactory(object):
         the arguments and keyword arguments to hand over the data.
         
         arguments:
-        model_type -- determine which method to call
+        model_type -- determine which handler to use, a ValueError is raised if it's unknown
         """
-        if model_type == 'general':
-            return self._create_general(*args, **kwargs)
+        handler = self.handler(model_type)
+        with PROCESS_TIMER.time():
+            record = handler.decode(*args, **kwargs)
+        self._write(handler, [record])
+        return True
     
-    def _create_general(self, *args, **kwargs):
-        """Create a general process and all associated nodes and relationships  
+    @pyprov.metrics.timed('factory.create_many')
+    def create_many(self, model_type, records):
+        """Write many records of the same type with as few batches as possible
+        
+        The records are split into chunks of 'batch_size' and every chunk is
+        written with a single batch. A failing chunk doesn't stop the others.
         
         arguments:
-        process
-        input
-        output
-        actor
+        model_type -- determine which handler to use, a ValueError is raised if it's unknown
+        records -- list of argument tuples, each as passed to 'create'
         
-        keyword arguments:
-        None
+        returns:
+        a list with None for every written record or the error which prevented writing it
         """
-        process = genm.Process(*args, **kwargs)
-        process_node = self.graph_db.create_process(process.name)
-        
-        actor_node = self.graph_db.find_node('identifier', process.actor.identifier)
-        if not actor_node:
-            actor_node = self.graph_db.create_actor(process.actor)
+        handler = self.handler(model_type)
         
-        for inp in process.inp:
-            input_node = self.graph_db.create_input(inp)
-            self.graph_db.create_relationship('USED', process_node, input_node)
-            
-        for outp in process.outp:
-            output_node = self.graph_db.create_output(outp)
-            self.graph_db.create_relationship('WAS_GENERATED_BY', output_node, process_node)
+        results = []
+        for start in xrange(0, len(records), self.batch_size):
+            chunk = records[start:start + self.batch_size]
+            try:
+                with PROCESS_TIMER.time():
+                    decoded = [handler.decode(*args) for args in chunk]
+                self._write(handler, decoded)
+                results.extend([None] * len(chunk))
+            # the store may raise anything, report it for the chunk and go on
+            except Exception as e:
+                results.extend([e] * len(chunk))
+        return results
+    
+    def _write(self, handler, records):
+        """Write records of one handler with a single batch
         
-        self.graph_db.create_relationship('WAS_ASSOCIATED_WITH', process_node, actor_node)
+        All nodes the records refer to are looked up first with one call to the store.
+        Looking up and creating the nodes of a key-value pair is serialized, so writers
+        of the same entity don't both miss it and create it twice. The locks of all
+        pairs are taken in order, so writers never wait for each other in a circle.
+        Writers in other processes are not serialized.
+        """
+        pairs = list(set(pair for record in records for pair in handler.lookups(record)))
+        stripes = sorted(set(hash(pair) % len(self.key_locks) for pair in pairs))
+        for stripe in stripes:
+            self.key_locks[stripe].acquire()
+        try:
+            batch = self.graph_db.create_batch()
+            known = self._find_known(pairs)
+            for record in records:
+                handler.plan(batch, record, known)
+            batch.submit()
+        finally:
+            for stripe in reversed(stripes):
+                self.key_locks[stripe].release()
+        self._notify(handler, records)
+    
+    def _notify(self, handler, records):
+        """Inform all observers about written records"""
+        if not handler.event:
+            return
+        for observer in self.observers:
+            written = getattr(observer, handler.event, None)
+            if written:
+                for record in records:
+                    written(record)
+    
+    def _find_known(self, pairs):
+        """Look up the stored nodes of key-value pairs with a single call to the store
         
+        arguments:
+        pairs -- list of distinct key-value pairs to look up (see Handler.lookups)
         
-        return True
+        returns:
+        a dictionary with the stored node (or None) for every key-value pair looked up
+        """
+        if not pairs:
+            return {}
+        return dict(zip(pairs, self.graph_db.find_nodes(pairs)))
+
+def parse_args(argv=None):
+    """Return the keyword arguments of the Controller and the serving options from the command line"""
+    parser = argparse.ArgumentParser(description='PyProv - a provenance store with a REST interface')
+    parser.add_argument('--store', choices=('neo4j', 'memory', 'sqlite', 'sharded'))
+    parser.add_argument('--url', help='URL of the REST API of the Neo4J server')
+    parser.add_argument('--database', help='database file of the SQLite store')
+    parser.add_argument('--shards', help="stores of the sharded store, like 'sqlite:a.db,sqlite:b.db'")
+    parser.add_argument('--shard-directory', help='database file of the relationships across shards')
+    parser.add_argument('--rebalance', action='store_true', default=None,
+                        help='move the nodes of the sharded store to new shards in the background')
+    parser.add_argument('--async-ingest', action='store_true', default=None, help='write provenance in the background')
+    parser.add_argument('--wal-dir', help='directory of a write-ahead log to write provenance in the background')
+    parser.add_argument('--reachability-file', help='file to keep the reachability index in')
+    parser.add_argument('--host', default=pyprov.wsgi.HOST)
+    parser.add_argument('--port', type=int, default=pyprov.wsgi.PORT)
+    parser.add_argument('--workers', type=int, default=1, help='worker processes, 0 for one per CPU core')
+    parser.add_argument('--threads', type=int, default=pyprov.wsgi.THREADS, help='threads per worker process')
+    parser.add_argument('--keepalive', type=int, default=pyprov.wsgi.KEEPALIVE,
+                        help='seconds to keep an idle connection open')
+    parser.add_argument('--timeout', type=int, default=pyprov.wsgi.TIMEOUT,
+                        help='seconds a worker may be silent before it is restarted')
+    parser.add_argument('--graceful-timeout', type=int, default=pyprov.wsgi.GRACEFUL_TIMEOUT,
+                        help='seconds a worker may take to finish its requests when it is stopped')
+    parser.add_argument('--gevent', action='store_true',
+                        help='handle requests in greenlets of gevent and combine their calls to the store')
+    parser.add_argument('--connections', type=int, default=pyprov.wsgi.CONNECTIONS,
+                        help='requests handled at once per worker process with --gevent')
+    parser.add_argument('--dev', action='store_true', help='serve with the development server of Flask')
+    args = parser.parse_args(argv)
+    
+    options = pyprov.wsgi.options_from_environ()
+    for option in ('store', 'url', 'database', 'shards', 'shard_directory', 'rebalance', 'async_ingest', 'wal_dir',
+                   'reachability_file'):
+        if getattr(args, option) is not None:
+            options[option] = getattr(args, option)
+    if not args.dev:
+        try:
+            pyprov.wsgi.check_workers(options, args.workers or pyprov.wsgi.multiprocessing.cpu_count())
+        except ValueError as e:
+            parser.error(e.message)
+    return options, args
 
 if __name__ == '__main__':
-    controller = Controller()
-    controller.start()
\ No newline at end of file
+    options, args = parse_args()
+    if args.dev:
+        controller = Controller(**options)
+        try:
+            controller.start(args.host, args.port)
+        finally:
+            controller.stop()
+    else:
+        pyprov.wsgi.serve(options, args.host, args.port, args.workers or None, args.threads,
+                          args.keepalive, args.timeout, args.graceful_timeout, args.gevent, args.connections)
\ No newline at end of file
@@ -0,0 +1,373 @@
+'''
+The in-memory provenance store.
+
+All nodes and relationships are kept in memory, nothing is persisted.
+Useful for tests, benchmarks and ephemeral deployments without a Neo4J server.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import bisect
+import itertools
+import threading
+from array import array
+from pyprov.store import ProvenanceStore, Node, Relationship, PAGE_SIZE, index_value
+
+EDGE_TYPECODE = 'l'
+
+# the type code of deleted relationships
+DELETED = 0xffff
+
+class MemoryStore(ProvenanceStore):
+    """The in-memory provenance store.
+
+    Relationships are kept column-wise in arrays of start nodes, end nodes and types,
+    so every relationship only costs a few machine words.
+    For every relationship type, the outgoing and incoming relationships of a node
+    are kept in adjacency arrays. All node properties are indexed like in the Neo4J store.
+    Deleted nodes leave a None in 'nodes' and deleted relationships the type code DELETED,
+    so the identifiers of all others stay their positions.
+
+    parameters:
+    nodes -- all nodes, the position within the list is the identifier of the node
+    node_index -- identifiers of all nodes by key and value of their properties (dict of arrays)
+    rel_types -- all relationship types, the position within the list is the type code
+    rel_starts, rel_ends, rel_codes -- start node, end node and type code of every relationship (arrays)
+    rel_properties -- properties of all relationships which have some (dict)
+    outgoing, incoming -- relationship identifiers by type code and node identifier (dict of dicts of arrays)
+    """
+    def __init__(self, controller):
+        super(MemoryStore, self).__init__(controller)
+        self.lock = threading.Lock()
+        self.nodes = []
+        self.node_index = {}
+        self.rel_types = []
+        self.rel_codes_by_type = {}
+        self.rel_starts = array(EDGE_TYPECODE)
+        self.rel_ends = array(EDGE_TYPECODE)
+        self.rel_codes = array('H')
+        self.rel_properties = {}
+        self.outgoing = {}
+        self.incoming = {}
+        self.running = False
+
+    def create_node(self, prov_type, sdm_type, **properties):
+        """Create a new node with its properties and add them to the index.
+
+        arguments:
+        prov_type -- an uppercase string to determine the provenance node type (ENTITY, ACTIVITY or AGENT).
+        sdm_type -- an uppercase string to determine the type from the software development model.
+        **properties -- list of key-value-pairs to add more properties to the node
+        """
+        with self.lock:
+            node = Node(len(self.nodes), prov_type, sdm_type, properties)
+            self.nodes.append(node)
+            for key, value in properties.iteritems():
+                if value:
+                    index_key = (key, index_value(value))
+                    if index_key not in self.node_index:
+                        self.node_index[index_key] = array(EDGE_TYPECODE)
+                    self.node_index[index_key].append(node.id)
+        return node
+
+    def create_relationship(self, rel_type, start_node, end_node, **properties):
+        """Create a new relationship between two nodes
+
+        arguments:
+        rel_type -- an uppercase string to determine the type of relationship between the two nodes, i.e. the predicate
+        start_node -- the outgoing node, from where the relationship starts, i.e. the subject
+        end_node -- the incoming node, to where the relationship end, i.e the object
+        **properties -- list of keyword arguments which is completely added to the relationship.
+        """
+        with self.lock:
+            code = self.rel_codes_by_type.get(rel_type)
+            if code is None:
+                # readers don't take the lock, so the adjacency of a type exists before its code is published
+                code = len(self.rel_types)
+                self.outgoing[code] = {}
+                self.incoming[code] = {}
+                self.rel_types.append(rel_type)
+                self.rel_codes_by_type[rel_type] = code
+            ident = len(self.rel_starts)
+            self.rel_starts.append(start_node.id)
+            self.rel_ends.append(end_node.id)
+            self.rel_codes.append(code)
+            if properties:
+                self.rel_properties[ident] = properties
+            self._adjacency(self.outgoing[code], start_node.id).append(ident)
+            self._adjacency(self.incoming[code], end_node.id).append(ident)
+        return self._relationship(ident)
+
+    def _adjacency(self, adjacency, node_id):
+        """Return the array of relationships of a node, create it if necessary"""
+        rels = adjacency.get(node_id)
+        if rels is None:
+            rels = adjacency[node_id] = array(EDGE_TYPECODE)
+        return rels
+
+    def _relationship(self, ident):
+        """Build the relationship object for a relationship identifier"""
+        return Relationship(ident, self.rel_types[self.rel_codes[ident]],
+                            self.nodes[self.rel_starts[ident]], self.nodes[self.rel_ends[ident]],
+                            self.rel_properties.get(ident, {}))
+
+    def get_nodes(self, idents):
+        """Return the node of every identifier, None for the ones which don't exist"""
+        nodes = self.nodes
+        return [nodes[ident] if 0 <= ident < len(nodes) else None for ident in idents]
+
+    def find_node(self, key, value):
+        """Find the latest node with a given key-value pair.
+
+        arguments:
+        key -- what key/identifier should be searched (string).
+        value -- what value has should that key have (type specified by key).
+        """
+        idents = self.node_index.get((key, index_value(value)))
+        if not idents:
+            return None
+        return self.nodes[idents[-1]]
+
+    def find_relationship(self, rel_type=None, start_node=None, end_node=None, bidirectional=None, limit=None):
+        """Find the latest relationship with possible specifications.
+
+        The relationships of the given start or end node are searched from the latest one,
+        so only the relationships behind the result are looked at.
+
+        keyword arguments:
+        rel_type -- type of relationships to find (None if any
+        start_node -- concrete start node (None if any)
+        end_node -- concrete end node to find (None if any)
+        bidirectional --  True if reversed relationships should also be included
+        limit -- only kept for compatibility, the latest relationship is always returned
+        """
+        start_id = start_node.id if start_node is not None else None
+        end_id = end_node.id if end_node is not None else None
+        result = self._latest(rel_type, start_id, end_id)
+        if bidirectional and (start_id is not None or end_id is not None):
+            reverse = self._latest(rel_type, end_id, start_id)
+            if reverse is not None and (result is None or reverse > result):
+                result = reverse
+        if result is None:
+            return None
+        return self._relationship(result)
+
+    def _latest(self, rel_type, start_id, end_id):
+        """Return the highest identifier of all matching relationships or None"""
+        if rel_type is None:
+            codes = range(len(self.rel_types))
+        elif rel_type in self.rel_codes_by_type:
+            codes = [self.rel_codes_by_type[rel_type]]
+        else:
+            return None
+
+        result = None
+        for code in codes:
+            if start_id is not None:
+                candidates, other, other_id = self.outgoing[code].get(start_id, ()), self.rel_ends, end_id
+            elif end_id is not None:
+                candidates, other, other_id = self.incoming[code].get(end_id, ()), None, None
+            else:
+                candidates, other, other_id = None, None, None
+
+            if candidates is None:
+                for ident in xrange(len(self.rel_codes) - 1, result if result is not None else -1, -1):
+                    if self.rel_codes[ident] == code:
+                        result = ident
+                        break
+                continue
+            for position in xrange(len(candidates) - 1, -1, -1):
+                ident = candidates[position]
+                if result is not None and ident <= result:
+                    break
+                if other_id is None or other[ident] == other_id:
+                    result = ident
+                    break
+        return result
+
+    def iter_nodes(self, key, value, keys=(), limit=None):
+        """Iterate over all nodes with a given key-value pair, oldest first.
+
+        arguments:
+        key -- what key/identifier should be searched (string).
+        value -- what value has should that key have (type specified by key).
+
+        keyword arguments:
+        keys -- the keys of the properties to return with every node
+        limit -- maximum number of nodes to return or None for all
+        """
+        for ident in itertools.islice(self.node_index.get((key, index_value(value)), ()), limit):
+            node = self.nodes[ident]
+            yield node, tuple(node.properties.get(k) for k in keys)
+
+    def neighbours(self, node, rel_type, reverse=False, keys=(), limit=None):
+        """Iterate over all nodes connected to a node by relationships of a type.
+
+        arguments:
+        node -- the node to start from
+        rel_type -- the type of relationships to follow
+
+        keyword arguments:
+        reverse -- True to follow the relationships from their end node to their start node
+        keys -- the keys of the properties to return with every node
+        limit -- maximum number of nodes to return or None for all
+        """
+        code = self.rel_codes_by_type.get(rel_type)
+        if code is None:
+            return
+        adjacency, others = (self.incoming, self.rel_starts) if reverse else (self.outgoing, self.rel_ends)
+        for ident in itertools.islice(adjacency[code].get(node.id, ()), limit):
+            neighbour = self.nodes[others[ident]]
+            yield neighbour, tuple(neighbour.properties.get(k) for k in keys)
+
+    def relationships(self, node):
+        """Return all relationships of a node, outgoing and incoming ones, ordered by their identifier"""
+        idents = set()
+        for code in xrange(len(self.rel_types)):
+            idents.update(self.outgoing[code].get(node.id, ()))
+            idents.update(self.incoming[code].get(node.id, ()))
+        return [self._relationship(ident) for ident in sorted(idents)]
+
+    def scan_nodes(self, prov_type=None, after=None, limit=PAGE_SIZE):
+        """Return a page of all nodes, ordered by their identifier.
+
+        keyword arguments:
+        prov_type -- the provenance node type of the nodes to return (None if any)
+        after -- the identifier of the last node of the previous page (None for the first page)
+        limit -- maximum number of nodes to return
+        """
+        page = []
+        for ident in xrange(after + 1 if after is not None else 0, len(self.nodes)):
+            node = self.nodes[ident]
+            if node is not None and (prov_type is None or node.prov_type == prov_type):
+                page.append(node)
+                if len(page) >= limit:
+                    break
+        return page
+
+    def scan_relationships(self, rel_type=None, after=None, limit=PAGE_SIZE):
+        """Return a page of all relationships with their nodes, ordered by their identifier.
+
+        keyword arguments:
+        rel_type -- the type of the relationships to return (None if any)
+        after -- the identifier of the last relationship of the previous page (None for the first page)
+        limit -- maximum number of relationships to return
+        """
+        code = self.rel_codes_by_type.get(rel_type) if rel_type is not None else None
+        if rel_type is not None and code is None:
+            return []
+        page = []
+        for ident in xrange(after + 1 if after is not None else 0, len(self.rel_codes)):
+            if self.rel_codes[ident] != DELETED and (code is None or self.rel_codes[ident] == code):
+                page.append(self._relationship(ident))
+                if len(page) >= limit:
+                    break
+        return page
+
+    def delete_nodes(self, nodes):
+        """Delete nodes with all their relationships, return the number of deleted nodes.
+
+        The entries of the index and the adjacency arrays which refer to the deleted
+        items are removed, every touched array is rebuilt once.
+
+        arguments:
+        nodes -- the nodes to delete, nodes which are already deleted are skipped
+        """
+        with self.lock:
+            doomed = set(node.id for node in nodes
+                         if 0 <= node.id < len(self.nodes) and self.nodes[node.id] is not None)
+            if not doomed:
+                return 0
+            index_keys = set()
+            removed = set()
+            for ident in doomed:
+                for key, value in self.nodes[ident].properties.iteritems():
+                    if value:
+                        index_keys.add((key, index_value(value)))
+                for code in xrange(len(self.rel_types)):
+                    removed.update(self.outgoing[code].pop(ident, ()))
+                    removed.update(self.incoming[code].pop(ident, ()))
+                self.nodes[ident] = None
+            for index_key in index_keys:
+                self._remove(self.node_index, index_key, doomed)
+            touched = set()
+            for rel in removed:
+                code = self.rel_codes[rel]
+                touched.add((True, code, self.rel_starts[rel]))
+                touched.add((False, code, self.rel_ends[rel]))
+                self.rel_codes[rel] = DELETED
+                self.rel_properties.pop(rel, None)
+            for out, code, node_id in touched:
+                if node_id not in doomed:
+                    self._remove(self.outgoing[code] if out else self.incoming[code], node_id, removed)
+        return len(doomed)
+
+    def delete_relationships(self, relationships):
+        """Delete relationships and remove them from the adjacency arrays, return their number
+
+        arguments:
+        relationships -- the relationships to delete, the ones which are already deleted are skipped
+        """
+        with self.lock:
+            removed = set(relationship.id for relationship in relationships
+                          if 0 <= relationship.id < len(self.rel_codes) and self.rel_codes[relationship.id] != DELETED)
+            for rel in removed:
+                code = self.rel_codes[rel]
+                self._remove(self.outgoing[code], self.rel_starts[rel], (rel,))
+                self._remove(self.incoming[code], self.rel_ends[rel], (rel,))
+                self.rel_codes[rel] = DELETED
+                self.rel_properties.pop(rel, None)
+        return len(removed)
+
+    def update_nodes(self, updates):
+        """Set properties of nodes and index their new values, return the number of updated nodes
+
+        The node objects are replaced, so nodes returned before keep their properties.
+        The identifiers of every index entry stay in order.
+
+        arguments:
+        updates -- list of pairs of a node and the properties to set (dict), deleted nodes are skipped
+        """
+        updated = 0
+        with self.lock:
+            for node, properties in updates:
+                if not 0 <= node.id < len(self.nodes) or self.nodes[node.id] is None:
+                    continue
+                old = self.nodes[node.id]
+                merged = dict(old.properties)
+                merged.update(properties)
+                for key, value in properties.iteritems():
+                    if old.properties.get(key):
+                        self._remove(self.node_index, (key, index_value(old.properties[key])), (node.id,))
+                    if value:
+                        bisect.insort(self.node_index.setdefault((key, index_value(value)), array(EDGE_TYPECODE)),
+                                      node.id)
+                self.nodes[node.id] = Node(node.id, old.prov_type, old.type, merged)
+                updated += 1
+        return updated
+
+    def _remove(self, arrays, key, idents):
+        """Remove identifiers from one of the arrays of a dictionary, drop the array if it's empty"""
+        kept = array(EDGE_TYPECODE, (ident for ident in arrays.get(key, ()) if ident not in idents))
+        if kept:
+            arrays[key] = kept
+        else:
+            arrays.pop(key, None)
+
+    def run(self):
+        """starting the database service"""
+        self.running = True
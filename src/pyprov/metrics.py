@@ -0,0 +1,299 @@
+'''
+Timing and counters for the hot path and their export in the Prometheus text format.
+
+Operations are timed with the decorator 'timed', with 'Registry.instrument'
+for the methods of an object or with the context manager of a Histogram.
+All histograms live in the process-wide REGISTRY.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import bisect
+import cProfile
+import functools
+import inspect
+import logging
+import os
+import pstats
+import random
+import StringIO
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# upper bounds of the histogram buckets in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# number of pending observations which are folded into the buckets at once
+FOLD_SIZE = 1024
+
+OPERATION_FAMILY = 'pyprov_operation_duration_seconds'
+
+class Histogram(object):
+    """The distribution of the durations of one operation.
+
+    Observing appends the duration to a list of pending ones under the lock of the
+    histogram, the same lock which sorts them into the buckets, so no observation
+    is appended to a list which is already folded. The pending durations are sorted
+    into the buckets when there are FOLD_SIZE of them or when the histogram is collected.
+
+    parameters:
+    buckets -- upper bounds of the buckets in seconds, ascending
+    counts -- number of observations per bucket (not cumulative), the last one is +Inf
+    sum -- sum of all folded observations in seconds
+    count -- number of all folded observations
+    pending -- observations which are not folded yet
+    """
+    __slots__ = ('buckets', 'counts', 'sum', 'count', 'pending', 'lock')
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        """Add the duration of one call"""
+        with self.lock:
+            self.pending.append(seconds)
+            if len(self.pending) >= FOLD_SIZE:
+                self._fold()
+
+    def fold(self):
+        """Sort the pending observations into the buckets"""
+        with self.lock:
+            self._fold()
+
+    def _fold(self):
+        """Sort the pending observations into the buckets, the lock has to be held"""
+        pending, self.pending = self.pending, []
+        pending.sort()
+        previous = 0
+        for position, bound in enumerate(self.buckets):
+            index = bisect.bisect_right(pending, bound)
+            self.counts[position] += index - previous
+            previous = index
+        self.counts[-1] += len(pending) - previous
+        self.sum += sum(pending)
+        self.count += len(pending)
+
+    def snapshot(self):
+        """Return the cumulative bucket counts, the sum and the count of all observations"""
+        with self.lock:
+            self._fold()
+            cumulative, total = [], 0
+            for count in self.counts:
+                total += count
+                cumulative.append(total)
+            return cumulative, self.sum, self.count
+
+    def time(self):
+        """Return a context manager which observes the duration of its block"""
+        return _Timer(self)
+
+class _Timer(object):
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.time() - self.started)
+
+def _timed_iterator(iterator, histogram):
+    """Yield from an iterator and observe the time spent within it, without the time of the consumer"""
+    _time = time.time
+    elapsed = 0.0
+    try:
+        while True:
+            started = _time()
+            try:
+                item = next(iterator)
+            finally:
+                elapsed += _time() - started
+            yield item
+    except StopIteration:
+        return
+    finally:
+        histogram.observe(elapsed)
+
+class Registry(object):
+    """All histograms of the process by operation name.
+
+    parameters:
+    histograms -- the histogram of every operation (dict)
+    """
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def histogram(self, operation):
+        """Return the histogram of an operation, create it if necessary"""
+        histogram = self.histograms.get(operation)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(operation, Histogram())
+        return histogram
+
+    def timed(self, operation, iterator=None):
+        """Return a decorator which observes the duration of every call in the histogram of an operation.
+
+        arguments:
+        operation -- the name of the operation
+
+        keyword arguments:
+        iterator -- True if the function returns an iterator whose iteration should be timed as well,
+                    None to decide by the function (generator functions)
+        """
+        histogram = self.histogram(operation)
+        def decorator(func):
+            iterate = inspect.isgeneratorfunction(func) if iterator is None else iterator
+            _time = time.time
+            if iterate:
+                @functools.wraps(func)
+                def timed_iterator(*args, **kwargs):
+                    return _timed_iterator(iter(func(*args, **kwargs)), histogram)
+                return timed_iterator
+            @functools.wraps(func)
+            def timed_call(*args, **kwargs):
+                started = _time()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    histogram.observe(_time() - started)
+            return timed_call
+        return decorator
+
+    def instrument(self, obj, names, prefix, iterators=()):
+        """Replace methods of an object by timed ones, named '<prefix>.<method>'.
+
+        arguments:
+        obj -- the object to instrument
+        names -- the names of its methods to time
+        prefix -- the prefix of the operation names
+
+        keyword arguments:
+        iterators -- the names of methods which return iterators whose iteration should be timed
+        """
+        for name in names:
+            method = getattr(obj, name)
+            setattr(obj, name, self.timed('%s.%s' % (prefix, name), name in iterators or None)(method))
+
+    def collect(self):
+        """Return the metric family with the histograms of all operations (see 'render')"""
+        samples = []
+        for operation, histogram in sorted(self.histograms.items()):
+            cumulative, total, count = histogram.snapshot()
+            for bound, value in zip(histogram.buckets + ('+Inf',), cumulative):
+                samples.append(('_bucket', (('operation', operation), ('le', str(bound))), value))
+            samples.append(('_sum', (('operation', operation),), total))
+            samples.append(('_count', (('operation', operation),), count))
+        return [(OPERATION_FAMILY, 'histogram', 'Duration of instrumented operations', samples)]
+
+    def clear(self):
+        """Remove all histograms"""
+        with self.lock:
+            self.histograms.clear()
+
+REGISTRY = Registry()
+
+def timed(operation, iterator=None):
+    """Return a decorator which times every call in the histogram of an operation (see Registry.timed)"""
+    return REGISTRY.timed(operation, iterator)
+
+def histogram(operation):
+    """Return the histogram of an operation of the process-wide registry"""
+    return REGISTRY.histogram(operation)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def render(families):
+    """Return metric families in the Prometheus text format (version 0.0.4).
+
+    arguments:
+    families -- list of tuples (name, type, help, samples) where every sample is
+                a tuple (suffix of the name, tuple of label pairs, value)
+    """
+    lines = []
+    for name, kind, description, samples in families:
+        lines.append('# HELP %s %s' % (name, description))
+        lines.append('# TYPE %s %s' % (name, kind))
+        for suffix, labels, value in samples:
+            if labels:
+                label_text = '{%s}' % ','.join('%s="%s"' % (key, _escape(label)) for key, label in labels)
+            else:
+                label_text = ''
+            value = str(value) if isinstance(value, (int, long)) else repr(float(value))
+            lines.append('%s%s%s %s' % (name, suffix, label_text, value))
+    return '\n'.join(lines) + '\n'
+
+class SlowRequestProfiler(object):
+    """Profile a sample of the requests and keep the profiles of the slow ones.
+
+    A profile is written to the directory (as '<endpoint>-<milliseconds>.prof', readable with pstats)
+    or, without a directory, the most expensive functions are logged.
+
+    parameters:
+    threshold -- seconds a request has to take to be slow
+    sample_rate -- fraction of the requests to profile (0.0 to 1.0)
+    directory -- the directory to write the profiles of slow requests to or None to log them
+    profiled -- number of profiled requests
+    slow -- number of profiled requests which were slow
+    """
+    def __init__(self, threshold, sample_rate=0.01, directory=None):
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.profiled = 0
+        self.slow = 0
+
+    def start(self):
+        """Start profiling the current request if it's sampled, return a token for 'stop' or None"""
+        if random.random() >= self.sample_rate:
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile, time.time()
+
+    def stop(self, token, name):
+        """Stop profiling a request and keep the profile if the request was slow
+
+        arguments:
+        token -- the token returned by 'start'
+        name -- the name of the request, e.g. its endpoint
+        """
+        profile, started = token
+        profile.disable()
+        elapsed = time.time() - started
+        self.profiled += 1
+        if elapsed < self.threshold:
+            return
+        self.slow += 1
+        if self.directory:
+            profile.dump_stats(os.path.join(self.directory, '%s-%d.prof' % (name, int(started * 1000))))
+        else:
+            output = StringIO.StringIO()
+            pstats.Stats(profile, stream=output).sort_stats('cumulative').print_stats(20)
+            logger.warning('slow request %s took %.3f s\n%s', name, elapsed, output.getvalue())
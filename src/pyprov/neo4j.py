@@ -18,162 +18,351 @@ Created on 27.03.2013
    limitations under the License.
 
 '''
-import time
-import abc
-from py2neo import neo4j, rest
+import re
+import urllib
+from pyprov.cache import LookupCache, CACHE_SIZE, CACHE_TTL
+from pyprov.pool import ConnectionPool, POOL_SIZE, TIMEOUT
+from pyprov.store import ProvenanceStore, BatchReference, Node, Relationship, NODE, PAGE_SIZE, index_value
 
 URL = 'http://localhost:7474/db/data/'
 
-class ProvenanceStore(object):
-    """The abstract basis class for all provenance stores.
+# the legacy index of all node properties
+INDEX = 'Nodes'
+
+# keys whose nodes are cached as soon as they are created
+CACHED_KEYS = ('identifier', 'entity')
+
+NAME = re.compile(r'^\w+$')
+
+def _name(name):
+    """Return a property key or relationship type to be used within a cypher query"""
+    if not NAME.match(name):
+        raise ValueError('invalid name: ' + name)
+    return name
+
+def _ident(uri):
+    """Return the identifier of a node or relationship from its URI"""
+    return int(uri.rsplit('/', 1)[1])
+
+class Neo4JServer(ProvenanceStore):
+    """The Neo4J-Provenance Store.
     
-    All implemented stores should inherit from this class to ensure correct interface usage.
+    The store talks to the REST API of Neo4J over a pool of persistent connections
+    (ConnectionPool), which is shared by all threads. Nodes and relationships are
+    returned as plain objects (Node, Relationship).
     
     parameters:
-    controller -- the managing controller class (Controller)
+    pool -- connections to Neo4J backend (ConnectionPool)
+    node_cache -- the latest node for every searched or created key-value pair (LookupCache)
+    
+    keyword arguments:
+    url -- the URL of the REST API of the Neo4J server
+    cache_size -- maximum number of cached nodes
+    cache_ttl -- seconds until a cached node has to be searched again or None to keep it
+    pool_size -- maximum number of connections used at once
+    timeout -- seconds to wait for a free connection and for every response
     """
-    __metaclass__ = abc.ABCMeta
+    def __init__(self, controller, cache_size=CACHE_SIZE, cache_ttl=CACHE_TTL, url=URL,
+                 pool_size=POOL_SIZE, timeout=TIMEOUT):
+        super(Neo4JServer, self).__init__(controller)
+        self.url = url
+        self.pool = ConnectionPool(url, pool_size, timeout)
+        self.running = False
+        self.node_cache = LookupCache(cache_size, cache_ttl)
+        
+    def setup_database(self):
+        """Check the connection to the database and create the node index if necessary"""
+        if not self.pool.check():
+            print 'Database service not found'
+        indexes = self._request('GET', 'index/node') or {}
+        if INDEX not in indexes:
+            self._request('POST', 'index/node', {'name':INDEX})
     
-    def __init__(self, controller):
-        self.controller = controller
+    def _request(self, method, path, body=None, idempotent=None):
+        """Send a request to the REST API and return the decoded response (see ConnectionPool.request)"""
+        self.count_round_trips()
+        return self.pool.request(method, path, body, idempotent=idempotent)
     
-    def create_process(self, name):
-        return self.create_node('ACTIVITY', 'PROCESS', name=name, timestamp=str(time.time()))
+    def _cypher(self, query, **params):
+        """Run a reading cypher query and return the rows of the result"""
+        return self._request('POST', 'cypher', {'query':query, 'params':params}, idempotent=True)['data']
     
-    def create_input(self, inp):
-        return self.create_node('ENTITY', 'INPUT', identifier=inp.identifier, version=inp.version)
+    def _node(self, data):
+        """Build a node from its REST representation"""
+        properties = dict(data.get('data') or {})
+        return Node(_ident(data['self']), properties.pop('prov_type', None), properties.pop('type', None), properties)
     
-    def create_output(self, outp):
-        return self.create_node('ENTITY', 'OUTPUT', identifier=outp.identifier, version=outp.version)
+    def _node_uri(self, node):
+        return self.pool.uri('node/%d' % node.id)
+                
+    def get_nodes(self, idents):
+        """Return the node of every identifier with a single query, all of them have to exist"""
+        if not idents:
+            return []
+        found = dict((node.id, node) for node in (self._node(row[0]) for row in
+                                                  self._cypher('START n=node({ids}) RETURN n', ids=list(idents))))
+        return [found.get(ident) for ident in idents]
+                
+    def find_node(self, key, value):
+        """Find a node with a given key-value pair.
+        
+        First look into the node cache, then search the node index for the key and value.
+        The node with the highest identifier is selected by the database,
+        so only one node is transferred, no matter how many nodes match.
+        
+        arguments:
+        key -- what key/identifier should be searched (string).
+        value -- what value has should that key have (type specified by key)    .    
+        """
+        result = self.node_cache.get((key, index_value(value)))
+        if result is not None:
+            return result
+        query = 'START n=node:%s(%s={value}) RETURN n ORDER BY ID(n) DESC LIMIT 1' % (INDEX, _name(key))
+        rows = self._cypher(query, value=index_value(value))
+        if not rows:
+            return None
+        result = self._node(rows[0][0])
+        self.node_cache.put((key, index_value(value)), result)
+        return result
     
-    def create_actor(self, actor):
-        return self.create_node('AGENT', 'ACTOR', identifier=actor.identifier)
- 
-    @abc.abstractmethod
-    def create_node(self, prov_type, sdm_type, **properties):
-        """abstract method to create a node in the database
+    def find_nodes(self, pairs):
+        """Find the latest node for every key-value pair.
+        
+        Pairs which are not cached are searched with a single batch request of
+        one query per pair, like 'find_node', so only the latest node of a pair is transferred.
         
         arguments:
-        prov_type -- an uppercase string to determine the provenance node type (ENTITY, ACTIVITY or AGENT).
-        sdm_type -- an uppercase string to determine the type from the software development model.
-        **properties -- list of keyword arguments which is completely added to the node.
+        pairs -- list of key-value pairs to search
         """
-        pass
+        results = [self.node_cache.get((key, index_value(value))) for key, value in pairs]
+        missing = [position for position, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+        jobs = []
+        for position in missing:
+            key, value = pairs[position]
+            query = 'START n=node:%s(%s={value}) RETURN n ORDER BY ID(n) DESC LIMIT 1' % (INDEX, _name(key))
+            jobs.append({'method':'POST', 'to':'/cypher', 'id':len(jobs),
+                         'body':{'query':query, 'params':{'value':index_value(value)}}})
+        responses = self._request('POST', 'batch', jobs, idempotent=True)
+        for position, response in zip(missing, responses):
+            rows = response['body']['data']
+            if rows:
+                key, value = pairs[position]
+                results[position] = self._node(rows[0][0])
+                self.node_cache.put((key, index_value(value)), results[position])
+        return results
     
-    @abc.abstractmethod
-    def create_relationship(self, rel_type, start_node, end_node, **properties):
-        """abstract method to create a releationship in the database
+    def _stream(self, query, keys, **params):
+        """Run a cypher query returning a node 'n' and yield it with the requested properties"""
+        columns = ''.join(', n.%s?' % _name(key) for key in keys)
+        for row in self._cypher(query % columns, **params):
+            yield self._node(row[0]), tuple(row[1:])
+    
+    def iter_nodes(self, key, value, keys=(), limit=None):
+        """Iterate over all nodes with a given key-value pair, oldest first.
+        
+        The requested properties are returned by the same query.
         
         arguments:
-        rel_type -- an uppercase string to determine the type of relationship between the two nodes, i.e. the predicate
-        start_node -- the outgoing node, from where the relationship starts, i.e. the subject 
-        end_node -- the incoming node, to where the relationship end, i.e the object
-        **properties -- list of keyword arguments which is completely added to the relationship.
+        key -- what key/identifier should be searched (string).
+        value -- what value has should that key have (type specified by key).
+        
+        keyword arguments:
+        keys -- the keys of the properties to return with every node
+        limit -- maximum number of nodes to return or None for all
         """
-        pass
-
-    @abc.abstractmethod
-    def find_node(self, key, value):
-        """abstract method to find a node in the database
+        query = 'START n=node:' + INDEX + '(' + _name(key) + '={value}) RETURN n%s ORDER BY ID(n)'
+        if limit is not None:
+            query += ' LIMIT {limit}'
+        return self._stream(query, keys, value=index_value(value), limit=limit)
+    
+    def neighbours(self, node, rel_type, reverse=False, keys=(), limit=None):
+        """Iterate over all nodes connected to a node by relationships of a type.
+        
+        The requested properties are returned by the same query.
         
         arguments:
-        key -- what key/identifier should be searched (string)
-        value -- what value has should that key have (type specified by key)
+        node -- the node to start from
+        rel_type -- the type of relationships to follow
+        
+        keyword arguments:
+        reverse -- True to follow the relationships from their end node to their start node
+        keys -- the keys of the properties to return with every node
+        limit -- maximum number of nodes to return or None for all
         """
-        pass
+        arrow = '<-[r:%s]-' if reverse else '-[r:%s]->'
+        query = 'START a=node({a}) MATCH (a)' + arrow % _name(rel_type) + '(n) RETURN n%s ORDER BY ID(r)'
+        if limit is not None:
+            query += ' LIMIT {limit}'
+        return self._stream(query, keys, a=node.id, limit=limit)
     
-    @abc.abstractmethod
+    def _cache_node(self, node, properties):
+        """Remember a new node as the latest one for its key-value pairs
+        
+        Pairs of the CACHED_KEYS are added to the cache, all others are
+        only replaced if they are cached already.
+        """
+        for key, value in properties.iteritems():
+            if value:
+                if key in CACHED_KEYS:
+                    self.node_cache.put((key, index_value(value)), node)
+                else:
+                    self.node_cache.refresh((key, index_value(value)), node)
+     
     def find_relationship(self, rel_type=None, start_node=None, end_node=None, bidirectional=None, limit=None):
-        """abstract method to find a relationship in the database
+        """Find a relationship with possible specifications.
+        
+        The database is queried for the given keyword arguments and returns
+        only the relationship with the highest identifier and its nodes.
         
         keyword arguments:
         rel_type -- type of relationships to find (None if any
         start_node -- concrete start node (None if any)
         end_node -- concrete end node to find (None if any)
         bidirectional --  True if reversed relationships should also be included
-        limit -- maximum number of relationships to match or None if no limit
+        limit -- only kept for compatibility, the latest relationship is always returned
         """
-        pass
+        starts, params = [], {}
+        if start_node is not None:
+            starts.append('a=node({a})')
+            params['a'] = start_node.id
+        if end_node is not None:
+            starts.append('b=node({b})')
+            params['b'] = end_node.id
+        rel = 'r:' + _name(rel_type) if rel_type else 'r'
+        if starts:
+            query = 'START %s MATCH (a)-[%s]-%s(b)' % (', '.join(starts), rel, '' if bidirectional else '>')
+        elif rel_type:
+            query = 'START r=relationship(*) MATCH (a)-[r]->(b) WHERE type(r) = {type}'
+            params['type'] = rel_type
+        else:
+            query = 'START r=relationship(*) MATCH (a)-[r]->(b)'
+        query += ' RETURN r, a, b ORDER BY ID(r) DESC LIMIT 1'
+        rows = self._cypher(query, **params)
+        if not rows:
+            return None
+        return self._relationship(rows[0])
     
-class Neo4JServer(ProvenanceStore):
-    """The Neo4J-Provenance Store.
+    def _relationship(self, row):
+        """Build a relationship from a row with the REST representations of the relationship and its nodes"""
+        data, first, second = row
+        nodes = dict((node.id, node) for node in (self._node(first), self._node(second)))
+        return Relationship(_ident(data['self']), data['type'], nodes[_ident(data['start'])],
+                            nodes[_ident(data['end'])], data.get('data') or {})
     
-    parameters:
-    graph_db -- connection to Neo4J backend (GraphDatabaseService)    
-    """
-    def __init__(self, controller):
-        super(Neo4JServer, self).__init__(controller)
-        self.graph_db = None
-        self.running = False
-        self.node_index = None
+    def relationships(self, node):
+        """Return all relationships of a node, outgoing and incoming ones, ordered by their identifier"""
+        rows = self._cypher('START a=node({a}) MATCH (a)-[r]-(b) RETURN r, a, b ORDER BY ID(r)', a=node.id)
+        relationships = []
+        for row in rows:
+            relationship = self._relationship(row)
+            # a relationship of the node with itself is matched twice
+            if not relationships or relationships[-1].id != relationship.id:
+                relationships.append(relationship)
+        return relationships
+    
+    def scan_nodes(self, prov_type=None, after=None, limit=PAGE_SIZE):
+        """Return a page of all nodes, ordered by their identifier.
         
-    def setup_database(self):
-        """Connect to the database and get or create the indexes"""
-        try:
-            self.graph_db = neo4j.GraphDatabaseService(URL)
-        except rest.ResourceNotFound:
-            print 'Database service not found'
-        self.node_index = self.graph_db.get_or_create_index(neo4j.Node, 'Nodes')
-                
-    def find_node(self, key, value):
-        """Find a node with a given key-value pair.
+        The reference node of Neo4J has no provenance node type and is never returned.
+        
+        keyword arguments:
+        prov_type -- the provenance node type of the nodes to return (None if any)
+        after -- the identifier of the last node of the previous page (None for the first page)
+        limit -- maximum number of nodes to return
+        """
+        query = 'START n=node(*) WHERE ID(n) > {after} AND '
+        query += 'n.prov_type! = {prov_type}' if prov_type is not None else 'HAS(n.prov_type)'
+        query += ' RETURN n ORDER BY ID(n) LIMIT {limit}'
+        rows = self._cypher(query, after=after if after is not None else -1, prov_type=prov_type, limit=limit)
+        return [self._node(row[0]) for row in rows]
+    
+    def scan_relationships(self, rel_type=None, after=None, limit=PAGE_SIZE):
+        """Return a page of all relationships with their nodes, ordered by their identifier.
+        
+        keyword arguments:
+        rel_type -- the type of the relationships to return (None if any)
+        after -- the identifier of the last relationship of the previous page (None for the first page)
+        limit -- maximum number of relationships to return
+        """
+        query = 'START r=relationship(*) MATCH (a)-[r]->(b) WHERE ID(r) > {after}'
+        if rel_type is not None:
+            query += ' AND type(r) = {type}'
+        query += ' RETURN r, a, b ORDER BY ID(r) LIMIT {limit}'
+        rows = self._cypher(query, after=after if after is not None else -1, type=rel_type, limit=limit)
+        return [self._relationship(row) for row in rows]
+        
+    def delete_nodes(self, nodes):
+        """Delete nodes with all their relationships, return the number of deleted nodes.
         
-        First search the node index for the key and value.
-        Then return the node with the highest identifier.
+        The nodes are deleted with a single query, Neo4J removes them from the index itself.
+        Cached lookups which may return one of them are dropped.
         
         arguments:
-        key -- what key/identifier should be searched (string).
-        value -- what value has should that key have (type specified by key)    .    
+        nodes -- the nodes to delete, all of them have to exist
         """
-        results = self.node_index.get(key, str(value))
-        result = None
-        ident = 0
-        for node in results:
-            if node.id > ident:
-                result = node
-                ident = node.id
-        return result
-     
-    def find_relationship(self, rel_type=None, start_node=None, end_node=None, bidirectional=None, limit=None):
-        """Find a relationship with possible specifications.
+        if not nodes:
+            return 0
+        self._cypher('START n=node({ids}) MATCH (n)-[r?]-() DELETE r, n', ids=[node.id for node in nodes])
+        for node in nodes:
+            for key, value in node.properties.iteritems():
+                if value:
+                    self.node_cache.invalidate((key, index_value(value)))
+        return len(nodes)
         
-        First match the database for the given keyword arguments.
-        Then return the relationship with the highest identifier.
+    def delete_relationships(self, relationships):
+        """Delete relationships with a single query, return the number of deleted relationships
         
-        keyword arguments:
-        rel_type -- type of relationships to find (None if any
-        start_node -- concrete start node (None if any)
-        end_node -- concrete end node to find (None if any)
-        bidirectional --  True if reversed relationships should also be included
-        limit -- maximum number of relationships to match or None if no limit    
+        arguments:
+        relationships -- the relationships to delete, all of them have to exist
+        """
+        if not relationships:
+            return 0
+        self._cypher('START r=relationship({ids}) DELETE r', ids=[relationship.id for relationship in relationships])
+        return len(relationships)
+        
+    def update_nodes(self, updates):
+        """Set properties of nodes and index their new values with a single request,
+        return the number of updated nodes.
+        
+        The index entries of the replaced values are removed, cached lookups of them are dropped.
+        
+        arguments:
+        updates -- list of pairs of a node and the properties to set (dict), all nodes have to exist
         """
-        results = self.graph_db.match(start_node=start_node, rel_type=rel_type, end_node=end_node, bidirectional=bidirectional, limit=limit)
-        result = None
-        ident = 0
-        for rel in results:
-            if rel.id > ident:
-                result = rel
-                ident = rel.id
-        return result   
+        jobs = []
+        for node, properties in updates:
+            uri = 'node/%d' % node.id
+            for key, value in properties.iteritems():
+                jobs.append({'method':'PUT', 'to':'/%s/properties/%s' % (uri, urllib.quote(key, '')),
+                             'body':value, 'id':len(jobs)})
+                old = node.properties.get(key)
+                if old:
+                    self.node_cache.invalidate((key, index_value(old)))
+                    jobs.append({'method':'DELETE', 'id':len(jobs), 'to':'/index/node/%s/%s/%s/%d' % (
+                        INDEX, urllib.quote(key, ''), urllib.quote(index_value(old).encode('utf-8'), ''), node.id)})
+                if value:
+                    jobs.append({'method':'POST', 'to':'/index/node/' + INDEX, 'id':len(jobs),
+                                 'body':{'key':key, 'value':value, 'uri':self._node_uri(node)}})
+        if jobs:
+            self._request('POST', 'batch', jobs, idempotent=False)
+        return len(updates)
         
     def create_node(self, prov_type, sdm_type, **properties):
         """Create a new node with its properties.
         
-        A node is created using the prov_type and sdm_type.
-        Then all given keyword arguments within 'properties' are added to the node.
-        After the node was added to the index, it's returned
+        A node is created using the prov_type and sdm_type and all given keyword
+        arguments within 'properties' and added to the index with a single request.
         
         arguments:
         prov_type -- an uppercase string to determine the provenance node type (ENTITY, ACTIVITY or AGENT).
         sdm_type -- an uppercase string to determine the type from the software development model.
         **properties -- list of key-value-pairs to add more properties to the node
         """
-        node, = self.graph_db.create({'prov_type':prov_type, 'type':sdm_type})
-        node.update_properties(properties)
-        for key, value in properties.iteritems():
-            if value:
-                self.node_index.add(key, value, node)
-        return node
+        batch = self.create_batch()
+        batch.create_node(prov_type, sdm_type, **properties)
+        return batch.submit()[0]
         
     def create_relationship(self, rel_type, start_node, end_node, **properties):
         """Create a new relationship between two nodes
@@ -184,11 +373,69 @@ class Neo4JServer(ProvenanceStore):
         end_node -- the incoming node, to where the relationship end, i.e the object
         **properties -- list of keyword arguments which is completely added to the relationship.
         """
-        relationship, = self.graph_db.create((start_node, rel_type, end_node))
-        relationship.update_properties(properties)
+        batch = self.create_batch()
+        batch.create_relationship(rel_type, start_node, end_node, **properties)
+        return batch.submit()[0]
+    
+    def submit_batch(self, batch):
+        """Write all operations of a batch within a single request.
+        
+        Nodes are created with all their properties and added to the index in the same request.
+        References between the operations are translated to references to the jobs of the request.
+        The request is not repeated once it was sent, so nothing is written twice.
+        
+        arguments:
+        batch -- the batch to write (WriteBatch)
+        """
+        if not batch.operations:
+            return []
+        jobs = []
+        positions = []
+        for operation in batch.operations:
+            positions.append(len(jobs))
+            if operation[0] == NODE:
+                _, prov_type, sdm_type, properties = operation
+                abstract = {'prov_type':prov_type, 'type':sdm_type}
+                abstract.update(properties)
+                jobs.append({'method':'POST', 'to':'/node', 'body':abstract, 'id':len(jobs)})
+                for key, value in properties.iteritems():
+                    if value:
+                        jobs.append({'method':'POST', 'to':'/index/node/' + INDEX, 'id':len(jobs),
+                                     'body':{'key':key, 'value':value, 'uri':'{%d}' % positions[-1]}})
+            else:
+                _, rel_type, start_node, end_node, properties = operation
+                start = ('{%d}' % positions[start_node.index] if isinstance(start_node, BatchReference)
+                         else self._node_uri(start_node))
+                end = ('{%d}' % positions[end_node.index] if isinstance(end_node, BatchReference)
+                       else self._node_uri(end_node))
+                jobs.append({'method':'POST', 'to':start + '/relationships', 'id':len(jobs),
+                             'body':{'to':end, 'type':rel_type, 'data':properties}})
+        responses = self._request('POST', 'batch', jobs, idempotent=False)
+        
+        results = []
+        for operation, position in zip(batch.operations, positions):
+            data = responses[position]['body']
+            if operation[0] == NODE:
+                node = self._node(data)
+                self._cache_node(node, operation[3])
+                results.append(node)
+            else:
+                _, rel_type, start_node, end_node, properties = operation
+                if isinstance(start_node, BatchReference):
+                    start_node = results[start_node.index]
+                if isinstance(end_node, BatchReference):
+                    end_node = results[end_node.index]
+                results.append(Relationship(_ident(data['self']), rel_type, start_node, end_node, properties))
+        return results
         
     def run(self):
         """starting the database service"""
-        if not self.graph_db:
+        if not self.running:
             self.setup_database()
-        self.running = True
\ No newline at end of file
+            self.pool.start_health_checks()
+        self.running = True
+    
+    def close(self):
+        """Stop the health checks and close all connections"""
+        self.pool.close()
+        self.running = False
@@ -0,0 +1,272 @@
+'''
+A thread-safe pool of persistent HTTP connections.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import httplib
+import json
+import logging
+import random
+import select
+import socket
+import threading
+import time
+import urlparse
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = 10
+TIMEOUT = 30.0
+KEEPALIVE = 60.0
+RETRIES = 3
+BACKOFF = 0.1
+MAX_BACKOFF = 5.0
+HEALTH_INTERVAL = 30.0
+
+# responses of a gateway or an overloaded server, idempotent requests are repeated after them
+TRANSIENT_STATUS = (502, 503, 504)
+
+HEADERS = {'Content-Type':'application/json', 'Accept':'application/json', 'Connection':'keep-alive'}
+
+class PoolTimeout(Exception):
+    """No connection became available in time"""
+
+class HTTPError(Exception):
+    """The server answered with an error
+
+    parameters:
+    status -- the status code of the response
+    body -- the decoded body of the response, its text if it isn't JSON, or None
+    """
+    def __init__(self, status, body):
+        message = body.get('message') if isinstance(body, dict) else None
+        super(HTTPError, self).__init__('HTTP %d: %s' % (status, message or body))
+        self.status = status
+        self.body = body
+
+class ConnectionPool(object):
+    """A pool of persistent HTTP connections to one server, shared by all threads.
+
+    At most 'size' connections are open at once, a thread waits up to 'timeout'
+    for a free one. Idle connections are reused most recently used first and closed
+    when they were idle for longer than 'keepalive'.
+    Failed requests are repeated with a jittered exponential backoff if that can't
+    write anything twice: after a connection error before the request was sent and,
+    for idempotent requests only, after any connection error or a status of
+    TRANSIENT_STATUS. Before a request which isn't idempotent is sent over a kept-alive
+    connection, the connection is checked and replaced if the server closed it.
+
+    parameters:
+    url -- the base URL, paths of requests are relative to it
+    size -- maximum number of open connections
+    timeout -- default seconds to wait for a connection and for every response
+    keepalive -- seconds an idle connection is kept open
+    retries -- number of times a failed request is repeated
+    backoff -- seconds to wait at most before the first repetition, doubled with every further one
+    max_backoff -- upper bound of the time to wait before a repetition
+    health_path -- path which is requested by 'check'
+    healthy -- result of the latest health check
+    """
+    def __init__(self, url, size=POOL_SIZE, timeout=TIMEOUT, keepalive=KEEPALIVE, retries=RETRIES,
+                 backoff=BACKOFF, max_backoff=MAX_BACKOFF, health_path=''):
+        parts = urlparse.urlparse(url)
+        self.connection_class = httplib.HTTPSConnection if parts.scheme == 'https' else httplib.HTTPConnection
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path if parts.path.endswith('/') else parts.path + '/'
+        self.size = size
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.health_path = health_path
+        self.healthy = None
+        self.idle = []
+        self.in_use = 0
+        self.condition = threading.Condition(threading.Lock())
+        self.stats = {'connections':0, 'reused':0, 'retries':0, 'failures':0, 'timeouts':0}
+        self.health_thread = None
+        self.stopping = threading.Event()
+
+    def uri(self, path):
+        """Return the absolute URI of a path relative to the base URL"""
+        port = ':%d' % self.port if self.port else ''
+        scheme = 'https' if self.connection_class is httplib.HTTPSConnection else 'http'
+        return '%s://%s%s%s%s' % (scheme, self.host, port, self.base_path, path.lstrip('/'))
+
+    def _checkout(self, timeout):
+        """Return an idle or new connection and whether it was used before, wait if all are in use"""
+        deadline = time.time() + timeout
+        with self.condition:
+            while not self.idle and self.in_use >= self.size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise PoolTimeout('no connection to %s:%s within %.1f s' % (self.host, self.port, timeout))
+                self.condition.wait(remaining)
+            self.in_use += 1
+            now = time.time()
+            while self.idle:
+                connection, last_used = self.idle.pop()
+                if now - last_used <= self.keepalive:
+                    self.stats['reused'] += 1
+                    return connection, True
+                connection.close()
+            self.stats['connections'] += 1
+        return self.connection_class(self.host, self.port, timeout=timeout), False
+
+    def _closed(self, connection):
+        """Return True if the server closed an idle connection, an idle connection only gets readable then"""
+        try:
+            readable, _, _ = select.select([connection.sock], [], [], 0)
+        except (select.error, socket.error, ValueError):
+            return True
+        return bool(readable)
+
+    def _checkin(self, connection, reusable):
+        """Return a connection to the pool, close it if it can't be reused"""
+        with self.condition:
+            self.in_use -= 1
+            if reusable:
+                self.idle.append((connection, time.time()))
+            else:
+                connection.close()
+            self.condition.notify()
+
+    def _count(self, name):
+        """Count an event in the request statistics"""
+        with self.condition:
+            self.stats[name] += 1
+
+    def _wait(self, attempt):
+        self._count('retries')
+        time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+
+    def request(self, method, path, body=None, timeout=None, idempotent=None):
+        """Send a request with a JSON body and return the decoded JSON response.
+
+        Raise an HTTPError if the server answers with an error status or a body which isn't JSON.
+
+        arguments:
+        method -- the HTTP method
+        path -- the path relative to the base URL or an absolute URI of the same server
+
+        keyword arguments:
+        body -- the object to send as JSON or None
+        timeout -- seconds to wait for a connection and for the response, None for the default
+        idempotent -- True if the request may be repeated after it was sent, False if it may write twice then,
+                      None to decide by the method (GET, PUT and DELETE are idempotent)
+        """
+        timeout = self.timeout if timeout is None else timeout
+        if idempotent is None:
+            idempotent = method in ('GET', 'HEAD', 'PUT', 'DELETE')
+        if '://' in path:
+            path = urlparse.urlparse(path).path
+        elif not path.startswith(self.base_path):
+            path = self.base_path + path.lstrip('/')
+        data = json.dumps(body) if body is not None else None
+
+        attempt = 0
+        while True:
+            connection, reused = self._checkout(timeout)
+            sent = False
+            try:
+                if reused and not idempotent and connection.sock is not None and self._closed(connection):
+                    connection.close()
+                if connection.sock is None:
+                    connection.connect()
+                    # small requests must not wait for the acknowledgement of the previous ones
+                    connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                connection.sock.settimeout(timeout)
+                connection.timeout = timeout
+                connection.request(method, path, data, HEADERS)
+                sent = True
+                response = connection.getresponse()
+                content = response.read()
+            except (socket.error, httplib.HTTPException) as e:
+                self._checkin(connection, False)
+                # once sent, the server may have processed the request even without a response
+                if attempt < self.retries and (not sent or idempotent):
+                    logger.debug('repeating %s %s after %r', method, path, e)
+                    self._wait(attempt)
+                    attempt += 1
+                    continue
+                self._count('failures')
+                raise
+            self._checkin(connection, not response.will_close)
+
+            # the body of an error may be anything, e.g. the HTML page of a gateway
+            if response.status in TRANSIENT_STATUS and idempotent and attempt < self.retries:
+                self._wait(attempt)
+                attempt += 1
+                continue
+            try:
+                result = json.loads(content) if content else None
+            except ValueError:
+                if response.status < 400:
+                    self._count('failures')
+                    raise HTTPError(response.status, 'invalid JSON in the response: %r' % content[:200])
+                result = content
+            if response.status >= 400:
+                self._count('failures')
+                raise HTTPError(response.status, result)
+            return result
+
+    def check(self):
+        """Request the health path, close all idle connections if it fails and return if it succeeded"""
+        try:
+            self.request('GET', self.health_path, timeout=min(self.timeout, 5.0))
+            self.healthy = True
+        except (socket.error, httplib.HTTPException, HTTPError, PoolTimeout) as e:
+            logger.warning('health check of %s:%s failed: %r', self.host, self.port, e)
+            self.healthy = False
+            self.clear()
+        return self.healthy
+
+    def start_health_checks(self, interval=HEALTH_INTERVAL):
+        """Check the health of the server every 'interval' seconds in a background thread"""
+        def run():
+            while not self.stopping.wait(interval):
+                self.check()
+        self.stopping.clear()
+        self.health_thread = threading.Thread(target=run, name='pool-health')
+        self.health_thread.daemon = True
+        self.health_thread.start()
+
+    def clear(self):
+        """Close all idle connections"""
+        with self.condition:
+            idle, self.idle = self.idle, []
+        for connection, _ in idle:
+            connection.close()
+
+    def close(self):
+        """Stop the health checks and close all idle connections"""
+        self.stopping.set()
+        if self.health_thread is not None:
+            self.health_thread.join()
+            self.health_thread = None
+        self.clear()
+
+    def status(self):
+        """Return the number of connections in use and idle and the request statistics"""
+        with self.condition:
+            status = dict(self.stats)
+            status.update({'in_use':self.in_use, 'idle':len(self.idle), 'size':self.size, 'healthy':self.healthy})
+            return status
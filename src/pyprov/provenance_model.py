@@ -19,41 +19,139 @@ Created on 05.04.2013
 
 '''
 import uuid
+
 class Agent(object):
-    def __init__(self):
-        self.agent_id = uuid.uuid4()
+    """An agent of PROV-DM, its uuid is only generated when it's read"""
+    __slots__ = ('_agent_id',)
+
+    @property
+    def agent_id(self):
+        try:
+            return self._agent_id
+        except AttributeError:
+            self._agent_id = uuid.uuid4()
+            return self._agent_id
 
 class Entity(object):
-    def __init__(self):
-        self.entity_id = uuid.uuid4()
+    """An entity of PROV-DM, its uuid is only generated when it's read"""
+    __slots__ = ('_entity_id',)
+
+    @property
+    def entity_id(self):
+        try:
+            return self._entity_id
+        except AttributeError:
+            self._entity_id = uuid.uuid4()
+            return self._entity_id
         
 class Activity(object):
+    """An activity of PROV-DM, its uuid is only generated when it's read"""
+    __slots__ = ('_activity_id', 'start_time', 'end_time')
+
     def __init__(self):
-        self.activity_id = uuid.uuid4()
         self.start_time = None
         self.end_time = None
 
-class Usage(object):
+    @property
+    def activity_id(self):
+        try:
+            return self._activity_id
+        except AttributeError:
+            self._activity_id = uuid.uuid4()
+            return self._activity_id
+
+ENTITY, ACTIVITY, AGENT = 'entity', 'activity', 'agent'
+
+SCALARS = (basestring, int, long, float, bool)
+
+def reference(kind, value, param):
+    """Return the reference to an element from its JSON value or raise a ValueError
+    
+    Entities are referred to by identifier and version (as a tuple), activities by their name
+    and agents by their identifier.
+    """
+    if kind == ENTITY:
+        try:
+            return (value['identifier'], value['version'])
+        except (KeyError, TypeError):
+            raise ValueError(param + ' needs an identifier and a version')
+    if not isinstance(value, (basestring, int, long)):
+        raise ValueError(param + ' must be the ' + ('name' if kind == ACTIVITY else 'identifier') + ' of an ' + kind)
+    return value
+
+class Relation(object):
+    """A relation between two elements, read from and written to a JSON object by the names of its slots
+    
+    parameters:
+    ROLES -- name and kind of the related elements, from the start to the end of the relationship
+    """
+    __slots__ = ()
+    ROLES = ()
+    
+    @classmethod
+    def from_json(cls, record):
+        """Create a relation from its decoded JSON object, raise a ValueError if it's incomplete"""
+        if not isinstance(record, dict):
+            raise ValueError('a relation must be a JSON object')
+        relation = cls.__new__(cls)
+        roles = dict(cls.ROLES)
+        for name in cls.__slots__:
+            value = record.get(name)
+            if name in roles:
+                if value is None:
+                    raise ValueError('missing parameter: ' + name)
+                value = reference(roles[name], value, name)
+            elif value is not None and not isinstance(value, SCALARS):
+                raise ValueError(name + ' must be a string or a number')
+            setattr(relation, name, value)
+        return relation
+    
+    def to_json(self):
+        """Return the JSON object of the relation, as accepted by 'from_json'"""
+        roles = dict(self.ROLES)
+        record = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if value is None:
+                continue
+            if roles.get(name) == ENTITY:
+                value = {'identifier':value[0], 'version':value[1]}
+            record[name] = value
+        return record
+
+class Usage(Relation):
+    __slots__ = ('activity', 'entity', 'usage_id', 'time')
+    ROLES = (('activity', ACTIVITY), ('entity', ENTITY))
+
     def __init__(self, activity, entity=None, usage_id=None, time=None):
         self.activity = activity
         self.entity = entity
         self.usage_id = usage_id
         self.time = time
 
-class Generation(object):
+class Generation(Relation):
+    __slots__ = ('entity', 'activity', 'generation_id', 'time')
+    ROLES = (('entity', ENTITY), ('activity', ACTIVITY))
+
     def __init__(self, entity, activity=None, generation_id=None, time=None):
         self.entity = entity
         self.activity = activity
         self.generation_id = generation_id
         self.time = time
         
-class Communication(object):
+class Communication(Relation):
+    __slots__ = ('informed', 'informant', 'communication_id')
+    ROLES = (('informed', ACTIVITY), ('informant', ACTIVITY))
+
     def __init__(self, informed, informant, communication_id=None):
         self.informed = informed
         self.informant = informant
         self.communication_id = communication_id
         
-class Derivation(object):
+class Derivation(Relation):
+    __slots__ = ('generated_entity', 'used_entity', 'derivation_id', 'activity', 'generation', 'usage')
+    ROLES = (('generated_entity', ENTITY), ('used_entity', ENTITY))
+
     def __init__(self, generated_entity, used_entity, 
                     derivation_id=None, activity=None,
                     generation=None, usage=None):
@@ -64,14 +162,20 @@ class Derivation(object):
         self.generation = generation
         self.usage = usage
 
-class Attribution(object):
+class Attribution(Relation):
+    __slots__ = ('entity', 'agent', 'attribution_id')
+    ROLES = (('entity', ENTITY), ('agent', AGENT))
+
     def __init__(self, entity, agent, attribution_id=None):
         self.entity = entity
         self.agent = agent
         self.attribution_id = attribution_id
 
-class Association(object):
+class Association(Relation):
+    __slots__ = ('activity', 'association_id', 'agent')
+    ROLES = (('activity', ACTIVITY), ('agent', AGENT))
+
     def __init__(self, activity, association_id=None, agent=None):
         self.activity = activity
         self.association_id = association_id
-        self.agent = agent
\ No newline at end of file
+        self.agent = agent
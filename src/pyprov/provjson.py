@@ -0,0 +1,181 @@
+'''
+Streaming reader and writer for PROV-JSON documents.
+
+The reader decodes a document incrementally: only the attributes of the current
+record and the unread rest of the current chunk are kept in memory, so documents
+of any size can be read. Bundles are read like the document itself.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import codecs
+import json
+from pyprov.interchange import Record, QualifiedName, literal, PREFIX, NAMESPACE
+
+CHUNK_SIZE = 65536
+
+WHITESPACE = u' \t\r\n'
+
+class _Scanner(object):
+    """Decode the JSON values of a stream one by one.
+
+    parameters:
+    buffer -- the decoded text which is not consumed yet starts at 'position'
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json = json.JSONDecoder()
+        self.buffer = u''
+        self.position = 0
+        self.eof = False
+
+    def _fill(self):
+        """Append the next chunk of the stream to the buffer, return False at the end of the stream"""
+        if self.eof:
+            return False
+        data = self.stream.read(CHUNK_SIZE)
+        text = self.decoder.decode(data, not data) if isinstance(data, str) else data
+        self.buffer = self.buffer[self.position:] + text
+        self.position = 0
+        self.eof = not data
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character or '' at the end of the stream"""
+        while True:
+            buffer, position = self.buffer, self.position
+            while position < len(buffer) and buffer[position] in WHITESPACE:
+                position += 1
+            self.position = position
+            if position < len(buffer):
+                return buffer[position]
+            if not self._fill():
+                return ''
+
+    def expect(self, characters):
+        """Consume the next character, which has to be one of the given ones, and return it"""
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError('PROV-JSON: expected one of %r but found %r' % (characters, character or 'the end'))
+        self.position += 1
+        return character
+
+    def value(self):
+        """Decode and return the next JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.json.raw_decode(self.buffer, self.position)
+            except ValueError:
+                # the value may continue in the next chunk
+                if not self._fill():
+                    raise
+                continue
+            # a number at the end of the buffer may continue in the next chunk as well
+            if end < len(self.buffer) or not self._fill():
+                self.position = end
+                return value
+
+    def members(self):
+        """Yield the keys of the next JSON object, the value of every key has to be consumed before the next one"""
+        self.expect(u'{')
+        if self.peek() == u'}':
+            self.position += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(u':')
+            yield key
+            if self.expect(u',}') == u'}':
+                return
+
+def _decode(value):
+    """Return the Python value of an attribute value, typed literals are converted by their type"""
+    if isinstance(value, dict) and '$' in value:
+        return literal(value['$'], value.get('type'))
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
+
+def _encode(value):
+    """Return the PROV-JSON representation of an attribute value"""
+    if isinstance(value, QualifiedName):
+        return {'$':value, 'type':'prov:QUALIFIED_NAME'}
+    if isinstance(value, list):
+        return [_encode(item) for item in value]
+    return value
+
+def _records(scanner):
+    """Yield the records of a document or bundle"""
+    for section in scanner.members():
+        if section == 'prefix':
+            scanner.value()
+        elif section == 'bundle':
+            for _ in scanner.members():
+                for record in _records(scanner):
+                    yield record
+        else:
+            for ident in scanner.members():
+                value = scanner.value()
+                # several records with the same identifier are given as a list
+                for attributes in value if isinstance(value, list) else [value]:
+                    yield Record(section, ident, dict((key, _decode(item)) for key, item in attributes.iteritems()))
+
+def read(stream):
+    """Yield a Record for every element and relation of a PROV-JSON document.
+
+    arguments:
+    stream -- a file-like object with the UTF-8 encoded document
+    """
+    scanner = _Scanner(stream)
+    for record in _records(scanner):
+        yield record
+    if scanner.peek():
+        raise ValueError('PROV-JSON: unexpected data after the document')
+
+def write(records, stream, prefixes=None):
+    """Write records as a PROV-JSON document and return the number of written records.
+
+    All records of one kind have to follow each other, as they form one section of the document.
+
+    arguments:
+    records -- iterable of records (Record)
+    stream -- a file-like object to write the document to
+
+    keyword arguments:
+    prefixes -- namespaces by prefix to declare besides the one of pyprov
+    """
+    declared = {PREFIX:NAMESPACE}
+    declared.update(prefixes or {})
+    stream.write('{"prefix": %s' % json.dumps(declared, sort_keys=True))
+    current, written, count = None, set(), 0
+    for record in records:
+        if record.kind != current:
+            if record.kind in written:
+                raise ValueError('PROV-JSON: the records of kind %s do not follow each other' % record.kind)
+            stream.write('%s,\n"%s": {' % ('\n}' if current else '', record.kind))
+            current = record.kind
+            written.add(current)
+            separator = '\n'
+        ident = record.id or '_:%s%d' % (record.kind, count)
+        attributes = dict((key, _encode(value)) for key, value in record.attributes.iteritems())
+        stream.write('%s  %s: %s' % (separator, json.dumps(ident), json.dumps(attributes, sort_keys=True)))
+        separator = ',\n'
+        count += 1
+    stream.write('%s}\n' % ('\n}' if current else ''))
+    return count
@@ -0,0 +1,275 @@
+'''
+Streaming reader and writer for PROV-N documents.
+
+The reader splits the document into tokens chunk by chunk and parses one statement
+at a time, so documents of any size can be read. Statements within bundles are
+read like the ones of the document itself.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import codecs
+import json
+import re
+from pyprov.interchange import Record, QualifiedName, literal, ELEMENTS, PREFIX, NAMESPACE
+
+CHUNK_SIZE = 65536
+
+TOKEN = re.compile(r'''
+    \s+ | //[^\n]*(?:\n|\Z) | /\*.*?\*/
+  | (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<iri><[^>]*>)
+  | (?P<qname>'[^']*')
+  | (?P<punct>%%|[(),;=\[\]])
+  | (?P<word>(?!//|/\*)[^\s(),;=\[\]"'<>%]+)
+''', re.S | re.X)
+
+# the attributes given by the positional arguments of every statement, after the identifier
+POSITIONS = {
+    'entity':(),
+    'activity':('prov:startTime', 'prov:endTime'),
+    'agent':(),
+    'used':('prov:activity', 'prov:entity', 'prov:time'),
+    'wasGeneratedBy':('prov:entity', 'prov:activity', 'prov:time'),
+    'wasInvalidatedBy':('prov:entity', 'prov:activity', 'prov:time'),
+    'wasStartedBy':('prov:activity', 'prov:trigger', 'prov:starter', 'prov:time'),
+    'wasEndedBy':('prov:activity', 'prov:trigger', 'prov:ender', 'prov:time'),
+    'wasInformedBy':('prov:informed', 'prov:informant'),
+    'wasDerivedFrom':('prov:generatedEntity', 'prov:usedEntity', 'prov:activity', 'prov:generation', 'prov:usage'),
+    'wasAttributedTo':('prov:entity', 'prov:agent'),
+    'wasAssociatedWith':('prov:activity', 'prov:agent', 'prov:plan'),
+    'actedOnBehalfOf':('prov:delegate', 'prov:responsible', 'prov:activity'),
+    'wasInfluencedBy':('prov:influencee', 'prov:influencer'),
+    'specializationOf':('prov:specificEntity', 'prov:generalEntity'),
+    'alternateOf':('prov:alternate1', 'prov:alternate2'),
+    'hadMember':('prov:collection', 'prov:entity'),
+}
+
+# statements without arguments or with a name and an IRI, which declare no record
+DECLARATIONS = ('document', 'endDocument', 'bundle', 'endBundle', 'prefix', 'default')
+
+ESCAPES = {u'"':u'\\"', u'\\':u'\\\\', u'\n':u'\\n', u'\r':u'\\r', u'\t':u'\\t'}
+
+class _Tokens(object):
+    """The tokens of a stream as pairs of kind and text, comments and whitespace are skipped"""
+    def __init__(self, stream):
+        self.stream = stream
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = u''
+        self.position = 0
+        self.eof = False
+        self.pending = None
+
+    def _fill(self):
+        data = self.stream.read(CHUNK_SIZE)
+        text = self.decoder.decode(data, not data) if isinstance(data, str) else data
+        self.buffer = self.buffer[self.position:] + text
+        self.position = 0
+        self.eof = not data
+
+    def next(self):
+        """Return the next token or None at the end of the stream"""
+        if self.pending is not None:
+            token, self.pending = self.pending, None
+            return token
+        while True:
+            if self.position >= len(self.buffer):
+                if self.eof:
+                    return None
+                self._fill()
+                continue
+            match = TOKEN.match(self.buffer, self.position)
+            # a token at the end of the buffer may continue in the next chunk
+            if (match is None or match.end() == len(self.buffer)) and not self.eof:
+                self._fill()
+                continue
+            if match is None:
+                raise ValueError('PROV-N: unexpected %r' % self.buffer[self.position:self.position + 40])
+            self.position = match.end()
+            if match.lastgroup:
+                return match.lastgroup, match.group(match.lastgroup)
+
+    def push(self, token):
+        """Return a token, so it's the next one again"""
+        self.pending = token
+
+    def expect(self, kind, text=None):
+        token = self.next()
+        if token is None or token[0] != kind or (text is not None and token[1] != text):
+            raise ValueError('PROV-N: expected %s but found %r' % (text or kind, token[1] if token else 'the end'))
+        return token[1]
+
+def _string(text):
+    """Return the value of a string literal"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text[1:-1]
+
+def _value(tokens):
+    """Parse the value of an attribute"""
+    kind, text = tokens.next() or (None, None)
+    if kind == 'string':
+        value = _string(text)
+        token = tokens.next()
+        if token == ('punct', '%%'):
+            return literal(value, tokens.expect('word'))
+        # a language tag belongs to the string
+        if token is not None and not (token[0] == 'word' and token[1].startswith('@')):
+            tokens.push(token)
+        return value
+    if kind == 'qname':
+        return QualifiedName(text[1:-1])
+    if kind == 'word':
+        for convert in (int, float):
+            try:
+                return convert(text)
+            except ValueError:
+                pass
+        return text
+    raise ValueError('PROV-N: expected an attribute value but found %r' % text)
+
+def _attributes(tokens):
+    """Parse an attribute list after its '[', repeated keys give a list of values"""
+    attributes = {}
+    token = tokens.next()
+    if token == ('punct', ']'):
+        return attributes
+    tokens.push(token)
+    while True:
+        key = tokens.expect('word')
+        tokens.expect('punct', '=')
+        value = _value(tokens)
+        if key in attributes:
+            if not isinstance(attributes[key], list):
+                attributes[key] = [attributes[key]]
+            attributes[key].append(value)
+        else:
+            attributes[key] = value
+        if tokens.expect('punct') == ']':
+            return attributes
+
+def _statement(kind, tokens):
+    """Parse the arguments of a statement after its '(' and return its record"""
+    ident, arguments, attributes = None, [], {}
+    while True:
+        token = tokens.next()
+        if token is None:
+            raise ValueError('PROV-N: statement %s is not closed' % kind)
+        token_kind, text = token
+        if token == ('punct', ')'):
+            break
+        if token == ('punct', '['):
+            attributes = _attributes(tokens)
+        elif token == ('punct', ';'):
+            ident = arguments.pop() if arguments else None
+        elif token_kind == 'word':
+            arguments.append(None if text == '-' else text)
+        elif token != ('punct', ','):
+            raise ValueError('PROV-N: unexpected %r in statement %s' % (text, kind))
+    if kind in ELEMENTS and arguments:
+        ident = arguments.pop(0)
+    for role, argument in zip(POSITIONS.get(kind, ()), arguments):
+        if argument is not None:
+            attributes[role] = argument
+    return Record(kind, ident, attributes)
+
+def read(stream):
+    """Yield a Record for every element and relation of a PROV-N document.
+
+    arguments:
+    stream -- a file-like object with the UTF-8 encoded document
+    """
+    tokens = _Tokens(stream)
+    while True:
+        token = tokens.next()
+        if token is None:
+            return
+        kind, text = token
+        if kind != 'word':
+            raise ValueError('PROV-N: expected a statement but found %r' % text)
+        if text in ('prefix', 'bundle'):
+            tokens.next()
+            if text == 'prefix':
+                tokens.expect('iri')
+        elif text == 'default':
+            tokens.expect('iri')
+        elif text not in DECLARATIONS:
+            tokens.expect('punct', '(')
+            yield _statement(text, tokens)
+
+def _literal(value):
+    """Return the PROV-N representation of an attribute value"""
+    if isinstance(value, QualifiedName):
+        return u"'%s'" % value
+    if isinstance(value, bool):
+        return u'"%s" %%%% xsd:boolean' % ('true' if value else 'false')
+    if isinstance(value, (int, long)):
+        return u'"%d" %%%% xsd:int' % value
+    if isinstance(value, float):
+        return u'"%r" %%%% xsd:double' % value
+    if not isinstance(value, unicode):
+        value = str(value).decode('utf-8')
+    return u'"%s"' % u''.join(ESCAPES.get(character, character) for character in value)
+
+def _statement_text(record):
+    """Return the PROV-N statement of a record"""
+    positions = POSITIONS.get(record.kind, ())
+    attributes = dict(record.attributes)
+    arguments = []
+    for role in positions:
+        value = attributes.pop(role, None)
+        arguments.append(unicode(value) if value is not None else u'-')
+    # the times of an activity are given both or not at all
+    if record.kind in ELEMENTS and all(argument == u'-' for argument in arguments):
+        arguments = []
+    pairs = []
+    for key in sorted(attributes):
+        values = attributes[key] if isinstance(attributes[key], list) else [attributes[key]]
+        pairs.extend(u'%s=%s' % (key, _literal(value)) for value in values)
+    if pairs:
+        arguments.append(u'[%s]' % u', '.join(pairs))
+    if record.kind in ELEMENTS:
+        return u'%s(%s)' % (record.kind, u', '.join([record.id] + arguments))
+    # identifiers of blank nodes are left out, they are only meaningful within their document
+    if record.id and not record.id.startswith('_:'):
+        return u'%s(%s; %s)' % (record.kind, record.id, u', '.join(arguments))
+    return u'%s(%s)' % (record.kind, u', '.join(arguments))
+
+def write(records, stream, prefixes=None):
+    """Write records as a PROV-N document and return the number of written records.
+
+    arguments:
+    records -- iterable of records (Record)
+    stream -- a file-like object to write the UTF-8 encoded document to
+
+    keyword arguments:
+    prefixes -- namespaces by prefix to declare besides the one of pyprov
+    """
+    declared = {PREFIX:NAMESPACE}
+    declared.update(prefixes or {})
+    stream.write('document\n')
+    for prefix, namespace in sorted(declared.iteritems()):
+        stream.write('  prefix %s <%s>\n' % (prefix, namespace))
+    count = 0
+    for record in records:
+        if record.kind not in POSITIONS:
+            raise ValueError('PROV-N: unknown kind of record: %s' % record.kind)
+        stream.write((u'  %s\n' % _statement_text(record)).encode('utf-8'))
+        count += 1
+    stream.write('endDocument\n')
+    return count
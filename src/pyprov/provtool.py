@@ -0,0 +1,208 @@
+'''
+Command line tool to import PROV documents into the provenance store, to export the store,
+to give the activities of former versions a time partition, to drop the activities of old
+time partitions, to rebalance a sharded store and to write
+a snapshot of the graph for analytics (see pyprov.snapshot, needs NumPy).
+
+Usage (with src on the PYTHONPATH):
+    python -m pyprov.provtool import history.json more.provn
+    python -m pyprov.provtool import --format provn - < history.provn
+    python -m pyprov.provtool export --format provn --output store.provn
+    python -m pyprov.provtool --store sqlite --database pyprov.db export --prefix ex=http://example.org/ > store.json
+    python -m pyprov.provtool backfill
+    python -m pyprov.provtool drop --since 2025-01-01T00:00:00Z --before 2026-01-01T00:00:00Z
+    python -m pyprov.provtool --store sharded --shards sqlite:a.db,sqlite:b.db,sqlite:c.db --shard-directory shards.db rebalance
+    python -m pyprov.provtool snapshot --output /var/lib/pyprov/snapshot
+
+The store is chosen like for main.py, by the options or by the PYPROV_* environment variables.
+Documents are read and written as streams, so their size is only limited by the store.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import argparse
+import os
+import sys
+import time
+import pyprov.provjson, pyprov.provn, pyprov.wsgi
+from pyprov.interchange import Importer, Exporter, BATCH_SIZE, epoch_time
+from pyprov.store import PAGE_SIZE
+from pyprov.shard import MOVE_BATCH, StoreInUse
+
+FORMATS = {'json':pyprov.provjson, 'provn':pyprov.provn}
+# the options of the Controller which concern the store, the others only matter when serving requests
+STORE_OPTIONS = ('store', 'url', 'database', 'shards', 'shard_directory', 'cache_size', 'cache_ttl', 'pool_size', 'pool_timeout')
+EXTENSIONS = {'.json':'json', '.provn':'provn'}
+
+def guess_format(path, default='json'):
+    """Return the format of a document by the extension of its path"""
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), default)
+
+def import_documents(store, paths, document_format=None, batch_size=BATCH_SIZE, log=sys.stderr):
+    """Import documents into a store and return the number of written records by kind.
+
+    arguments:
+    store -- the provenance store to write to (ProvenanceStore)
+    paths -- the paths of the documents, '-' for the standard input
+
+    keyword arguments:
+    document_format -- 'json' or 'provn' or None to guess it from the path of every document
+    batch_size -- number of records written with one batch
+    log -- a file to report the progress to or None
+    """
+    importer = Importer(store, batch_size)
+    for path in paths:
+        started, before = time.time(), sum(importer.counts.values())
+        reader = FORMATS[document_format or guess_format(path)].read
+        if path == '-':
+            importer.run(reader(sys.stdin))
+        else:
+            with open(path, 'rb') as document:
+                importer.run(reader(document))
+        if log:
+            records = sum(importer.counts.values()) - before
+            seconds = time.time() - started
+            log.write('%s: %d records in %.1f s (%.0f records/s)\n' % (path, records, seconds,
+                                                                      records / seconds if seconds else 0))
+    return importer.counts
+
+def export_document(store, stream, document_format='json', prefixes=None, page_size=PAGE_SIZE):
+    """Write all elements and relations of a store as one document and return the number of records.
+
+    arguments:
+    store -- the provenance store to read (ProvenanceStore)
+    stream -- a file-like object to write the document to
+
+    keyword arguments:
+    document_format -- 'json' or 'provn'
+    prefixes -- namespaces by prefix of the qualified names of imported records
+    page_size -- number of nodes or relationships read with one call
+    """
+    return FORMATS[document_format].write(Exporter(store, page_size), stream, prefixes)
+
+def time_value(text):
+    """Return seconds since the epoch of a command line argument with seconds or an xsd:dateTime"""
+    try:
+        return float(text)
+    except ValueError:
+        seconds = epoch_time(text)
+        if seconds is None:
+            raise argparse.ArgumentTypeError('expected seconds since the epoch or an xsd:dateTime: %r' % text)
+        return seconds
+
+def parse_args(argv=None):
+    """Return the keyword arguments of the Controller and the command from the command line"""
+    parser = argparse.ArgumentParser(description='Import PROV documents into PyProv, export them, drop old activities, '
+                                                 'rebalance shards and write snapshots')
+    parser.add_argument('--store', choices=('neo4j', 'memory', 'sqlite', 'sharded'))
+    parser.add_argument('--url', help='URL of the REST API of the Neo4J server')
+    parser.add_argument('--database', help='database file of the SQLite store')
+    parser.add_argument('--shards', help="stores of the sharded store, like 'sqlite:a.db,sqlite:b.db'")
+    parser.add_argument('--shard-directory', help='database file of the relationships across shards')
+    commands = parser.add_subparsers(dest='command')
+
+    importing = commands.add_parser('import', help='import PROV documents')
+    importing.add_argument('paths', nargs='+', metavar='document', help="path of a document, '-' for the standard input")
+    importing.add_argument('--format', choices=sorted(FORMATS), help='format of the documents (default: by extension)')
+    importing.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='records written with one batch')
+
+    exporting = commands.add_parser('export', help='export the whole store as one PROV document')
+    exporting.add_argument('--format', choices=sorted(FORMATS), help='format of the document (default: by extension)')
+    exporting.add_argument('--output', help='path of the document (default: the standard output)')
+    exporting.add_argument('--prefix', action='append', default=[], metavar='PREFIX=NAMESPACE',
+                           help='namespace of a prefix of imported qualified names, may be repeated')
+    exporting.add_argument('--page-size', type=int, default=PAGE_SIZE, help='nodes or relationships read at once')
+
+    backfilling = commands.add_parser('backfill', help='give the activities written by former versions of PyProv '
+                                                       'a time partition and a numeric timestamp')
+    backfilling.add_argument('--page-size', type=int, default=PAGE_SIZE, help='activities read and updated at once')
+
+    dropping = commands.add_parser('drop', help='delete the activities of all whole time partitions within a range')
+    dropping.add_argument('--before', type=time_value, required=True, metavar='TIME',
+                          help='seconds since the epoch or xsd:dateTime, its own partition is kept')
+    dropping.add_argument('--since', type=time_value, required=True, metavar='TIME',
+                          help='time of the oldest activity to delete, every hour from it on is read')
+
+    rebalancing = commands.add_parser('rebalance', help='move the nodes of a sharded store to the shards owning them, '
+                                                       'after new shards were added at the end of --shards, '
+                                                       'while PyProv is stopped')
+    rebalancing.add_argument('--batch-size', type=int, default=MOVE_BATCH, help='nodes moved at once')
+
+    snapshotting = commands.add_parser('snapshot', help='write a snapshot of the graph for analytics (needs NumPy)')
+    snapshotting.add_argument('--output', required=True, help='directory of the snapshot, a former one is replaced')
+    snapshotting.add_argument('--page-size', type=int, default=PAGE_SIZE, help='nodes or relationships read at once')
+    args = parser.parse_args(argv)
+
+    options = dict((option, value) for option, value in pyprov.wsgi.options_from_environ().iteritems()
+                   if option in STORE_OPTIONS)
+    for option in ('store', 'url', 'database', 'shards', 'shard_directory'):
+        if getattr(args, option) is not None:
+            options[option] = getattr(args, option)
+    if args.command == 'export':
+        try:
+            args.prefixes = dict(prefix.split('=', 1) for prefix in args.prefix)
+        except ValueError:
+            parser.error('a prefix has to be given as PREFIX=NAMESPACE')
+    if args.command == 'rebalance' and options.get('store') != 'sharded':
+        parser.error('only a sharded store can be rebalanced')
+    if args.command == 'snapshot':
+        try:
+            import numpy
+        except ImportError:
+            parser.error('snapshots need NumPy')
+    return options, args
+
+def main(argv=None):
+    options, args = parse_args(argv)
+    from pyprov.main import Controller
+    controller = Controller(**options)
+    try:
+        controller.graph_db.run()
+    except StoreInUse as e:
+        sys.stderr.write('%s, stop PyProv or let it rebalance itself (--rebalance)\n' % e)
+        return 1
+    try:
+        if args.command == 'import':
+            counts = import_documents(controller.graph_db, args.paths, args.format, args.batch_size)
+            sys.stderr.write(''.join('%s: %d\n' % item for item in sorted(counts.iteritems())))
+        elif args.command == 'backfill':
+            updated = controller.graph_db.backfill_partitions(args.page_size)
+            sys.stderr.write('activities: %d updated\n' % updated)
+        elif args.command == 'drop':
+            deleted = controller.graph_db.drop_partitions(args.before, args.since)
+            sys.stderr.write('activities: %d deleted\n' % deleted)
+        elif args.command == 'rebalance':
+            moved = controller.graph_db.rebalance(args.batch_size)
+            sys.stderr.write('nodes: %d moved\n' % moved)
+        elif args.command == 'snapshot':
+            from pyprov.snapshot import write_snapshot
+            started = time.time()
+            nodes, relationships = write_snapshot(controller.graph_db, args.output, args.page_size)
+            sys.stderr.write('%s: %d nodes, %d relationships in %.1f s\n' % (args.output, nodes, relationships,
+                                                                             time.time() - started))
+        elif args.output:
+            with open(args.output, 'wb') as document:
+                export_document(controller.graph_db, document, args.format or guess_format(args.output),
+                                args.prefixes, args.page_size)
+        else:
+            export_document(controller.graph_db, sys.stdout, args.format or 'json', args.prefixes, args.page_size)
+    finally:
+        controller.stop()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
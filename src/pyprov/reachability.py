@@ -0,0 +1,295 @@
+'''
+Reachability index for the lineage of entities.
+
+The index keeps the transitive closure of the derivation between entities,
+so reachability and impact queries are answered without traversing the store.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import logging
+import marshal
+import os
+import threading
+from array import array
+from pyprov.store import PAGE_SIZE, index_value
+
+ANCESTORS, DESCENDANTS = 'ancestors', 'descendants'
+
+# version of the file written by 'save'
+FORMAT = 2
+
+TYPECODE = 'l'
+
+# the interval set of entities without ancestors or descendants, shared as it's never changed
+EMPTY = array(TYPECODE)
+
+logger = logging.getLogger(__name__)
+
+def _single(number):
+    """Return the interval set of one number"""
+    return array(TYPECODE, (number, number + 1))
+
+def _union(first, second):
+    """Return the union of two interval sets.
+
+    An interval set is an array of the start and end (exclusive) of disjoint,
+    sorted intervals. The arrays are never changed, so an argument may be returned
+    and the same set may be kept for many entities.
+    """
+    if not second:
+        return first
+    if not first:
+        return second
+    merged = array(TYPECODE)
+    i, j, n, m = 0, 0, len(first), len(second)
+    while i < n or j < m:
+        if j >= m or (i < n and first[i] <= second[j]):
+            start, end = first[i], first[i + 1]
+            i += 2
+        else:
+            start, end = second[j], second[j + 1]
+            j += 2
+        if merged and start <= merged[-1]:
+            if end > merged[-1]:
+                merged[-1] = end
+        else:
+            merged.append(start)
+            merged.append(end)
+    return merged
+
+def _intersects(first, second):
+    """Return True if two interval sets have a number in common"""
+    i, j, n, m = 0, 0, len(first), len(second)
+    while i < n and j < m:
+        if first[i + 1] <= second[j]:
+            i += 2
+        elif second[j + 1] <= first[i]:
+            j += 2
+        else:
+            return True
+    return False
+
+def _members(intervals):
+    """Yield all numbers of an interval set, lowest first"""
+    for position in xrange(0, len(intervals), 2):
+        for number in xrange(intervals[position], intervals[position + 1]):
+            yield number
+
+def _entity(node):
+    """Return identifier and version of an entity node or None if it has none"""
+    identifier, version = node.properties.get('identifier'), node.properties.get('version')
+    if identifier is None or version is None:
+        return None
+    return identifier, version
+
+class ReachabilityIndex(object):
+    """Incrementally maintained transitive closure of the derivation between entities.
+
+    Every entity (identifier and version) gets a number, in the order the entities
+    are seen. For every entity, the index keeps the numbers of all its ancestors and
+    descendants as interval sets (see '_union'). Entities of one workflow are seen
+    one after another, so the closure of a chain of processes is a few intervals
+    instead of one number per related entity.
+    A process adds a derivation from each of its inputs to each of its outputs,
+    so all ancestors of the inputs become ancestors of all descendants of the outputs.
+
+    The index is rebuilt from the store at start or loaded from a file (see 'restore')
+    and updated as a DevFactory observer, i.e. it knows all processes and
+    derivations (wasDerivedFrom) written since.
+
+    parameters:
+    numbers -- the number of every entity by identifier and version (as string)
+    versions -- the numbers of all versions of an entity by identifier
+    entities -- identifier and version of every entity by number
+    ancestors, descendants -- the interval sets of every entity by number
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.numbers = {}
+        self.versions = {}
+        self.entities = []
+        self.ancestors = []
+        self.descendants = []
+
+    def _number(self, identifier, version):
+        """Return the number of an entity, add the entity if it's new"""
+        key = (identifier, index_value(version))
+        number = self.numbers.get(key)
+        if number is None:
+            number = self.numbers[key] = len(self.entities)
+            self.versions.setdefault(identifier, []).append(number)
+            self.entities.append((identifier, version))
+            self.ancestors.append(EMPTY)
+            self.descendants.append(EMPTY)
+        return number
+
+    def _lookup(self, identifier, version=None):
+        """Return the numbers of an entity or of all its versions if no version is given"""
+        if version is None:
+            return self.versions.get(identifier, [])
+        number = self.numbers.get((identifier, index_value(version)))
+        return [] if number is None else [number]
+
+    def process_written(self, process):
+        """Add the derivations of a written process (observer interface of DevFactory)"""
+        self.add_derivations([(inp.identifier, inp.version) for inp in process.inp],
+                             [(outp.identifier, outp.version) for outp in process.outp])
+
+    def derivation_written(self, derivation):
+        """Add a written derivation between two entities (observer interface of DevFactory)"""
+        self.add_derivations([derivation.used_entity], [derivation.generated_entity])
+
+    def add_derivations(self, used, generated):
+        """Add a derivation from every used to every generated entity.
+
+        arguments:
+        used -- list of identifier and version of the used entities
+        generated -- list of identifier and version of the generated entities
+        """
+        if not used or not generated:
+            return
+        with self.lock:
+            sources = array(TYPECODE)
+            for identifier, version in used:
+                number = self._number(identifier, version)
+                sources = _union(sources, _union(self.ancestors[number], _single(number)))
+            targets = array(TYPECODE)
+            for identifier, version in generated:
+                number = self._number(identifier, version)
+                targets = _union(targets, _union(self.descendants[number], _single(number)))
+            for number in _members(sources):
+                self.descendants[number] = _union(self.descendants[number], targets)
+            for number in _members(targets):
+                self.ancestors[number] = _union(self.ancestors[number], sources)
+
+    def related(self, identifier, direction, version=None):
+        """Yield identifier and version of all ancestors or descendants of an entity.
+
+        arguments:
+        identifier -- the identifier of the entity
+        direction -- ANCESTORS or DESCENDANTS
+
+        keyword arguments:
+        version -- the version of the entity or None for all versions
+        """
+        sets = self.ancestors if direction == ANCESTORS else self.descendants
+        intervals = array(TYPECODE)
+        for number in self._lookup(identifier, version):
+            intervals = _union(intervals, sets[number])
+        for number in _members(intervals):
+            yield self.entities[number]
+
+    def reachable(self, source, target, source_version=None, target_version=None):
+        """Return True if the target entity was derived from the source entity.
+
+        arguments:
+        source -- identifier of the source entity
+        target -- identifier of the target entity
+
+        keyword arguments:
+        source_version, target_version -- the versions of the entities or None for any version
+        """
+        targets = array(TYPECODE)
+        for number in self._lookup(target, target_version):
+            targets = _union(targets, _single(number))
+        for number in self._lookup(source, source_version):
+            if _intersects(self.descendants[number], targets):
+                return True
+        return False
+
+    def rebuild(self, store, page_size=PAGE_SIZE):
+        """Replace the index by the derivations of all processes and wasDerivedFrom relations of a store.
+
+        A process derives the entities it generated (WAS_GENERATED_BY) from the ones
+        it used (USED), like the lineage joins them. Call it before provenance is written,
+        derivations written while the store is read may be missed.
+
+        arguments:
+        store -- the provenance store to read (ProvenanceStore)
+
+        keyword arguments:
+        page_size -- number of relationships read at once
+        """
+        used, generated = {}, {}
+        for relationship in store.iter_all_relationships('USED', page_size):
+            entity = _entity(relationship.end_node)
+            if entity is not None:
+                used.setdefault(relationship.start_node.id, []).append(entity)
+        for relationship in store.iter_all_relationships('WAS_GENERATED_BY', page_size):
+            entity = _entity(relationship.start_node)
+            if entity is not None:
+                generated.setdefault(relationship.end_node.id, []).append(entity)
+        index = ReachabilityIndex()
+        # processes in order of their identifiers, so entities are numbered about in order of time
+        for process in sorted(generated):
+            index.add_derivations(used.get(process, []), generated[process])
+        for relationship in store.iter_all_relationships('WAS_DERIVED_FROM', page_size):
+            entities = _entity(relationship.end_node), _entity(relationship.start_node)
+            if None not in entities:
+                index.add_derivations([entities[0]], [entities[1]])
+        with self.lock:
+            self.numbers, self.versions = index.numbers, index.versions
+            self.entities, self.ancestors, self.descendants = index.entities, index.ancestors, index.descendants
+        return len(self.entities)
+
+    def restore(self, store, path=None):
+        """Load the index from a file written by 'save' or rebuild it from the store
+        if there is no such file or it can't be read
+
+        The file is deleted once it's loaded. It's only written again when the index is
+        saved, so after a crash the index is rebuilt instead of missing the derivations
+        written since it was loaded.
+
+        arguments:
+        store -- the provenance store to rebuild the index from (ProvenanceStore)
+
+        keyword arguments:
+        path -- the path of the file or None to rebuild the index in any case
+        """
+        if path and os.path.exists(path):
+            try:
+                self.load(path)
+                os.remove(path)
+                return
+            except (EOFError, TypeError, ValueError) as e:
+                logger.warning('rebuilding the reachability index, %s can\'t be read: %s', path, e)
+        self.rebuild(store)
+
+    def save(self, path):
+        """Write the index to a file"""
+        with self.lock:
+            data = marshal.dumps((FORMAT, self.entities, [intervals.tostring() for intervals in self.ancestors],
+                                  [intervals.tostring() for intervals in self.descendants]))
+        with open(path + '.tmp', 'wb') as index_file:
+            index_file.write(data)
+        os.rename(path + '.tmp', path)
+
+    def load(self, path):
+        """Replace the index by the one written to a file, raise a ValueError if it has another format"""
+        with open(path, 'rb') as index_file:
+            data = marshal.loads(index_file.read())
+        if not isinstance(data, tuple) or len(data) != 4 or data[0] != FORMAT:
+            raise ValueError('unknown format of the reachability index')
+        _, entities, ancestors, descendants = data
+        with self.lock:
+            self.numbers, self.versions = {}, {}
+            self.entities, self.ancestors, self.descendants = [], [], []
+            for identifier, version in entities:
+                self._number(identifier, version)
+            self.ancestors = [array(TYPECODE, intervals) for intervals in ancestors]
+            self.descendants = [array(TYPECODE, intervals) for intervals in descendants]
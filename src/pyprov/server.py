@@ -23,7 +23,9 @@ Created on 26.03.2013
    See the License for the specific language governing permissions and
    limitations under the License.
 '''
-from flask import Flask
+import time
+from flask import Flask, g, request
+import pyprov.metrics
 import pyprov.views as views
 class Server(object):
     '''
@@ -45,22 +47,136 @@ class Server(object):
 
         rest_view = views.RestView()
         grem_view = views.GremlinView()
+        metrics_view = views.MetricsView()
         
         self.app.register_blueprint(rest_view)
         self.app.register_blueprint(grem_view)
+        self.app.register_blueprint(metrics_view)
         
         rest_view.server = self
+        grem_view.server = self
+        metrics_view.server = self
+        
+        self.app.before_request(self._before_request)
+        self.app.teardown_request(self._teardown_request)
+    
+    def _before_request(self):
+        """Remember the start of a request and start profiling it if it's sampled"""
+        g.started = time.time()
+        profiler = self.controller.profiler
+        g.profile = profiler.start() if profiler else None
+    
+    def _teardown_request(self, exception=None):
+        """Time a request per endpoint and keep its profile if it was slow"""
+        started = getattr(g, 'started', None)
+        if started is None:
+            return
+        endpoint = request.endpoint or 'unknown'
+        pyprov.metrics.histogram('http.' + endpoint).observe(time.time() - started)
+        if getattr(g, 'profile', None):
+            self.controller.profiler.stop(g.profile, endpoint)
     
+    @property
+    def queued(self):
+        """True if provenance is written in the background"""
+        return self.controller.ingest is not None
+    
+    def handler(self, model_type):
+        """
+        Return the handler of a model type of the factory, raise a ValueError if it's unknown.
+        """
+        return self.controller.dev_factory.handler(model_type)
+    
+    @pyprov.metrics.timed('server.write_prov')
     def write_prov(self, sdm_type, *args, **kwargs):
         """
         Take the raw provenance information and forward it to the factory.
         
         This method is mostly just for seperation of concerns.
+        If provenance is written in the background, the information is queued
+        and a receipt to look up its status is returned (see 'prov_status').
+        Queued records only keep positional arguments, so keyword arguments raise a TypeError then.
         """
+        if self.queued:
+            if kwargs:
+                raise TypeError('provenance written in the background takes no keyword arguments, got %s'
+                                % ', '.join(sorted(kwargs)))
+            return self.controller.ingest.submit(sdm_type, args)
         return self.controller.dev_factory.create(sdm_type, *args, **kwargs)
     
-    def run(self):
+    @pyprov.metrics.timed('server.write_prov_bulk')
+    def write_prov_bulk(self, sdm_type, records):
+        """
+        Forward many records of raw provenance information to the factory.
+        
+        Every record is a tuple of the arguments for 'write_prov'.
+        Returns None for every written record or the error which prevented writing it.
+        If provenance is written in the background, a receipt is returned for every 
+        queued record and a QueueFull error for every rejected one.
+        """
+        if self.queued:
+            return self.controller.ingest.submit_many(sdm_type, records)
+        return self.controller.dev_factory.create_many(sdm_type, records)
+    
+    def read_lineage(self, identifier, direction, version=None, max_depth=None):
+        """
+        Return an iterator over the lineage of an entity (see Lineage.traverse).
+        """
+        return self.controller.lineage.traverse(identifier, direction, version, max_depth)
+    
+    @property
+    def indexed(self):
+        """True if the derivation between entities is kept in a reachability index"""
+        return self.controller.reachability is not None
+    
+    def read_related(self, identifier, direction, version=None):
+        """
+        Return an iterator over the ancestors or descendants of an entity from the reachability index
+        (see ReachabilityIndex.related), each as a dictionary with identifier and version.
+        """
+        return ({'identifier':related, 'version':related_version} for related, related_version
+                in self.controller.reachability.related(identifier, direction, version))
+    
+    def read_reachable(self, source, target, source_version=None, target_version=None):
+        """
+        Tell if the target entity was derived from the source entity using the reachability index
+        (see ReachabilityIndex.reachable).
+        """
+        return self.controller.reachability.reachable(source, target, source_version, target_version)
+    
+    def read_activities(self, start, end, after=None):
+        """
+        Return an iterator over the activities started within a time range (see ProvenanceStore.iter_activities).
+        """
+        return self.controller.graph_db.iter_activities(start, end, ('name',), after)
+    
+    @pyprov.metrics.timed('server.run_query')
+    def run_query(self, text, params=None, limit=None):
+        """
+        Return a traversal query bound to its parameters, iterate over it for the results (see QueryEngine.query).
+        """
+        return self.controller.queries.query(text, params, limit)
+    
+    def metrics(self):
+        """
+        Return all metrics of the application in the Prometheus text format.
+        """
+        return pyprov.metrics.render(pyprov.metrics.REGISTRY.collect() + self.controller.metrics())
+    
+    def prov_status(self, receipt):
+        """Return the status of provenance written in the background or None if unknown"""
+        if self.queued:
+            return self.controller.ingest.status(receipt)
+        return None
+    
+    def run(self, host='127.0.0.1', port=5000):
+        """
+        Serve the application with the development server of Flask.
+        
+        Every request is handled in its own thread, so a slow write doesn't block other clients.
+        For production, serve the application with a WSGI server (see pyprov.wsgi).
+        """
         self.app.debug = False
-        self.app.run()
+        self.app.run(host, port, threaded=True)
         self.running = True
         
@@ -0,0 +1,996 @@
+'''
+The sharded provenance store, which distributes the provenance over several stores.
+
+Every new node is placed on a shard by consistent hashing of its routing key: the
+identifier of agents and entities, the name of activities (see HashRing). Activities
+follow their agent, entities the activity which generated or used them, if the
+relationship is written with the same batch (see ANCHORS). So a process, its actor
+and its new entities share a shard and most relationships never leave it. The few
+relationships between nodes of different shards are kept in a small directory of
+their own (see EdgeDirectory).
+
+The parts of a batch are written to their shards in parallel, lookups ask all shards
+at once, so ingest grows with the number of shards. Node identifiers are global:
+the identifier within the shard times ID_FACTOR plus the number of the shard.
+
+Shards are added at runtime with 'add_shard', 'rebalance' then moves the stored nodes
+which belong to another shard now, a few at a time, while the store is in use.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import bisect
+import collections
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import thread
+import threading
+import time
+from pyprov.cache import LookupCache, CACHE_SIZE, CACHE_TTL
+from pyprov.coalesce import Pending
+from pyprov.store import (ProvenanceStore, WriteBatch, BatchReference, Node, Relationship, NODE, RELATIONSHIP,
+                          PAGE_SIZE, index_value)
+
+logger = logging.getLogger(__name__)
+
+# the number of the last shard is reserved for the relationships of the directory
+MAX_SHARDS = 255
+DIRECTORY = MAX_SHARDS
+ID_FACTOR = MAX_SHARDS + 1
+
+# points of every shard on the ring, more points spread the keys more evenly
+REPLICAS = 64
+# threads which ask the shards at once
+WORKERS = 16
+# nodes moved at once by 'rebalance', the store is paused while a chunk is moved
+MOVE_BATCH = 100
+
+# seconds to wait for the lock of the store, while a restarted process replaces the former one
+LOCK_TIMEOUT = 30.0
+
+# relationships which place a new node on the shard of the other one: the start node follows the end node,
+# or the end node the start node if True (see ShardedStore._route)
+ANCHORS = {'WAS_ASSOCIATED_WITH':False, 'WAS_GENERATED_BY':False, 'USED':True}
+
+# keys whose nodes are cached as soon as they are created, like the ones of the Neo4J store
+CACHED_KEYS = ('identifier', 'entity')
+
+# the provenance node types of the nodes of the directory, the stubs of nodes of the shards
+# and the records of moved nodes
+STUB = 'STUB'
+FORWARD = 'FORWARD'
+
+class StoreInUse(Exception):
+    """Another process uses the sharded store"""
+
+def global_id(shard, ident):
+    """Return the global identifier of a node or relationship of a shard"""
+    return ident * ID_FACTOR + shard
+
+def split_id(ident):
+    """Return the number of the shard and the identifier within the shard of a global identifier"""
+    return ident % ID_FACTOR, ident // ID_FACTOR
+
+def _local_after(after, shard):
+    """Return the identifier within a shard behind which a scan continues after a global identifier"""
+    return (after - shard) // ID_FACTOR if after is not None else None
+
+def routing_key(prov_type, properties):
+    """Return the key which places a new node on the ring"""
+    key = properties.get('name') if prov_type == 'ACTIVITY' else properties.get('identifier')
+    if key is None:
+        key = json.dumps(properties, sort_keys=True)
+    return key
+
+def _hash(key):
+    return int(hashlib.md5(index_value(key).encode('utf-8')).hexdigest()[:16], 16)
+
+def _recency(node):
+    """Order nodes found on several shards, the latest activity by its timestamp"""
+    try:
+        timestamp = float(node.properties.get('timestamp'))
+    except (TypeError, ValueError):
+        timestamp = None
+    return timestamp, node.id
+
+def parse_shards(text):
+    """Return name, kind and argument of every shard of a list like 'memory,sqlite:a.db,neo4j:http://host:7474/db/data/'
+
+    The name of a shard is its entry of the list, repeated entries are numbered.
+    """
+    shards, counts = [], collections.Counter()
+    for entry in text.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        kind, _, argument = entry.partition(':')
+        counts[entry] += 1
+        name = entry if counts[entry] == 1 else '%s#%d' % (entry, counts[entry])
+        shards.append((name, kind, argument or None))
+    if not shards:
+        raise ValueError('no shards given: %r' % text)
+    return shards
+
+class HashRing(object):
+    """The shard of every routing key by consistent hashing.
+
+    Every shard has 'replicas' points on the ring, derived from its name. A key belongs
+    to the shard of the first point behind its hash, so a new shard only takes over
+    the keys in front of its own points and all others stay where they are.
+
+    parameters:
+    points -- the hashes of all points, sorted
+    owners -- the number of the shard of every point
+    """
+    def __init__(self, replicas=REPLICAS):
+        self.replicas = replicas
+        self.points = []
+        self.owners = []
+
+    def add(self, shard, name):
+        """Add the points of a shard"""
+        for replica in xrange(self.replicas):
+            point = _hash(u'%s#%d' % (name, replica))
+            position = bisect.bisect(self.points, point)
+            self.points.insert(position, point)
+            self.owners.insert(position, shard)
+
+    def shard(self, key):
+        """Return the number of the shard which owns a key"""
+        return self.owners[bisect.bisect(self.points, _hash(key)) % len(self.points)]
+
+class Gate(object):
+    """Let any number of threads pass together or a single one alone.
+
+    The thread which passes alone passes the shared gate as well, so it can use
+    the methods which take the shared gate themselves.
+    """
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.passing = 0
+        self.holder = None
+
+    @contextlib.contextmanager
+    def shared(self):
+        if self.holder == thread.get_ident():
+            yield
+            return
+        with self.condition:
+            while self.holder is not None:
+                self.condition.wait()
+            self.passing += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.passing -= 1
+                if not self.passing:
+                    self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        with self.condition:
+            while self.holder is not None:
+                self.condition.wait()
+            # no one else passes from now on, so the threads passing already are waited for
+            self.holder = thread.get_ident()
+            while self.passing:
+                self.condition.wait()
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.holder = None
+                self.condition.notify_all()
+
+class FanOut(object):
+    """Run a function for several arguments at once.
+
+    The first argument is run by the calling thread, the others by the workers.
+    Before 'start' and after 'stop', all of them are run one after another.
+    """
+    def __init__(self, workers=WORKERS, name='shard'):
+        self.queue = collections.deque()
+        self.condition = threading.Condition(threading.Lock())
+        self.workers = [threading.Thread(target=self._work, name='%s-%d' % (name, i)) for i in xrange(workers)]
+        self.running = False
+
+    def start(self):
+        self.running = True
+        for worker in self.workers:
+            worker.daemon = True
+            worker.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        for worker in self.workers:
+            worker.join()
+
+    def map(self, function, arguments):
+        """Return the result of the function for every argument, raise the first exception"""
+        arguments = list(arguments)
+        if not self.running or len(arguments) < 2:
+            return [function(argument) for argument in arguments]
+        pending = [Pending() for _ in arguments[1:]]
+        with self.condition:
+            self.queue.extend((function, argument, result) for argument, result in zip(arguments[1:], pending))
+            self.condition.notify_all()
+        first = function(arguments[0])
+        return [first] + [result.result() for result in pending]
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.queue and self.running:
+                    self.condition.wait()
+                if not self.queue:
+                    return
+                function, argument, result = self.queue.popleft()
+            try:
+                result.set_result(function(argument))
+            # the store may raise anything, it's passed on to the caller
+            except Exception as e:
+                result.set_error(e)
+
+class EdgeDirectory(object):
+    """The relationships between nodes of different shards.
+
+    They are kept in a provenance store of their own, between stub nodes which stand
+    for the nodes of the shards and are indexed by their global identifier ('ref').
+
+    parameters:
+    store -- the provenance store of the directory (ProvenanceStore)
+    stubs -- the stub nodes by global node identifier (LookupCache)
+    lock -- held while stubs are created or deleted, so every node has a single one
+    """
+    def __init__(self, store):
+        self.store = store
+        self.stubs = LookupCache(ttl=None)
+        self.lock = threading.Lock()
+
+    def _stubs(self, idents):
+        """Return the stub of every global node identifier, None for nodes without one"""
+        stubs = [self.stubs.get(ident) for ident in idents]
+        missing = [position for position, stub in enumerate(stubs) if stub is None]
+        if missing:
+            found = self.store.find_nodes([('ref', str(idents[position])) for position in missing])
+            for position, stub in zip(missing, found):
+                if stub is not None:
+                    stubs[position] = stub
+                    self.stubs.put(idents[position], stub)
+        return stubs
+
+    def _row(self, relationship):
+        """Return identifier, type, global start and end node and properties of a relationship of the directory"""
+        return (relationship.id, relationship.type, int(relationship.start_node.properties['ref']),
+                int(relationship.end_node.properties['ref']), relationship.properties)
+
+    def add(self, relationships):
+        """Write relationships with a single batch and return their identifiers within the directory
+
+        arguments:
+        relationships -- list of type, global start and end node identifier and properties of every relationship
+        """
+        with self.lock:
+            idents = list(set(ident for _, start, end, _ in relationships for ident in (start, end)))
+            stubs = dict(zip(idents, self._stubs(idents)))
+            batch = self.store.create_batch()
+            for ident in idents:
+                if stubs[ident] is None:
+                    stubs[ident] = batch.create_node(STUB, STUB, ref=str(ident))
+            for rel_type, start, end, properties in relationships:
+                batch.create_relationship(rel_type, stubs[start], stubs[end], **properties)
+            results = batch.submit()
+            for ident in idents:
+                if isinstance(stubs[ident], BatchReference):
+                    self.stubs.put(ident, results[stubs[ident].index])
+        return [relationship.id for relationship in results[len(results) - len(relationships):]]
+
+    def neighbours(self, ident, rel_type, reverse=False, limit=None):
+        """Return the global identifiers of the nodes connected to a node by relationships of a type"""
+        stub = self._stubs([ident])[0]
+        if stub is None:
+            return []
+        return [int(values[0]) for _, values in self.store.neighbours(stub, rel_type, reverse, ('ref',), limit)]
+
+    def relationships(self, ident):
+        """Return all relationships of a node (see '_row')"""
+        stub = self._stubs([ident])[0]
+        return [self._row(relationship) for relationship in self.store.relationships(stub)] if stub else []
+
+    def find(self, rel_type, start, end, bidirectional=None):
+        """Return the latest relationship between global node identifiers like 'find_relationship' (see '_row') or None"""
+        stubs = self._stubs([ident for ident in (start, end) if ident is not None])
+        if None in stubs:
+            return None
+        start_stub = stubs.pop(0) if start is not None else None
+        end_stub = stubs.pop(0) if end is not None else None
+        relationship = self.store.find_relationship(rel_type, start_stub, end_stub, bidirectional)
+        return self._row(relationship) if relationship else None
+
+    def scan(self, rel_type=None, after=None, limit=PAGE_SIZE):
+        """Return a page of all relationships, ordered by their identifier (see '_row')"""
+        return [self._row(relationship) for relationship in self.store.scan_relationships(rel_type, after, limit)]
+
+    def forward(self, moves):
+        """Record the new global identifiers of moved nodes with a single batch
+
+        arguments:
+        moves -- list of the old and the new global identifier of every moved node
+        """
+        batch = self.store.create_batch()
+        for old, new in moves:
+            batch.create_node(FORWARD, FORWARD, old=str(old), new=str(new))
+        batch.submit()
+
+    def forwards(self):
+        """Iterate over the old and the new global identifier of all moved nodes, in order of their moves"""
+        for node in self.store.iter_all_nodes(FORWARD):
+            yield int(node.properties['old']), int(node.properties['new'])
+
+    def remove_relationships(self, idents):
+        """Delete relationships of the directory by their identifiers within the directory"""
+        return self.store.delete_relationships([Relationship(ident, None, None, None, {}) for ident in idents])
+
+    def remove(self, idents):
+        """Delete the stubs of global node identifiers with all their relationships"""
+        with self.lock:
+            stubs = [stub for stub in self._stubs(idents) if stub is not None]
+            for ident in idents:
+                self.stubs.invalidate(ident)
+            return self.store.delete_nodes(stubs) if stubs else 0
+
+class ShardedStore(ProvenanceStore):
+    """A provenance store which distributes the nodes over several stores.
+
+    All nodes and relationships returned have global identifiers (see 'global_id'),
+    the ones created within a shard get the number of the shard, the ones of
+    the directory the number DIRECTORY. A batch is written to every shard at once;
+    if a shard or the directory fails, the parts written already are deleted again
+    (see '_roll_back'), so a repeated batch doesn't store anything twice.
+
+    Moved nodes keep answering under their old identifiers, which are forwarded to the
+    new ones. The forwards are recorded in the directory and read at start, but like the
+    directory and the cache they are used by a single process: while the store runs,
+    it holds the lock file 'lock_path', so no other process can use it at the same time.
+    Nodes are moved while the store serves requests by 'start_rebalance'.
+
+    The operations are timed as 'shards.<method>', the ones of the shards as 'store.<method>'.
+
+    parameters:
+    shards -- the stores of the shards by number (list of ProvenanceStore)
+    names -- the names of the shards, their points on the ring are derived from them
+    ring -- the owner of every routing key (HashRing)
+    directory -- the relationships between nodes of different shards (EdgeDirectory)
+    moved -- the new global identifier of every node moved by 'rebalance' by its old one
+    lock_path -- the file which is locked while the store runs or None if it's used by one process anyway
+    gate -- passed together by all operations, alone by 'add_shard' and while nodes are moved (Gate)
+    node_cache -- the latest node for every searched or created key-value pair (LookupCache)
+    """
+    operation_prefix = 'shards'
+
+    def __init__(self, controller, shards, directory, cache_size=CACHE_SIZE, cache_ttl=CACHE_TTL,
+                 workers=WORKERS, replicas=REPLICAS, lock_path=None):
+        """Create the store of the shards, given as list of names and stores.
+
+        arguments:
+        shards -- list of the name and the provenance store of every shard
+        directory -- the provenance store of the relationships across shards, which has to be
+                     as durable as the shards
+
+        keyword arguments:
+        cache_size -- maximum number of cached nodes
+        cache_ttl -- seconds until a cached node has to be searched again or None to keep it
+        workers -- threads which ask the shards at once
+        replicas -- points of every shard on the ring
+        lock_path -- the file which is locked while the store runs, None if the store can't be shared anyway
+        """
+        if not shards:
+            raise ValueError('a sharded store needs a shard at least')
+        if len(shards) > MAX_SHARDS:
+            raise ValueError('a sharded store has %d shards at most' % MAX_SHARDS)
+        self.shards = []
+        self.names = []
+        self.ring = HashRing(replicas)
+        for name, store in shards:
+            self._add(name, store)
+        self.directory = EdgeDirectory(directory)
+        self.moved = {}
+        self.node_cache = LookupCache(cache_size, cache_ttl)
+        self.gate = Gate()
+        self.fan_out = FanOut(workers)
+        self.lock_path = lock_path
+        self.lock_file = None
+        self.stopping = threading.Event()
+        self.rebalancing = None
+        self.running = False
+        super(ShardedStore, self).__init__(controller)
+
+    @property
+    def round_trips(self):
+        """Requests sent to the databases of the shards and of the directory"""
+        return sum(store.round_trips for store in self.shards + [self.directory.store])
+
+    @round_trips.setter
+    def round_trips(self, value):
+        # counted by the shards, the counter set by ProvenanceStore is not used
+        pass
+
+    def _add(self, name, store):
+        if name in self.names:
+            raise ValueError('there is a shard named %s already' % name)
+        self.shards.append(store)
+        self.names.append(name)
+        self.ring.add(len(self.shards) - 1, name)
+        return len(self.shards) - 1
+
+    def _resolve(self, ident):
+        """Return the current global identifier of a node which may have been moved"""
+        while ident in self.moved:
+            ident = self.moved[ident]
+        return ident
+
+    def _shard(self, node):
+        """Return the number of the shard of a node"""
+        return split_id(self._resolve(node.id))[0]
+
+    def _local(self, node):
+        """Return the number of the shard of a node and the node of the shard"""
+        shard, ident = split_id(self._resolve(node.id))
+        return shard, Node(ident, node.prov_type, node.type, node.properties)
+
+    def _global_node(self, shard, node):
+        if node is None:
+            return None
+        return Node(global_id(shard, node.id), node.prov_type, node.type, node.properties)
+
+    def _global_relationship(self, shard, relationship):
+        return Relationship(global_id(shard, relationship.id), relationship.type,
+                            self._global_node(shard, relationship.start_node),
+                            self._global_node(shard, relationship.end_node), relationship.properties)
+
+    def _directory_relationships(self, rows):
+        """Return the relationships of rows of the directory (see EdgeDirectory._row) with their nodes"""
+        idents = list(set(ident for row in rows for ident in row[2:4]))
+        nodes = dict(zip(idents, self._get_nodes(idents)))
+        return [Relationship(global_id(DIRECTORY, ident), rel_type, nodes[start], nodes[end], properties)
+                for ident, rel_type, start, end, properties in rows]
+
+    def create_node(self, prov_type, sdm_type, **properties):
+        """Create a node on the shard which owns its routing key (see 'routing_key')"""
+        batch = self.create_batch()
+        batch.create_node(prov_type, sdm_type, **properties)
+        return batch.submit()[0]
+
+    def create_relationship(self, rel_type, start_node, end_node, **properties):
+        """Create a relationship on the shard of its nodes or in the directory"""
+        batch = self.create_batch()
+        batch.create_relationship(rel_type, start_node, end_node, **properties)
+        return batch.submit()[0]
+
+    def submit_batch(self, batch):
+        """Write the part of a batch of every shard with a single call, all parts at once.
+
+        Relationships between nodes of different shards are written to the directory
+        afterwards with a single batch. If any of these calls fails, the others are rolled back
+        and the error is raised.
+
+        arguments:
+        batch -- the batch to write (WriteBatch)
+        """
+        with self.gate.shared():
+            return self._submit(batch.operations, self._route(batch.operations))
+
+    def _route(self, operations):
+        """Return the shard of every node created by a batch by the position of its operation.
+
+        A node with an anchor relationship within the batch (see ANCHORS) is placed on the
+        shard of the anchor's end node, every other node on the owner of its routing key.
+        """
+        anchors = {}
+        for operation in operations:
+            if operation[0] == RELATIONSHIP and operation[1] in ANCHORS:
+                follower, leader = (operation[3], operation[2]) if ANCHORS[operation[1]] else operation[2:4]
+                if isinstance(follower, BatchReference):
+                    anchors.setdefault(follower.index, leader)
+        shards = {}
+        for index, operation in enumerate(operations):
+            if operation[0] != NODE or index in shards:
+                continue
+            chain, shard = [index], None
+            while True:
+                anchor = anchors.get(chain[-1])
+                if not isinstance(anchor, BatchReference):
+                    if anchor is not None:
+                        shard = self._shard(anchor)
+                    break
+                if anchor.index in shards:
+                    shard = shards[anchor.index]
+                    break
+                # anchors forming a cycle are ignored
+                if anchor.index in chain or operations[anchor.index][0] != NODE:
+                    break
+                chain.append(anchor.index)
+            for position in reversed(chain):
+                if shard is None:
+                    _, prov_type, _, properties = operations[position]
+                    shard = self.ring.shard(routing_key(prov_type, properties))
+                shards[position] = shard
+        return shards
+
+    def _submit(self, operations, shards):
+        """Write the operations of a batch with the nodes on the given shards, return the created items"""
+        parts = {}
+        positions = {}
+        across = []
+        for index, operation in enumerate(operations):
+            if operation[0] == NODE:
+                _, prov_type, sdm_type, properties = operation
+                shard = shards[index]
+                if shard not in parts:
+                    parts[shard] = WriteBatch(self.shards[shard])
+                positions[index] = (shard, parts[shard].create_node(prov_type, sdm_type, **properties))
+                continue
+            _, rel_type, start_node, end_node, properties = operation
+            start_shard, start = positions[start_node.index] if isinstance(start_node, BatchReference) else self._local(start_node)
+            end_shard, end = positions[end_node.index] if isinstance(end_node, BatchReference) else self._local(end_node)
+            if start_shard != end_shard:
+                across.append(index)
+                continue
+            if start_shard not in parts:
+                parts[start_shard] = WriteBatch(self.shards[start_shard])
+            positions[index] = (start_shard, parts[start_shard].create_relationship(rel_type, start, end, **properties))
+
+        def submit(shard):
+            try:
+                return parts[shard].submit(), None
+            # the store may raise anything, the parts of the other shards are rolled back then
+            except Exception as e:
+                return None, e
+        numbers = sorted(parts)
+        outcomes = dict(zip(numbers, self.fan_out.map(submit, numbers)))
+        written = dict((shard, items) for shard, (items, error) in outcomes.iteritems() if error is None)
+        errors = [error for _, error in outcomes.itervalues() if error is not None]
+        if errors:
+            self._roll_back(written)
+            raise errors[0]
+        results = [None] * len(operations)
+        for index, (shard, reference) in positions.iteritems():
+            item = written[shard][reference.index]
+            if operations[index][0] == NODE:
+                results[index] = self._global_node(shard, item)
+            else:
+                results[index] = self._global_relationship(shard, item)
+
+        if across:
+            relationships = []
+            for index in across:
+                _, rel_type, start_node, end_node, properties = operations[index]
+                if isinstance(start_node, BatchReference):
+                    start_node = results[start_node.index]
+                if isinstance(end_node, BatchReference):
+                    end_node = results[end_node.index]
+                relationships.append((rel_type, start_node, end_node, properties))
+            try:
+                idents = self.directory.add([(rel_type, self._resolve(start.id), self._resolve(end.id), properties)
+                                             for rel_type, start, end, properties in relationships])
+            except Exception:
+                self._roll_back(written)
+                raise
+            for index, ident, (rel_type, start, end, properties) in zip(across, idents, relationships):
+                results[index] = Relationship(global_id(DIRECTORY, ident), rel_type, start, end, properties)
+        for result in results:
+            if isinstance(result, Node):
+                self._cache_node(result)
+        return results
+
+    def _roll_back(self, written):
+        """Delete the nodes and relationships written by the parts of a failed batch
+
+        arguments:
+        written -- the items created on every shard by the number of the shard
+        """
+        def roll_back(shard):
+            items = written[shard]
+            try:
+                self.shards[shard].delete_relationships([item for item in items if isinstance(item, Relationship)])
+                self.shards[shard].delete_nodes([item for item in items if isinstance(item, Node)])
+            except Exception:
+                logger.exception('the part of a failed batch on shard %s could not be rolled back: %s',
+                                 self.names[shard], items)
+        self.fan_out.map(roll_back, sorted(written))
+
+    def _cache_node(self, node):
+        """Remember a new node as the latest one for its key-value pairs
+
+        Pairs of the CACHED_KEYS are added to the cache, all others are
+        only replaced if they are cached already.
+        """
+        for key, value in node.properties.iteritems():
+            if value:
+                if key in CACHED_KEYS:
+                    self.node_cache.put((key, index_value(value)), node)
+                else:
+                    self.node_cache.refresh((key, index_value(value)), node)
+
+    def get_nodes(self, idents):
+        """Return the node of every global identifier, every shard is asked once"""
+        with self.gate.shared():
+            return self._get_nodes(idents)
+
+    def _get_nodes(self, idents):
+        wanted = {}
+        for position, ident in enumerate(idents):
+            shard, local = split_id(self._resolve(ident))
+            if shard < len(self.shards):
+                wanted.setdefault(shard, []).append((position, local))
+        numbers = sorted(wanted)
+        found = self.fan_out.map(lambda shard: self.shards[shard].get_nodes([local for _, local in wanted[shard]]),
+                                 numbers)
+        results = [None] * len(idents)
+        for shard, nodes in zip(numbers, found):
+            for (position, _), node in zip(wanted[shard], nodes):
+                results[position] = self._global_node(shard, node)
+        return results
+
+    def find_node(self, key, value):
+        """Find the latest node with a given key-value pair on all shards (see 'find_nodes')"""
+        return self.find_nodes([(key, value)])[0]
+
+    def find_nodes(self, pairs):
+        """Find the latest node for every key-value pair, all shards are asked at once.
+
+        Only the pairs which are not cached are searched, with a single call of every shard.
+        Nodes found on several shards are told apart by their timestamp, so the latest
+        process of a name is found, all others by their global identifier.
+
+        arguments:
+        pairs -- list of key-value pairs to search
+        """
+        results = [self.node_cache.get((key, index_value(value))) for key, value in pairs]
+        missing = [pairs[position] for position, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+        with self.gate.shared():
+            found = self.fan_out.map(lambda store: store.find_nodes(missing), self.shards)
+        positions = [position for position, result in enumerate(results) if result is None]
+        for number, (position, (key, value)) in enumerate(zip(positions, missing)):
+            candidates = [self._global_node(shard, nodes[number]) for shard, nodes in enumerate(found)
+                          if nodes[number] is not None]
+            if candidates:
+                results[position] = max(candidates, key=_recency)
+                self.node_cache.put((key, index_value(value)), results[position])
+        return results
+
+    def find_relationship(self, rel_type=None, start_node=None, end_node=None, bidirectional=None, limit=None):
+        """Find the latest relationship with possible specifications.
+
+        With given nodes, the latest relationship of their shard is returned or, if there
+        is none, the latest one of the directory. Without nodes, every shard is asked.
+
+        keyword arguments:
+        rel_type -- type of relationships to find (None if any
+        start_node -- concrete start node (None if any)
+        end_node -- concrete end node to find (None if any)
+        bidirectional --  True if reversed relationships should also be included
+        limit -- only kept for compatibility, the latest relationship is always returned
+        """
+        with self.gate.shared():
+            if start_node is None and end_node is None:
+                found = self.fan_out.map(lambda store: store.find_relationship(rel_type), self.shards)
+                candidates = [self._global_relationship(shard, relationship)
+                              for shard, relationship in enumerate(found) if relationship is not None]
+                if candidates:
+                    return max(candidates, key=lambda relationship: relationship.id)
+            else:
+                ends = [self._local(node) if node is not None else None for node in (start_node, end_node)]
+                shards = set(end[0] for end in ends if end is not None)
+                if len(shards) == 1:
+                    shard = shards.pop()
+                    start, end = [end[1] if end is not None else None for end in ends]
+                    relationship = self.shards[shard].find_relationship(rel_type, start, end, bidirectional)
+                    if relationship is not None:
+                        return self._global_relationship(shard, relationship)
+            row = self.directory.find(rel_type, *[self._resolve(node.id) if node is not None else None
+                                                  for node in (start_node, end_node)], bidirectional=bidirectional)
+            return self._directory_relationships([row])[0] if row else None
+
+    def iter_nodes(self, key, value, keys=(), limit=None):
+        """Iterate over all nodes with a given key-value pair, the ones of every shard oldest first.
+
+        All shards are asked at once, for 'limit' nodes each.
+
+        arguments:
+        key -- what key/identifier should be searched (string).
+        value -- what value has should that key have (type specified by key).
+
+        keyword arguments:
+        keys -- the keys of the properties to return with every node
+        limit -- maximum number of nodes to return or None for all
+        """
+        with self.gate.shared():
+            found = self.fan_out.map(lambda store: list(store.iter_nodes(key, value, keys, limit)), self.shards)
+        items = [(self._global_node(shard, node), values) for shard, page in enumerate(found) for node, values in page]
+        return iter(items[:limit] if limit is not None else items)
+
+    def neighbours(self, node, rel_type, reverse=False, keys=(), limit=None):
+        """Iterate over all nodes connected to a node by relationships of a type.
+
+        The neighbours on the shard of the node come first, then the ones connected by the directory.
+
+        arguments:
+        node -- the node to start from
+        rel_type -- the type of relationships to follow
+
+        keyword arguments:
+        reverse -- True to follow the relationships from their end node to their start node
+        keys -- the keys of the properties to return with every node
+        limit -- maximum number of nodes to return or None for all
+        """
+        with self.gate.shared():
+            shard, local = self._local(node)
+            items = [(self._global_node(shard, neighbour), values)
+                     for neighbour, values in self.shards[shard].neighbours(local, rel_type, reverse, keys, limit)]
+            if limit is None or len(items) < limit:
+                idents = self.directory.neighbours(global_id(shard, local.id), rel_type, reverse,
+                                                   limit - len(items) if limit is not None else None)
+                items.extend((neighbour, tuple(neighbour.properties.get(key) for key in keys))
+                             for neighbour in self._get_nodes(idents) if neighbour is not None)
+        return iter(items)
+
+    def relationships(self, node):
+        """Return all relationships of a node, the ones of its shard first, then the ones of the directory"""
+        with self.gate.shared():
+            shard, local = self._local(node)
+            result = [self._global_relationship(shard, relationship)
+                      for relationship in self.shards[shard].relationships(local)]
+            result.extend(self._directory_relationships(self.directory.relationships(global_id(shard, local.id))))
+            return result
+
+    def scan_nodes(self, prov_type=None, after=None, limit=PAGE_SIZE):
+        """Return a page of all nodes, ordered by their global identifier.
+
+        Every shard returns a page behind 'after' at once, the first 'limit' nodes of all of them are the page.
+
+        keyword arguments:
+        prov_type -- the provenance node type of the nodes to return (None if any)
+        after -- the identifier of the last node of the previous page (None for the first page)
+        limit -- maximum number of nodes to return
+        """
+        with self.gate.shared():
+            pages = self.fan_out.map(lambda shard: self.shards[shard].scan_nodes(prov_type, _local_after(after, shard), limit),
+                                     range(len(self.shards)))
+        nodes = [self._global_node(shard, node) for shard, page in enumerate(pages) for node in page]
+        nodes.sort(key=lambda node: node.id)
+        return nodes[:limit]
+
+    def scan_relationships(self, rel_type=None, after=None, limit=PAGE_SIZE):
+        """Return a page of all relationships with their nodes, ordered by their global identifier.
+
+        Like 'scan_nodes', the relationships of the directory included.
+
+        keyword arguments:
+        rel_type -- the type of the relationships to return (None if any)
+        after -- the identifier of the last relationship of the previous page (None for the first page)
+        limit -- maximum number of relationships to return
+        """
+        with self.gate.shared():
+            pages = self.fan_out.map(
+                lambda shard: self.shards[shard].scan_relationships(rel_type, _local_after(after, shard), limit),
+                range(len(self.shards)))
+            relationships = [self._global_relationship(shard, relationship)
+                             for shard, page in enumerate(pages) for relationship in page]
+            relationships.extend(self._directory_relationships(
+                self.directory.scan(rel_type, _local_after(after, DIRECTORY), limit)))
+        relationships.sort(key=lambda relationship: relationship.id)
+        return relationships[:limit]
+
+    def delete_nodes(self, nodes):
+        """Delete nodes with all their relationships on their shards and in the directory, return their number"""
+        with self.gate.shared():
+            wanted = {}
+            for node in nodes:
+                shard, local = self._local(node)
+                wanted.setdefault(shard, []).append(local)
+            numbers = sorted(wanted)
+            deleted = self.fan_out.map(lambda shard: self.shards[shard].delete_nodes(wanted[shard]), numbers)
+            self.directory.remove([global_id(shard, local.id) for shard in numbers for local in wanted[shard]])
+            for node in nodes:
+                for key, value in node.properties.iteritems():
+                    if value:
+                        self.node_cache.invalidate((key, index_value(value)))
+            return sum(deleted)
+
+    def delete_relationships(self, relationships):
+        """Delete relationships on their shards and in the directory, return their number"""
+        with self.gate.shared():
+            wanted = {}
+            for relationship in relationships:
+                shard, ident = split_id(relationship.id)
+                wanted.setdefault(shard, []).append(Relationship(ident, relationship.type, None, None, {}))
+            deleted = self.directory.remove_relationships([item.id for item in wanted.pop(DIRECTORY, [])])
+            numbers = sorted(shard for shard in wanted if shard < len(self.shards))
+            return deleted + sum(self.fan_out.map(lambda shard: self.shards[shard].delete_relationships(wanted[shard]),
+                                                  numbers))
+
+    def update_nodes(self, updates):
+        """Set properties of nodes on their shards, return the number of updated nodes"""
+        with self.gate.shared():
+            wanted = {}
+            for node, properties in updates:
+                shard, local = self._local(node)
+                wanted.setdefault(shard, []).append((local, properties))
+            for node, properties in updates:
+                for key in properties:
+                    if node.properties.get(key):
+                        self.node_cache.invalidate((key, index_value(node.properties[key])))
+            numbers = sorted(wanted)
+            return sum(self.fan_out.map(lambda shard: self.shards[shard].update_nodes(wanted[shard]), numbers))
+
+    def add_shard(self, name, store):
+        """Add a shard and return its number.
+
+        The new shard owns its part of the ring at once, new nodes of its keys are written
+        to it. The stored ones stay where they are and are still found, until 'rebalance'
+        moves them. Shards are numbered in order of addition, so a store keeps its number
+        only if shards are always added at the end of the list.
+
+        arguments:
+        name -- the name of the shard, which determines its points on the ring
+        store -- the provenance store of the shard (ProvenanceStore)
+        """
+        with self.gate.exclusive():
+            if len(self.shards) >= MAX_SHARDS:
+                raise ValueError('a sharded store has %d shards at most' % MAX_SHARDS)
+            if self.running:
+                store.run()
+            return self._add(name, store)
+
+    def owner(self, node):
+        """Return the number of the shard a stored node belongs to.
+
+        That's the shard of the other node of its first anchor relationship (see ANCHORS),
+        like for nodes created together with their anchor, or the owner of its routing key.
+        """
+        for relationship in self.relationships(node):
+            if relationship.type in ANCHORS:
+                follower, leader = relationship.start_node, relationship.end_node
+                if ANCHORS[relationship.type]:
+                    follower, leader = leader, follower
+                if follower.id == node.id:
+                    return self._shard(leader)
+        return self.ring.shard(routing_key(node.prov_type, node.properties))
+
+    def rebalance(self, batch_size=MOVE_BATCH):
+        """Move every node which belongs to another shard (see 'owner') there, return the number of moved nodes.
+
+        Agents are moved first, then activities and entities, so the anchors of activities
+        and entities are at their place already. Every chunk of nodes is moved with all its
+        relationships while the store is paused; between the chunks it's used as usual.
+        Moved nodes get new identifiers, the old ones are forwarded to them (see 'moved').
+        It stops between two chunks when the store is closed.
+
+        keyword arguments:
+        batch_size -- number of nodes looked at and moved at once
+        """
+        moved = 0
+        for prov_type in ('AGENT', 'ACTIVITY', 'ENTITY'):
+            for shard in xrange(len(self.shards)):
+                after = None
+                while not self.stopping.is_set():
+                    with self.gate.shared():
+                        page = self.shards[shard].scan_nodes(prov_type, after, batch_size)
+                    nodes = [self._global_node(shard, node) for node in page]
+                    moves = [(node, owner) for node, owner in ((node, self.owner(node)) for node in nodes)
+                             if owner != shard]
+                    if moves:
+                        with self.gate.exclusive():
+                            self._move(moves)
+                        moved += len(moves)
+                    if len(page) < batch_size:
+                        break
+                    after = page[-1].id
+        return moved
+
+    def start_rebalance(self, batch_size=MOVE_BATCH):
+        """Run 'rebalance' in a background thread while the store serves requests"""
+        def run():
+            try:
+                logger.info('rebalancing done, %d nodes moved', self.rebalance(batch_size))
+            # the store may raise anything, the nodes moved so far stay where they are
+            except Exception:
+                logger.exception('rebalancing failed')
+        self.rebalancing = threading.Thread(target=run, name='shard-rebalance')
+        self.rebalancing.daemon = True
+        self.rebalancing.start()
+
+    def _move(self, moves):
+        """Copy nodes with all their relationships to their new shards, record their new identifiers, then delete them
+
+        If the process dies before the old nodes are deleted, they are moved again
+        by the next 'rebalance', the recorded forwards lead to the latest copy.
+
+        arguments:
+        moves -- list of the global node and the number of its new shard
+        """
+        operations, shards, references = [], {}, {}
+        for node, owner in moves:
+            references[node.id] = BatchReference(len(operations))
+            shards[len(operations)] = owner
+            operations.append((NODE, node.prov_type, node.type, dict(node.properties)))
+        copied = set()
+        for node, _ in moves:
+            for relationship in self.relationships(node):
+                if relationship.id in copied:
+                    continue
+                copied.add(relationship.id)
+                operations.append((RELATIONSHIP, relationship.type,
+                                   references.get(relationship.start_node.id, relationship.start_node),
+                                   references.get(relationship.end_node.id, relationship.end_node),
+                                   dict(relationship.properties)))
+        results = self._submit(operations, shards)
+        forwards = [(node.id, results[references[node.id].index].id) for node, _ in moves]
+        self.directory.forward(forwards)
+        self.delete_nodes([node for node, _ in moves])
+        self.moved.update(forwards)
+
+    def _lock(self, timeout=LOCK_TIMEOUT):
+        """Lock the file of the store, raise StoreInUse if another process keeps it locked for 'timeout' seconds"""
+        self.lock_file = open(self.lock_path, 'a')
+        deadline = time.time() + timeout
+        while True:
+            try:
+                fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except IOError:
+                if time.time() >= deadline:
+                    self.lock_file.close()
+                    self.lock_file = None
+                    raise StoreInUse('the sharded store is used by another process, %s is locked' % self.lock_path)
+                time.sleep(0.1)
+
+    def run(self):
+        """Lock the store, start the shards, the directory and the workers asking the shards and read the forwards"""
+        if self.lock_path is not None:
+            self._lock()
+        for store in self.shards + [self.directory.store]:
+            store.run()
+        self.moved.update(self.directory.forwards())
+        self.fan_out.start()
+        self.stopping.clear()
+        self.running = True
+
+    def close(self):
+        """Stop rebalancing between two chunks, close the shards and the directory and release the lock"""
+        self.stopping.set()
+        if self.rebalancing is not None:
+            self.rebalancing.join()
+            self.rebalancing = None
+        self.fan_out.stop()
+        for store in self.shards + [self.directory.store]:
+            store.close()
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
+        self.running = False
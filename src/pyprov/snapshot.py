@@ -0,0 +1,413 @@
+'''
+Read-only snapshots of the provenance graph for analytics.
+
+A snapshot keeps the graph of a provenance store as compressed sparse rows (CSR)
+in the files of one directory, which every reader maps into its memory. Many
+processes share one snapshot in the page cache, and traversals handle a whole
+level of a breadth-first search at once with NumPy, without touching the store.
+
+NumPy is only needed for snapshots, the rest of PyProv runs without it.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import array
+import itertools
+import json
+import os
+import shutil
+import time
+import numpy
+from pyprov.interchange import PROV_ID
+from pyprov.lineage import STEPS
+from pyprov.store import Node, PAGE_SIZE, index_value
+
+# version of the layout of the files, readers refuse snapshots of other versions
+FORMAT = 2
+MANIFEST = 'snapshot.json'
+# types of the versions, kept beside their text to return them as they're stored
+TEXT, INTEGER, REAL, BOOLEAN = 0, 1, 2, 3
+VERSION_TYPES = {TEXT:lambda text: text, INTEGER:int, REAL:float, BOOLEAN:lambda text: text == u'True'}
+
+def _text(value):
+    """Return a property value as UTF-8, None as empty text"""
+    return '' if value is None else index_value(value).encode('utf-8')
+
+def _kind(value):
+    """Return the type tag of a version (see VERSION_TYPES)"""
+    if isinstance(value, bool):
+        return BOOLEAN
+    if isinstance(value, (int, long)):
+        return INTEGER
+    return REAL if isinstance(value, float) else TEXT
+
+def _seconds(value):
+    """Return a timestamp as a number, NaN if the node has none"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return numpy.nan
+
+def _code(codes, value):
+    """Return the number of a value within a table of values, add the value if it's new"""
+    return codes.setdefault(value, len(codes))
+
+def _names(codes):
+    """Return the values of a table of values, ordered by their numbers"""
+    return [value for value, _ in sorted(codes.iteritems(), key=lambda item: item[1])]
+
+def _heap(texts):
+    """Return the offsets and the concatenated bytes of a list of texts (the text i is data[offsets[i]:offsets[i + 1]])"""
+    offsets = numpy.zeros(len(texts) + 1, numpy.int64)
+    numpy.cumsum(numpy.fromiter(itertools.imap(len, texts), numpy.int64, len(texts)), out=offsets[1:])
+    return offsets, numpy.frombuffer(bytearray(''.join(texts)), numpy.uint8)
+
+def _rows(sources, targets, count, dtype):
+    """Return the row offsets and the targets of the rows of all sources (compressed sparse rows)
+
+    Within a row, the targets keep the order of the relationships.
+    """
+    order = numpy.argsort(sources, kind='mergesort')
+    indptr = numpy.zeros(count + 1, numpy.int64)
+    numpy.cumsum(numpy.bincount(sources, minlength=count), out=indptr[1:])
+    return indptr, targets[order].astype(dtype)
+
+def _replace(temporary, path):
+    """Move a written snapshot to its path, readers of a former snapshot keep their mapped files"""
+    if not os.path.exists(path):
+        os.rename(temporary, path)
+        return
+    former = path + '.old'
+    if os.path.exists(former):
+        shutil.rmtree(former)
+    os.rename(path, former)
+    os.rename(temporary, path)
+    shutil.rmtree(former)
+
+def write_snapshot(store, path, page_size=PAGE_SIZE):
+    """Write a snapshot of all nodes and relationships of a store to a directory, return the numbers of both.
+
+    The store is read page by page (see ProvenanceStore.iter_all_nodes). The snapshot
+    is written next to the directory and then replaces it, so readers never see
+    a partial snapshot. Like the lineage of the store, the snapshot treats all nodes
+    of one entity (identifier and version) as one: their relationships are moved
+    to the first of them.
+
+    arguments:
+    store -- the provenance store to read (ProvenanceStore)
+    path -- the directory of the snapshot
+
+    keyword arguments:
+    page_size -- number of nodes or relationships read with one call
+    """
+    ids, prov_types, types = array.array('l'), array.array('H'), array.array('H')
+    timestamps, canonical, kinds = array.array('d'), array.array('l'), array.array('B')
+    identifiers, versions = [], []
+    prov_codes, type_codes, entities = {}, {}, {}
+    for node in store.iter_all_nodes(None, page_size):
+        number = len(ids)
+        if number and node.id <= ids[-1]:
+            raise ValueError('the store returned its nodes out of order: %d after %d' % (node.id, ids[-1]))
+        properties = node.properties
+        identifier = properties.get('name') if node.prov_type == 'ACTIVITY' else properties.get('identifier')
+        if identifier is None:
+            identifier = properties.get(PROV_ID)
+        version = properties.get('version')
+        ids.append(node.id)
+        prov_types.append(_code(prov_codes, node.prov_type))
+        types.append(_code(type_codes, node.type))
+        timestamps.append(_seconds(properties.get('timestamp')))
+        identifiers.append(_text(identifier))
+        versions.append(_text(version))
+        kinds.append(_kind(version))
+        if node.prov_type == 'ENTITY' and identifier is not None and version is not None:
+            canonical.append(entities.setdefault((identifiers[-1], versions[-1]), number))
+        else:
+            canonical.append(number)
+    entities = None
+    count = len(ids)
+    ids, canonical = numpy.frombuffer(ids, numpy.int64), numpy.frombuffer(canonical, numpy.int64)
+    dtype = numpy.int32 if count < 2 ** 31 else numpy.int64
+
+    edges = {}
+    for relationship in store.iter_all_relationships(None, page_size):
+        if relationship.type not in edges:
+            edges[relationship.type] = array.array('l'), array.array('l')
+        starts, ends = edges[relationship.type]
+        starts.append(relationship.start_node.id)
+        ends.append(relationship.end_node.id)
+
+    temporary = path.rstrip(os.sep) + '.tmp'
+    if os.path.exists(temporary):
+        shutil.rmtree(temporary)
+    os.makedirs(temporary)
+    save = lambda name, values: numpy.save(os.path.join(temporary, name + '.npy'), values)
+    save('ids', ids)
+    save('prov_types', numpy.frombuffer(prov_types, numpy.uint16))
+    save('types', numpy.frombuffer(types, numpy.uint16))
+    save('timestamps', numpy.frombuffer(timestamps, numpy.float64))
+    save('versions.types', numpy.frombuffer(kinds, numpy.uint8))
+    for name, texts in (('identifiers', identifiers), ('versions', versions)):
+        offsets, data = _heap(texts)
+        save(name + '.offsets', offsets)
+        save(name + '.data', data)
+    save('identifiers.order', numpy.array(sorted(xrange(count), key=identifiers.__getitem__), dtype))
+    identifiers = versions = None
+
+    rel_types, counts = sorted(edges), []
+    for position, rel_type in enumerate(rel_types):
+        starts, ends = edges.pop(rel_type)
+        starts, ends = numpy.frombuffer(starts, numpy.int64), numpy.frombuffer(ends, numpy.int64)
+        sources = numpy.searchsorted(ids, starts).clip(0, max(count - 1, 0))
+        targets = numpy.searchsorted(ids, ends).clip(0, max(count - 1, 0))
+        # relationships to nodes which were deleted while the store was read are left out
+        known = (ids[sources] == starts) & (ids[targets] == ends) if count else numpy.zeros(len(starts), numpy.bool_)
+        sources, targets = canonical[sources[known]], canonical[targets[known]]
+        counts.append(len(sources))
+        for direction, rows in (('out', _rows(sources, targets, count, dtype)), ('in', _rows(targets, sources, count, dtype))):
+            save('r%d.%s.indptr' % (position, direction), rows[0])
+            save('r%d.%s.indices' % (position, direction), rows[1])
+
+    manifest = {'format':FORMAT, 'created':time.time(), 'nodes':count, 'prov_types':_names(prov_codes),
+                'types':_names(type_codes), 'rel_types':rel_types, 'relationships':counts}
+    with open(os.path.join(temporary, MANIFEST), 'wb') as manifest_file:
+        json.dump(manifest, manifest_file)
+    _replace(temporary, path)
+    return count, sum(counts)
+
+class Snapshot(object):
+    """A snapshot written by 'write_snapshot', mapped read-only into memory.
+
+    Nodes are numbered in the order of their identifiers in the store. For every
+    relationship type, the snapshot has the relationships of every node in both
+    directions as compressed sparse rows: the targets of the node i are
+    indices[indptr[i]:indptr[i + 1]]. Identifiers and versions are kept as UTF-8
+    in one array each, the node numbers ordered by identifier make it searchable.
+
+    parameters:
+    path -- the directory of the snapshot
+    created -- the time the snapshot was written (seconds since the epoch)
+    count -- number of nodes
+    ids -- the identifier of every node within the store
+    prov_types, types -- the names of the provenance node types and of the types from the software development model
+    rel_types -- the number of relationships by type
+    """
+    def __init__(self, path):
+        with open(os.path.join(path, MANIFEST), 'rb') as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get('format') != FORMAT:
+            raise ValueError('%s is no snapshot of format %d' % (path, FORMAT))
+        load = lambda name: numpy.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+        self.path = path
+        self.created = manifest['created']
+        self.count = manifest['nodes']
+        self.prov_types = manifest['prov_types']
+        self.types = manifest['types']
+        self.rel_types = dict(zip(manifest['rel_types'], manifest['relationships']))
+        self.ids = load('ids')
+        self._prov_types, self._types, self._timestamps = load('prov_types'), load('types'), load('timestamps')
+        # the text of the heaps is sliced through buffers, without a numpy array for every text
+        self._identifiers = load('identifiers.offsets'), buffer(load('identifiers.data'))
+        self._versions = load('versions.offsets'), buffer(load('versions.data'))
+        self._version_types = load('versions.types')
+        self._order = load('identifiers.order')
+        self._rows = {}
+        for position, rel_type in enumerate(manifest['rel_types']):
+            for direction, reverse in (('out', False), ('in', True)):
+                prefix = 'r%d.%s.' % (position, direction)
+                self._rows[rel_type, reverse] = load(prefix + 'indptr'), load(prefix + 'indices')
+        self._no_rows = numpy.zeros(self.count + 1, numpy.int64), numpy.zeros(0, self._order.dtype)
+
+    def __len__(self):
+        return self.count
+
+    def number(self, ident):
+        """Return the number of the node with an identifier of the store or None"""
+        position = numpy.searchsorted(self.ids, ident)
+        return int(position) if position < self.count and self.ids[position] == ident else None
+
+    def identifier(self, number):
+        """Return the identifier of an entity or agent or the name of an activity"""
+        offsets, data = self._identifiers
+        return data[offsets[number]:offsets[number + 1]].decode('utf-8')
+
+    def version(self, number):
+        """Return the version of an entity, None for other nodes"""
+        text = self._text(self._versions, number)
+        return VERSION_TYPES[self._version_types[number]](text) if text else None
+
+    def node(self, number):
+        """Return a node with the properties kept by the snapshot (see pyprov.store.Node)"""
+        prov_type = self.prov_types[self._prov_types[number]]
+        properties = {'name' if prov_type == 'ACTIVITY' else 'identifier':self.identifier(number)}
+        version, timestamp = self.version(number), float(self._timestamps[number])
+        if version is not None:
+            properties['version'] = version
+        if not numpy.isnan(timestamp):
+            properties['timestamp'] = timestamp
+        return Node(int(self.ids[number]), prov_type, self.types[self._types[number]], properties)
+
+    def find(self, identifier, version=None):
+        """Return the numbers of all nodes with an identifier (or name), only the ones of a version if given"""
+        key = _text(identifier)
+        offsets, data = self._identifiers
+        text = lambda position: data[offsets[self._order[position]]:offsets[self._order[position] + 1]]
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if text(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        end = low
+        while end < self.count and text(end) == key:
+            end += 1
+        numbers = numpy.sort(self._order[low:end]).astype(numpy.int64)
+        if version is not None:
+            numbers = numpy.array([number for number in numbers if self._text(self._versions, number) == index_value(version)],
+                                  numpy.int64)
+        return numbers
+
+    def rows(self, rel_type, reverse=False):
+        """Return the row offsets and targets of all relationships of a type (compressed sparse rows)
+
+        arguments:
+        rel_type -- the type of the relationships
+
+        keyword arguments:
+        reverse -- True for the rows from the end node to the start node of every relationship
+        """
+        return self._rows.get((rel_type, reverse), self._no_rows)
+
+    def neighbours(self, number, rel_type, reverse=False):
+        """Return the numbers of the nodes related to a node by relationships of a type"""
+        indptr, indices = self.rows(rel_type, reverse)
+        return indices[indptr[number]:indptr[number + 1]]
+
+    def expand(self, frontier, steps):
+        """Return the neighbours of a set of nodes and the node every one of them was reached from.
+
+        arguments:
+        frontier -- the node numbers (numpy array)
+        steps -- pairs of relationship type and reverse (see 'rows') to follow
+        """
+        targets, origins = [], []
+        for rel_type, reverse in steps:
+            indptr, indices = self.rows(rel_type, reverse)
+            starts = indptr[frontier]
+            counts = indptr[frontier + 1] - starts
+            total = counts.sum()
+            if not total:
+                continue
+            # the position of every target: the start of its row plus its place within the row
+            offsets = numpy.cumsum(counts) - counts
+            targets.append(indices[numpy.arange(total) - numpy.repeat(offsets - starts, counts)])
+            origins.append(numpy.repeat(frontier, counts))
+        if not targets:
+            return numpy.zeros(0, numpy.int64), numpy.zeros(0, numpy.int64)
+        return numpy.concatenate(targets).astype(numpy.int64), numpy.concatenate(origins)
+
+    def levels(self, sources, steps, max_depth=None):
+        """Yield the nodes of a breadth-first search level by level, each one as numbers and the numbers they were reached from.
+
+        Every node is yielded once, at its shortest distance from the sources.
+        The first level are the sources themselves, reached from -1.
+
+        arguments:
+        sources -- the node numbers to start from
+        steps -- pairs of relationship type and reverse (see 'rows') to follow
+
+        keyword arguments:
+        max_depth -- maximum number of relationships between a source and a yielded node or None
+        """
+        visited = numpy.zeros(self.count, numpy.bool_)
+        frontier = numpy.unique(numpy.asarray(sources, numpy.int64))
+        visited[frontier] = True
+        yield frontier, numpy.full(len(frontier), -1, numpy.int64)
+        depth = 0
+        while len(frontier) and (max_depth is None or depth < max_depth):
+            depth += 1
+            targets, origins = self.expand(frontier, steps)
+            new = ~visited[targets]
+            frontier, first = numpy.unique(targets[new], return_index=True)
+            if not len(frontier):
+                return
+            visited[frontier] = True
+            yield frontier, origins[new][first]
+
+    def traverse(self, sources, steps, max_depth=None):
+        """Return the numbers of all nodes reached by a breadth-first search, nearest first, with their depths and the nodes they were reached from.
+
+        The sources are included with depth 0 (see 'levels' for the arguments).
+        """
+        numbers, depths, parents = [], [], []
+        for depth, (level, origins) in enumerate(self.levels(sources, steps, max_depth)):
+            numbers.append(level)
+            depths.append(numpy.full(len(level), depth, numpy.int32))
+            parents.append(origins)
+        return numpy.concatenate(numbers), numpy.concatenate(depths), numpy.concatenate(parents)
+
+    def reachable(self, sources, targets, steps, max_depth=None):
+        """Return True if one of the targets is reached from one of the sources (see 'levels' for the arguments)"""
+        wanted = numpy.zeros(self.count, numpy.bool_)
+        wanted[numpy.asarray(targets, numpy.int64)] = True
+        for level, _ in self.levels(sources, steps, max_depth):
+            if wanted[level].any():
+                return True
+        return False
+
+    def _text(self, heap, number):
+        """Return the text of a node from the identifiers or versions, empty text for none"""
+        offsets, data = heap
+        return data[offsets[number]:offsets[number + 1]].decode('utf-8')
+
+    def _versions_of(self, numbers):
+        """Return the versions of many nodes with the type they're stored with, None for nodes without one"""
+        return [None if text is None else VERSION_TYPES[kind](text)
+                for text, kind in itertools.izip(self._texts(self._versions, numbers), self._version_types[numbers].tolist())]
+
+    def _texts(self, heap, numbers):
+        """Return the texts of many nodes from the identifiers or versions, None for empty ones"""
+        offsets, data = heap
+        return [data[start:end].decode('utf-8') or None
+                for start, end in itertools.izip(offsets[numbers].tolist(), offsets[numbers + 1].tolist())]
+
+    def lineage(self, identifier, direction, version=None, max_depth=None):
+        """Yield every entity of the lineage once, nearest first, like pyprov.lineage.Lineage.traverse.
+
+        arguments:
+        identifier -- the identifier of the entity to start from
+        direction -- UPSTREAM or DOWNSTREAM
+
+        keyword arguments:
+        version -- the version of the entity to start from or None for all versions
+        max_depth -- maximum number of processes between the start and a returned entity or None
+        """
+        sources = [number for number in self.find(identifier, version) if self.version(number) is not None]
+        numbers, depths, parents = self.traverse(sources, STEPS[direction], None if max_depth is None else 2 * max_depth)
+        parent = numpy.full(self.count, -1, numpy.int64)
+        parent[numbers] = parents
+        # every second level are entities, the ones between are the processes connecting them
+        entities = (depths > 0) & (depths % 2 == 0)
+        numbers, depths, processes = numbers[entities], depths[entities] // 2, parents[entities]
+        previous = parent[processes]
+        columns = (self._texts(self._identifiers, numbers), self._versions_of(numbers), depths.tolist(),
+                   self._texts(self._identifiers, processes), self._texts(self._identifiers, previous),
+                   self._versions_of(previous))
+        for entity, entity_version, depth, process, source, source_version in itertools.izip(*columns):
+            yield {'identifier':entity, 'version':entity_version, 'depth':depth, 'process':process,
+                   'from':{'identifier':source, 'version':source_version}}
@@ -0,0 +1,423 @@
+'''
+The SQLite provenance store.
+
+An embedded provenance store for single machines without a Neo4J server.
+Nodes, relationships and the property index are tables of one SQLite database file.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import json
+import sqlite3
+import threading
+from pyprov.store import ProvenanceStore, BatchReference, Node, Relationship, NODE, PAGE_SIZE, index_value
+
+DATABASE = 'pyprov.db'
+
+# number of parameters bound to one query at most, older versions of SQLite allow 999
+MAX_VARIABLES = 500
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS nodes (
+    id INTEGER PRIMARY KEY,
+    prov_type TEXT NOT NULL,
+    type TEXT NOT NULL,
+    properties TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS node_index (
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    node INTEGER NOT NULL,
+    PRIMARY KEY (key, value, node)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS relationships (
+    id INTEGER PRIMARY KEY,
+    type TEXT NOT NULL,
+    start_node INTEGER NOT NULL,
+    end_node INTEGER NOT NULL,
+    properties TEXT
+);
+CREATE INDEX IF NOT EXISTS relationships_start ON relationships (start_node, type, id);
+CREATE INDEX IF NOT EXISTS relationships_end ON relationships (end_node, type, id);
+CREATE INDEX IF NOT EXISTS relationships_type ON relationships (type, id);
+CREATE TABLE IF NOT EXISTS sequences (
+    name TEXT PRIMARY KEY,
+    next INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO sequences SELECT 'nodes', COALESCE(MAX(id), 0) + 1 FROM nodes;
+INSERT OR IGNORE INTO sequences SELECT 'relationships', COALESCE(MAX(id), 0) + 1 FROM relationships;
+'''
+
+def _limit(limit):
+    """Return the LIMIT of a query for a maximum number of rows, -1 (no limit) for None"""
+    return limit if limit is not None else -1
+
+class SQLiteStore(ProvenanceStore):
+    """The SQLite provenance store.
+
+    The database runs in WAL mode, so readers don't block the writer.
+    Every thread uses its own connection. All writes of a batch are done
+    within one transaction with a single 'executemany' per table.
+    The identifiers of new nodes and relationships are assigned by the store from
+    the table 'sequences', which is read and advanced within the IMMEDIATE transaction
+    of the batch, so other processes writing the same file never get the same
+    identifiers. Identifiers of deleted nodes are not used again.
+
+    parameters:
+    database -- the path of the database file
+    lock -- serializes the writers of this process, so they don't wait for each other in SQLite
+    """
+    def __init__(self, controller, database=DATABASE):
+        super(SQLiteStore, self).__init__(controller)
+        self.database = database
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.running = False
+
+    def _connection(self):
+        """Return the connection of the current thread, open it if necessary"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.database)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+        return connection
+
+    def setup_database(self):
+        """Create the tables and indexes if necessary"""
+        self._connection().executescript(SCHEMA)
+
+    def create_node(self, prov_type, sdm_type, **properties):
+        """Create a new node with its properties and add them to the index.
+
+        arguments:
+        prov_type -- an uppercase string to determine the provenance node type (ENTITY, ACTIVITY or AGENT).
+        sdm_type -- an uppercase string to determine the type from the software development model.
+        **properties -- list of key-value-pairs to add more properties to the node
+        """
+        batch = self.create_batch()
+        batch.create_node(prov_type, sdm_type, **properties)
+        return batch.submit()[0]
+
+    def create_relationship(self, rel_type, start_node, end_node, **properties):
+        """Create a new relationship between two nodes
+
+        arguments:
+        rel_type -- an uppercase string to determine the type of relationship between the two nodes, i.e. the predicate
+        start_node -- the outgoing node, from where the relationship starts, i.e. the subject
+        end_node -- the incoming node, to where the relationship end, i.e the object
+        **properties -- list of keyword arguments which is completely added to the relationship.
+        """
+        batch = self.create_batch()
+        batch.create_relationship(rel_type, start_node, end_node, **properties)
+        return batch.submit()[0]
+
+    def submit_batch(self, batch):
+        """Write all operations of a batch within a single transaction.
+
+        The transaction takes the write lock of the database before the next
+        identifiers are read, so no other process takes them until the batch is written.
+
+        arguments:
+        batch -- the batch to write (WriteBatch)
+        """
+        results = []
+        nodes, index, relationships = [], [], []
+        with self.lock, self._connection() as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            sequences = dict(connection.execute('SELECT name, next FROM sequences'))
+            next_node, next_relationship = sequences['nodes'], sequences['relationships']
+            for operation in batch.operations:
+                if operation[0] == NODE:
+                    _, prov_type, sdm_type, properties = operation
+                    node = Node(next_node, prov_type, sdm_type, properties)
+                    next_node += 1
+                    nodes.append((node.id, prov_type, sdm_type, json.dumps(properties)))
+                    for key, value in properties.iteritems():
+                        if value:
+                            index.append((key, index_value(value), node.id))
+                    results.append(node)
+                else:
+                    _, rel_type, start_node, end_node, properties = operation
+                    if isinstance(start_node, BatchReference):
+                        start_node = results[start_node.index]
+                    if isinstance(end_node, BatchReference):
+                        end_node = results[end_node.index]
+                    relationship = Relationship(next_relationship, rel_type, start_node, end_node, properties)
+                    next_relationship += 1
+                    relationships.append((relationship.id, rel_type, start_node.id, end_node.id,
+                                          json.dumps(properties) if properties else None))
+                    results.append(relationship)
+
+            connection.executemany('INSERT INTO nodes VALUES (?, ?, ?, ?)', nodes)
+            connection.executemany('INSERT OR IGNORE INTO node_index VALUES (?, ?, ?)', index)
+            connection.executemany('INSERT INTO relationships VALUES (?, ?, ?, ?, ?)', relationships)
+            connection.executemany('UPDATE sequences SET next = ? WHERE name = ?',
+                                   [(next_node, 'nodes'), (next_relationship, 'relationships')])
+        return results
+
+    def _node(self, row):
+        """Build a node from a row of the nodes table"""
+        return Node(row[0], row[1], row[2], json.loads(row[3]))
+
+    def get_node(self, ident):
+        """Return the node with the given identifier or None"""
+        row = self._connection().execute('SELECT id, prov_type, type, properties FROM nodes WHERE id = ?',
+                                         (ident,)).fetchone()
+        return self._node(row) if row else None
+
+    def get_nodes(self, idents):
+        """Return the node of every identifier, None for the ones which don't exist"""
+        found = {}
+        connection = self._connection()
+        for start in xrange(0, len(idents), MAX_VARIABLES):
+            chunk = idents[start:start + MAX_VARIABLES]
+            for row in connection.execute('SELECT id, prov_type, type, properties FROM nodes WHERE id IN (%s)'
+                                          % ', '.join('?' * len(chunk)), chunk):
+                found[row[0]] = self._node(row)
+        return [found.get(ident) for ident in idents]
+
+    def find_node(self, key, value):
+        """Find the latest node with a given key-value pair using the node index.
+
+        arguments:
+        key -- what key/identifier should be searched (string).
+        value -- what value has should that key have (type specified by key).
+        """
+        row = self._connection().execute(
+            'SELECT n.id, n.prov_type, n.type, n.properties FROM node_index i JOIN nodes n ON n.id = i.node '
+            'WHERE i.key = ? AND i.value = ? ORDER BY i.node DESC LIMIT 1', (key, index_value(value))).fetchone()
+        return self._node(row) if row else None
+
+    def find_relationship(self, rel_type=None, start_node=None, end_node=None, bidirectional=None, limit=None):
+        """Find the latest relationship with possible specifications.
+
+        The relationship with the highest identifier is selected by the database.
+
+        keyword arguments:
+        rel_type -- type of relationships to find (None if any
+        start_node -- concrete start node (None if any)
+        end_node -- concrete end node to find (None if any)
+        bidirectional --  True if reversed relationships should also be included
+        limit -- only kept for compatibility, the latest relationship is always returned
+        """
+        start_id = start_node.id if start_node is not None else None
+        end_id = end_node.id if end_node is not None else None
+        row = self._latest(rel_type, start_id, end_id)
+        if bidirectional and (start_id is not None or end_id is not None):
+            reverse = self._latest(rel_type, end_id, start_id)
+            if reverse and (row is None or reverse[0] > row[0]):
+                row = reverse
+        if row is None:
+            return None
+        ident, rel_type, start_id, end_id, properties = row
+        return Relationship(ident, rel_type, self.get_node(start_id), self.get_node(end_id),
+                            json.loads(properties) if properties else {})
+
+    def _latest(self, rel_type, start_id, end_id):
+        """Return the row of the latest matching relationship or None"""
+        conditions, params = [], []
+        for column, value in (('type', rel_type), ('start_node', start_id), ('end_node', end_id)):
+            if value is not None:
+                conditions.append(column + ' = ?')
+                params.append(value)
+        query = 'SELECT id, type, start_node, end_node, properties FROM relationships'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        return self._connection().execute(query + ' ORDER BY id DESC LIMIT 1', params).fetchone()
+
+    def iter_nodes(self, key, value, keys=(), limit=None):
+        """Iterate over all nodes with a given key-value pair, oldest first.
+
+        arguments:
+        key -- what key/identifier should be searched (string).
+        value -- what value has should that key have (type specified by key).
+
+        keyword arguments:
+        keys -- the keys of the properties to return with every node
+        limit -- maximum number of nodes to return or None for all
+        """
+        rows = self._connection().execute(
+            'SELECT n.id, n.prov_type, n.type, n.properties FROM node_index i JOIN nodes n ON n.id = i.node '
+            'WHERE i.key = ? AND i.value = ? ORDER BY i.node LIMIT ?', (key, index_value(value), _limit(limit)))
+        for row in rows:
+            node = self._node(row)
+            yield node, tuple(node.properties.get(k) for k in keys)
+
+    def neighbours(self, node, rel_type, reverse=False, keys=(), limit=None):
+        """Iterate over all nodes connected to a node by relationships of a type.
+
+        arguments:
+        node -- the node to start from
+        rel_type -- the type of relationships to follow
+
+        keyword arguments:
+        reverse -- True to follow the relationships from their end node to their start node
+        keys -- the keys of the properties to return with every node
+        limit -- maximum number of nodes to return or None for all
+        """
+        source, target = ('end_node', 'start_node') if reverse else ('start_node', 'end_node')
+        rows = self._connection().execute(
+            'SELECT n.id, n.prov_type, n.type, n.properties FROM relationships r JOIN nodes n ON n.id = r.%s '
+            'WHERE r.%s = ? AND r.type = ? ORDER BY r.id LIMIT ?' % (target, source), (node.id, rel_type, _limit(limit)))
+        for row in rows:
+            neighbour = self._node(row)
+            yield neighbour, tuple(neighbour.properties.get(k) for k in keys)
+
+    def relationships(self, node):
+        """Return all relationships of a node, outgoing and incoming ones, ordered by their identifier"""
+        query = ('SELECT r.id, r.type, r.properties, a.id, a.prov_type, a.type, a.properties, '
+                 'b.id, b.prov_type, b.type, b.properties FROM relationships r '
+                 'JOIN nodes a ON a.id = r.start_node JOIN nodes b ON b.id = r.end_node WHERE r.%s = ?')
+        connection = self._connection()
+        rows = connection.execute(query % 'start_node', (node.id,)).fetchall()
+        rows.extend(row for row in connection.execute(query % 'end_node', (node.id,)) if row[3] != row[7])
+        rows.sort(key=lambda row: row[0])
+        return [Relationship(row[0], row[1], self._node(row[3:7]), self._node(row[7:11]),
+                             json.loads(row[2]) if row[2] else {}) for row in rows]
+
+    def scan_nodes(self, prov_type=None, after=None, limit=PAGE_SIZE):
+        """Return a page of all nodes, ordered by their identifier.
+
+        keyword arguments:
+        prov_type -- the provenance node type of the nodes to return (None if any)
+        after -- the identifier of the last node of the previous page (None for the first page)
+        limit -- maximum number of nodes to return
+        """
+        query = 'SELECT id, prov_type, type, properties FROM nodes WHERE id > ?'
+        params = [after if after is not None else 0]
+        if prov_type is not None:
+            query += ' AND prov_type = ?'
+            params.append(prov_type)
+        params.append(limit)
+        return [self._node(row) for row in self._connection().execute(query + ' ORDER BY id LIMIT ?', params)]
+
+    def scan_relationships(self, rel_type=None, after=None, limit=PAGE_SIZE):
+        """Return a page of all relationships with their nodes, ordered by their identifier.
+
+        keyword arguments:
+        rel_type -- the type of the relationships to return (None if any)
+        after -- the identifier of the last relationship of the previous page (None for the first page)
+        limit -- maximum number of relationships to return
+        """
+        query = ('SELECT r.id, r.type, r.properties, a.id, a.prov_type, a.type, a.properties, '
+                 'b.id, b.prov_type, b.type, b.properties FROM relationships r '
+                 'JOIN nodes a ON a.id = r.start_node JOIN nodes b ON b.id = r.end_node WHERE r.id > ?')
+        params = [after if after is not None else 0]
+        if rel_type is not None:
+            query += ' AND r.type = ?'
+            params.append(rel_type)
+        params.append(limit)
+        return [Relationship(row[0], row[1], self._node(row[3:7]), self._node(row[7:11]),
+                             json.loads(row[2]) if row[2] else {})
+                for row in self._connection().execute(query + ' ORDER BY r.id LIMIT ?', params)]
+
+    def delete_nodes(self, nodes):
+        """Delete nodes with all their relationships within one transaction, return the number of deleted nodes.
+
+        The index entries and relationships of the nodes are deleted by the primary key
+        and the indexes of these tables.
+
+        arguments:
+        nodes -- the nodes to delete, nodes which are already deleted are skipped
+        """
+        with self.lock:
+            with self._connection() as connection:
+                rows = [connection.execute('SELECT id, properties FROM nodes WHERE id = ?', (node.id,)).fetchone()
+                        for node in nodes]
+                idents = [(row[0],) for row in rows if row]
+                index = [(key, index_value(value), row[0]) for row in rows if row
+                         for key, value in json.loads(row[1]).iteritems() if value]
+                connection.executemany('DELETE FROM relationships WHERE start_node = ?', idents)
+                connection.executemany('DELETE FROM relationships WHERE end_node = ?', idents)
+                connection.executemany('DELETE FROM node_index WHERE key = ? AND value = ? AND node = ?', index)
+                connection.executemany('DELETE FROM nodes WHERE id = ?', idents)
+        return len(idents)
+
+    def delete_relationships(self, relationships):
+        """Delete relationships within one transaction, return the number of deleted relationships
+
+        arguments:
+        relationships -- the relationships to delete, the ones which are already deleted are skipped
+        """
+        with self.lock:
+            with self._connection() as connection:
+                return sum(connection.execute('DELETE FROM relationships WHERE id = ?', (relationship.id,)).rowcount
+                           for relationship in relationships)
+
+    def update_nodes(self, updates):
+        """Set properties of nodes and index their new values within one transaction,
+        return the number of updated nodes
+
+        arguments:
+        updates -- list of pairs of a node and the properties to set (dict), deleted nodes are skipped
+        """
+        updated = 0
+        with self.lock:
+            with self._connection() as connection:
+                for node, properties in updates:
+                    row = connection.execute('SELECT properties FROM nodes WHERE id = ?', (node.id,)).fetchone()
+                    if row is None:
+                        continue
+                    merged = json.loads(row[0])
+                    old = [(key, index_value(merged[key]), node.id) for key in properties if merged.get(key)]
+                    new = [(key, index_value(value), node.id) for key, value in properties.iteritems() if value]
+                    merged.update(properties)
+                    connection.executemany('DELETE FROM node_index WHERE key = ? AND value = ? AND node = ?', old)
+                    connection.executemany('INSERT OR IGNORE INTO node_index VALUES (?, ?, ?)', new)
+                    connection.execute('UPDATE nodes SET properties = ? WHERE id = ?', (json.dumps(merged), node.id))
+                    updated += 1
+        return updated
+
+    def lineage(self, node, rel_types, reverse=False, max_depth=None):
+        """Return all nodes reachable from a node with a recursive query.
+
+        With a maximum depth, the nodes are returned together with their distance, nearest first.
+        Without one, every node is returned once with the distance None, even if the graph has cycles.
+
+        arguments:
+        node -- the node to start from
+        rel_types -- list of relationship types to follow
+
+        keyword arguments:
+        reverse -- True to follow the relationships from their end to their start
+        max_depth -- maximum distance of the returned nodes or None for any distance
+        """
+        source, target = ('end_node', 'start_node') if reverse else ('start_node', 'end_node')
+        types = ', '.join('?' * len(rel_types))
+        if max_depth is None:
+            query = ('WITH RECURSIVE lineage(id) AS (SELECT ? UNION '
+                     'SELECT r.%s FROM relationships r JOIN lineage l ON r.%s = l.id WHERE r.type IN (%s)) '
+                     'SELECT n.id, n.prov_type, n.type, n.properties, NULL FROM lineage l JOIN nodes n ON n.id = l.id '
+                     'WHERE n.id != ?' % (target, source, types))
+            params = [node.id] + list(rel_types) + [node.id]
+        else:
+            query = ('WITH RECURSIVE lineage(id, depth) AS (SELECT ?, 0 UNION '
+                     'SELECT r.%s, l.depth + 1 FROM relationships r JOIN lineage l ON r.%s = l.id '
+                     'WHERE r.type IN (%s) AND l.depth < ?) '
+                     'SELECT n.id, n.prov_type, n.type, n.properties, MIN(l.depth) AS depth '
+                     'FROM lineage l JOIN nodes n ON n.id = l.id WHERE n.id != ? '
+                     'GROUP BY n.id ORDER BY depth, n.id' % (target, source, types))
+            params = [node.id] + list(rel_types) + [max_depth, node.id]
+        for row in self._connection().execute(query, params):
+            yield self._node(row), row[4]
+
+    def run(self):
+        """starting the database service"""
+        self.setup_database()
+        self.running = True
@@ -0,0 +1,494 @@
+'''
+The abstract provenance store and the batches to write to it.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import json
+import threading
+import time
+import abc
+import pyprov.metrics
+
+NODE, RELATIONSHIP = 'node', 'relationship'
+
+# number of nodes or relationships read with one call while iterating over the whole store
+PAGE_SIZE = 1000
+
+# length of the time partitions of activities in seconds
+PARTITION_SECONDS = 3600
+
+# methods of every store which are timed, the iteration over the results of STORE_ITERATORS is timed as well
+STORE_OPERATIONS = ('submit_batch', 'create_node', 'create_relationship', 'find_node', 'find_nodes',
+                    'find_relationship', 'iter_nodes', 'neighbours', 'scan_nodes', 'scan_relationships',
+                    'get_nodes', 'relationships', 'delete_nodes', 'delete_relationships', 'update_nodes',
+                    'delete_partition')
+STORE_ITERATORS = ('iter_nodes', 'neighbours')
+
+def entity_key(identifier, version):
+    """Return the value of the 'entity' property, which identifies an entity by identifier and version"""
+    return json.dumps([identifier, index_value(version)])
+
+def time_partition(timestamp):
+    """Return the time partition of a timestamp (seconds since the epoch), the number of its hour since the epoch"""
+    return int(timestamp // PARTITION_SECONDS)
+
+def _number(value):
+    """Return a timestamp as a number, activities written by former versions have it as string"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def index_value(value):
+    """Return the text a property value is indexed with, text which isn't ASCII included"""
+    return value if isinstance(value, unicode) else str(value).decode('utf-8')
+
+class Node(object):
+    """A node of a provenance store which keeps its nodes as plain objects.
+
+    parameters:
+    id -- the identifier of the node, unique within the store
+    prov_type -- the provenance node type (ENTITY, ACTIVITY or AGENT)
+    type -- the type from the software development model
+    properties -- all other properties of the node (dict)
+    """
+    __slots__ = ('id', 'prov_type', 'type', 'properties')
+
+    def __init__(self, ident, prov_type, sdm_type, properties):
+        self.id = ident
+        self.prov_type = prov_type
+        self.type = sdm_type
+        self.properties = properties
+
+    def __repr__(self):
+        return 'Node(%d, %s, %s)' % (self.id, self.prov_type, self.type)
+
+class Relationship(object):
+    """A relationship of a provenance store which keeps its relationships as plain objects.
+
+    parameters:
+    id -- the identifier of the relationship, unique within the store
+    type -- the type of the relationship
+    start_node -- the outgoing node (Node)
+    end_node -- the incoming node (Node)
+    properties -- the properties of the relationship (dict)
+    """
+    __slots__ = ('id', 'type', 'start_node', 'end_node', 'properties')
+
+    def __init__(self, ident, rel_type, start_node, end_node, properties):
+        self.id = ident
+        self.type = rel_type
+        self.start_node = start_node
+        self.end_node = end_node
+        self.properties = properties
+
+    def __repr__(self):
+        return 'Relationship(%d, %s)' % (self.id, self.type)
+
+class ModelWriter(object):
+    """Mix-in with the methods to write the objects from the custom model.
+    
+    All methods are built on 'create_node', so they can be used by stores and batches alike.
+    """
+    def create_process(self, name, timestamp=None):
+        """Create a process started at 'timestamp' (seconds since the epoch, default: now)
+        
+        The process is indexed by its time partition, so activities are found by time (see 'iter_activities').
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        return self.create_node('ACTIVITY', 'PROCESS', name=name, timestamp=timestamp,
+                                partition=time_partition(timestamp))
+    
+    def create_input(self, inp):
+        return self.create_node('ENTITY', 'INPUT', identifier=inp.identifier, version=inp.version,
+                                entity=inp.key)
+    
+    def create_output(self, outp):
+        return self.create_node('ENTITY', 'OUTPUT', identifier=outp.identifier, version=outp.version,
+                                entity=outp.key)
+    
+    def create_actor(self, actor):
+        return self.create_node('AGENT', 'ACTOR', identifier=actor.identifier)
+
+
+class BatchReference(object):
+    """Reference to a node or relationship which is created within a WriteBatch.
+    
+    parameters:
+    index -- position of the creating operation within the batch
+    """
+    __slots__ = ('index',)
+    
+    def __init__(self, index):
+        self.index = index
+
+
+class WriteBatch(ModelWriter):
+    """Collect nodes and relationships to write them to the store at once.
+    
+    Every create-method returns a BatchReference, which can be used as start or end node
+    of later relationships in the same batch. Nodes already stored can be used as well.
+    Nothing is written until 'submit' is called.
+    
+    parameters:
+    store -- the provenance store to write to (ProvenanceStore)
+    operations -- list of all collected operations in order of creation
+    """
+    def __init__(self, store):
+        self.store = store
+        self.operations = []
+    
+    def create_node(self, prov_type, sdm_type, **properties):
+        self.operations.append((NODE, prov_type, sdm_type, properties))
+        return BatchReference(len(self.operations) - 1)
+    
+    def create_relationship(self, rel_type, start_node, end_node, **properties):
+        self.operations.append((RELATIONSHIP, rel_type, start_node, end_node, properties))
+        return BatchReference(len(self.operations) - 1)
+    
+    def submit(self):
+        """Write all collected operations and return the created items in order of creation"""
+        return self.store.submit_batch(self)
+
+
+class ProvenanceStore(ModelWriter):
+    """The abstract basis class for all provenance stores.
+    
+    All implemented stores should inherit from this class to ensure correct interface usage.
+    
+    The STORE_OPERATIONS of every store are timed as '<operation_prefix>.<method>' (see pyprov.metrics).
+    
+    parameters:
+    controller -- the managing controller class (Controller)
+    round_trips -- number of requests sent to the database, counted by stores using a database server
+    """
+    __metaclass__ = abc.ABCMeta
+    operation_prefix = 'store'
+    
+    def __init__(self, controller):
+        self.controller = controller
+        self.round_trips = 0
+        self.round_trip_lock = threading.Lock()
+        pyprov.metrics.REGISTRY.instrument(self, STORE_OPERATIONS, self.operation_prefix, STORE_ITERATORS)
+    
+    def count_round_trips(self, count=1):
+        """Count requests sent to the database"""
+        with self.round_trip_lock:
+            self.round_trips += count
+    
+    def create_batch(self):
+        """Return a new WriteBatch to collect nodes and relationships for this store"""
+        return WriteBatch(self)
+    
+    def submit_batch(self, batch):
+        """Write all operations of a batch and return the created items in order of creation.
+        
+        This default implementation calls 'create_node' and 'create_relationship' once per operation.
+        Stores which are able to write several items with a single request should override it.
+        
+        arguments:
+        batch -- the batch to write (WriteBatch)
+        """
+        results = []
+        for operation in batch.operations:
+            if operation[0] == NODE:
+                _, prov_type, sdm_type, properties = operation
+                results.append(self.create_node(prov_type, sdm_type, **properties))
+            else:
+                _, rel_type, start_node, end_node, properties = operation
+                if isinstance(start_node, BatchReference):
+                    start_node = results[start_node.index]
+                if isinstance(end_node, BatchReference):
+                    end_node = results[end_node.index]
+                results.append(self.create_relationship(rel_type, start_node, end_node, **properties))
+        return results
+ 
+    @abc.abstractmethod
+    def create_node(self, prov_type, sdm_type, **properties):
+        """abstract method to create a node in the database
+        
+        arguments:
+        prov_type -- an uppercase string to determine the provenance node type (ENTITY, ACTIVITY or AGENT).
+        sdm_type -- an uppercase string to determine the type from the software development model.
+        **properties -- list of keyword arguments which is completely added to the node.
+        """
+        pass
+    
+    @abc.abstractmethod
+    def create_relationship(self, rel_type, start_node, end_node, **properties):
+        """abstract method to create a releationship in the database
+        
+        arguments:
+        rel_type -- an uppercase string to determine the type of relationship between the two nodes, i.e. the predicate
+        start_node -- the outgoing node, from where the relationship starts, i.e. the subject 
+        end_node -- the incoming node, to where the relationship end, i.e the object
+        **properties -- list of keyword arguments which is completely added to the relationship.
+        """
+        pass
+
+    @abc.abstractmethod
+    def find_node(self, key, value):
+        """abstract method to find the latest node (the one with the highest identifier) in the database
+        
+        arguments:
+        key -- what key/identifier should be searched (string)
+        value -- what value has should that key have (type specified by key)
+        """
+        pass
+    
+    def find_nodes(self, pairs):
+        """Find the latest node for every key-value pair.
+        
+        This default implementation calls 'find_node' for every pair.
+        Stores which are able to search several pairs with a single request should override it.
+        
+        arguments:
+        pairs -- list of key-value pairs to search
+        
+        returns:
+        a list with the latest node or None for every pair
+        """
+        return [self.find_node(key, value) for key, value in pairs]
+    
+    @abc.abstractmethod
+    def find_relationship(self, rel_type=None, start_node=None, end_node=None, bidirectional=None, limit=None):
+        """abstract method to find the latest relationship (the one with the highest identifier) in the database
+        
+        keyword arguments:
+        rel_type -- type of relationships to find (None if any
+        start_node -- concrete start node (None if any)
+        end_node -- concrete end node to find (None if any)
+        bidirectional --  True if reversed relationships should also be included
+        limit -- only kept for compatibility, the latest relationship is always returned
+        """
+        pass
+    
+    @abc.abstractmethod
+    def iter_nodes(self, key, value, keys=(), limit=None):
+        """abstract method to iterate over all nodes with a given key-value pair, oldest first
+        
+        Every node is returned together with a tuple of the values of the requested properties.
+        Missing properties have the value None.
+        
+        arguments:
+        key -- what key/identifier should be searched (string)
+        value -- what value has should that key have (type specified by key)
+        
+        keyword arguments:
+        keys -- the keys of the properties to return with every node
+        limit -- maximum number of nodes to return or None for all
+        """
+        pass
+    
+    @abc.abstractmethod
+    def neighbours(self, node, rel_type, reverse=False, keys=(), limit=None):
+        """abstract method to iterate over all nodes connected to a node by relationships of a type
+        
+        Every node is returned together with a tuple of the values of the requested properties.
+        Missing properties have the value None.
+        
+        arguments:
+        node -- the node to start from
+        rel_type -- the type of relationships to follow
+        
+        keyword arguments:
+        reverse -- True to follow the relationships from their end node to their start node
+        keys -- the keys of the properties to return with every node
+        limit -- maximum number of nodes to return or None for all
+        """
+        pass
+    
+    @abc.abstractmethod
+    def scan_nodes(self, prov_type=None, after=None, limit=PAGE_SIZE):
+        """abstract method to return a page of all nodes of the store, ordered by their identifier
+        
+        keyword arguments:
+        prov_type -- the provenance node type of the nodes to return (None if any)
+        after -- the identifier of the last node of the previous page (None for the first page)
+        limit -- maximum number of nodes to return
+        """
+        pass
+    
+    @abc.abstractmethod
+    def scan_relationships(self, rel_type=None, after=None, limit=PAGE_SIZE):
+        """abstract method to return a page of all relationships of the store with their nodes, ordered by their identifier
+        
+        keyword arguments:
+        rel_type -- the type of the relationships to return (None if any)
+        after -- the identifier of the last relationship of the previous page (None for the first page)
+        limit -- maximum number of relationships to return
+        """
+        pass
+    
+    @abc.abstractmethod
+    def get_nodes(self, idents):
+        """abstract method to return the node of every identifier
+        
+        arguments:
+        idents -- list of node identifiers
+        """
+        pass
+    
+    @abc.abstractmethod
+    def relationships(self, node):
+        """abstract method to return all relationships of a node with their nodes, ordered by their identifier
+        
+        Outgoing and incoming relationships of every type are returned.
+        
+        arguments:
+        node -- the node of the relationships
+        """
+        pass
+    
+    @abc.abstractmethod
+    def delete_nodes(self, nodes):
+        """abstract method to delete nodes with all their relationships, return the number of deleted nodes
+        
+        arguments:
+        nodes -- the nodes to delete
+        """
+        pass
+    
+    @abc.abstractmethod
+    def delete_relationships(self, relationships):
+        """abstract method to delete relationships, return the number of deleted relationships
+        
+        arguments:
+        relationships -- the relationships to delete, the ones which are already deleted are skipped
+        """
+        pass
+    
+    @abc.abstractmethod
+    def update_nodes(self, updates):
+        """abstract method to set properties of nodes, return the number of updated nodes
+        
+        The new values are indexed instead of the replaced ones, all other properties are kept.
+        
+        arguments:
+        updates -- list of pairs of a node and the properties to set (dict)
+        """
+        pass
+    
+    def delete_partition(self, partition):
+        """Delete all activities of a time partition with their relationships
+        
+        Entities and agents are kept, they may be used by activities of other partitions.
+        The activities are found by the index of their partition (see 'iter_nodes').
+        Return the number of deleted activities.
+        
+        arguments:
+        partition -- the number of the partition (see 'time_partition')
+        """
+        return self.delete_nodes([node for node, _ in self.iter_nodes('partition', partition)])
+    
+    def iter_activities(self, start, end, keys=(), after=None):
+        """Iterate over all activities which started within a time range, in order of time.
+        
+        Only the partitions overlapping the range are read, one after another,
+        so the work is proportional to the range and not to the whole history.
+        Every activity is yielded as node, timestamp and the values of the requested properties.
+        
+        arguments:
+        start -- the earliest time (seconds since the epoch)
+        end -- the time after the latest one
+        
+        keyword arguments:
+        keys -- the keys of the properties to return with every node
+        after -- timestamp and identifier of the last activity of a previous page, only later ones are yielded
+        """
+        if after is not None:
+            start = max(start, after[0])
+        keys = ('timestamp',) + tuple(keys)
+        for partition in xrange(time_partition(start), time_partition(end) + 1):
+            found = []
+            for node, values in self.iter_nodes('partition', partition, keys):
+                timestamp = _number(values[0])
+                if timestamp is None or not start <= timestamp < end:
+                    continue
+                if after is not None and (timestamp, node.id) <= after:
+                    continue
+                found.append((timestamp, node.id, node, values[1:]))
+            found.sort(key=lambda item: item[:2])
+            for timestamp, _, node, values in found:
+                yield node, timestamp, values
+    
+    def drop_partitions(self, before, since):
+        """Delete the activities of all whole partitions within a time range, return their number
+        
+        The partition of 'before' itself is kept. The index can't tell the earliest
+        partition, so the range starts at a given time and every partition within it is read.
+        
+        arguments:
+        before -- the time (seconds since the epoch)
+        since -- the time of the oldest activity to delete
+        """
+        deleted = 0
+        for partition in xrange(time_partition(since), time_partition(before)):
+            deleted += self.delete_partition(partition)
+        return deleted
+    
+    def backfill_partitions(self, page_size=PAGE_SIZE):
+        """Give the activities written by former versions a time partition, return their number
+        
+        Their timestamp is stored as text and converted to a number, so they are
+        found by 'iter_activities' and deleted by 'drop_partitions' like all others.
+        Activities without a valid timestamp are left alone.
+        
+        keyword arguments:
+        page_size -- number of activities read and updated at once
+        """
+        updated = 0
+        updates = []
+        for node in self.iter_all_nodes('ACTIVITY', page_size):
+            value = node.properties.get('timestamp')
+            if 'partition' in node.properties and not isinstance(value, basestring):
+                continue
+            timestamp = _number(value)
+            if timestamp is None:
+                continue
+            updates.append((node, {'timestamp':timestamp, 'partition':time_partition(timestamp)}))
+            if len(updates) == page_size:
+                updated += self.update_nodes(updates)
+                updates = []
+        if updates:
+            updated += self.update_nodes(updates)
+        return updated
+    
+    def iter_all_nodes(self, prov_type=None, page_size=PAGE_SIZE):
+        """Iterate over all nodes of the store, oldest first, reading them page by page (see 'scan_nodes')"""
+        return _pages(self.scan_nodes, prov_type, page_size)
+    
+    def iter_all_relationships(self, rel_type=None, page_size=PAGE_SIZE):
+        """Iterate over all relationships of the store, oldest first, reading them page by page (see 'scan_relationships')"""
+        return _pages(self.scan_relationships, rel_type, page_size)
+    
+    def close(self):
+        """Release the connections of the store, stores without any don't need to override it"""
+        pass
+
+def _pages(scan, kind, page_size):
+    """Yield the items of all pages returned by a scan method, so only one page is kept in memory"""
+    after = None
+    while True:
+        page = scan(kind, after, page_size)
+        for item in page:
+            yield item
+        if len(page) < page_size:
+            return
+        after = page[-1].id
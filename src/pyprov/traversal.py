@@ -0,0 +1,479 @@
+'''
+A bounded traversal language over the provenance graph.
+
+A query is a chain of Gremlin-style steps, for example all entities which were used
+by the processes generating an entity:
+    g.V('identifier', $id).in('wasGeneratedBy').out('used').dedup().limit(10).values('identifier', 'version')
+
+Relationships are named by their type ('WAS_GENERATED_BY') or by the model type of
+their relation ('wasGeneratedBy', see pyprov.handlers). Every query is compiled into
+a plan once: the query text is normalized into its tokens, literals are replaced
+by placeholders, and the plan is cached by the normalized text, so a query which
+is run again with other literals or parameters ('$name') skips parsing and planning.
+Filters and limits of a plan are pushed down into the calls to the store and
+results are streamed, so no step keeps more than the nodes it has seen for 'dedup'.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import itertools
+import json
+import re
+import pyprov.handlers
+import pyprov.metrics
+from pyprov.cache import LookupCache
+from pyprov.store import index_value, time_partition, PAGE_SIZE
+
+# number of compiled plans kept
+QUERY_CACHE_SIZE = 1000
+# maximum number of results of a query
+MAX_RESULTS = 10000
+# maximum number of nodes a query reads from the store
+MAX_VISITS = 1000000
+# maximum number of steps of a query
+MAX_STEPS = 32
+# maximum number of time partitions (hours) read by 'activities'
+MAX_PARTITIONS = 24 * 366
+
+COMPILE_TIMER = pyprov.metrics.histogram('query.compile')
+
+TOKEN = re.compile(r'''\s*(?:
+    (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<param>\$\w+)
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<punct>[.(),])
+)''', re.X)
+
+CONSTANTS = {'true':True, 'false':False, 'null':None}
+
+# the properties of a node which are attributes of the Node itself
+NODE_ATTRIBUTES = ('id', 'prov_type', 'type')
+
+# the directions of the steps following relationships, as the 'reverse' arguments of ProvenanceStore.neighbours
+DIRECTIONS = {'out':(False,), 'in':(True,), 'both':(False, True)}
+
+class QueryError(ValueError):
+    """A query which can't be compiled or run"""
+
+class Literal(object):
+    """A literal of the query text, the position of its value among the literals"""
+    __slots__ = ('position',)
+
+    def __init__(self, position):
+        self.position = position
+
+class Param(object):
+    """A named parameter of the query, bound when the query is run"""
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+def _string(text):
+    """Return the value of a quoted string"""
+    if text[0] == '"':
+        try:
+            return json.loads(text)
+        except ValueError:
+            pass
+    return re.sub(r'\\(.)', r'\1', text[1:-1])
+
+def normalize(text):
+    """Return the normalized text of a query and the values of its literals.
+
+    Whitespace is dropped and every literal is replaced by '?', so queries which
+    only differ in their literals have the same normalized text.
+    """
+    if not isinstance(text, basestring):
+        raise QueryError('the query has to be a string')
+    tokens, literals = [], []
+    position, text = 0, text.strip()
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if match is None:
+            raise QueryError('unexpected %r at position %d' % (text[position:position + 20], position))
+        position = match.end()
+        kind = match.lastgroup
+        token = match.group(kind)
+        if kind == 'string':
+            literals.append(_string(token))
+            token = '?'
+        elif kind == 'number':
+            literals.append(float(token) if re.search(r'[.eE]', token) else int(token))
+            token = '?'
+        elif kind == 'name' and token in CONSTANTS:
+            literals.append(CONSTANTS[token])
+            token = '?'
+        tokens.append(token)
+    return ''.join(tokens), literals
+
+def _parse(normalized):
+    """Return the steps of a normalized query as pairs of name and arguments (Literal or Param)"""
+    tokens = re.findall(r'\$\w+|\w+|[.(),?]', normalized)
+    if tokens[:1] != ['g']:
+        raise QueryError("a query starts with 'g'")
+    steps, position, literal = [], 1, 0
+    def expect(token):
+        if position >= len(tokens) or tokens[position] != token:
+            raise QueryError('expected %r after %s' % (token, ''.join(tokens[:position])))
+    while position < len(tokens):
+        expect('.')
+        position += 1
+        name = tokens[position] if position < len(tokens) else ''
+        if not re.match(r'^[A-Za-z_]\w*$', name):
+            raise QueryError('expected a step after %s' % ''.join(tokens[:position]))
+        position += 1
+        expect('(')
+        position += 1
+        args = []
+        while tokens[position:position + 1] != [')']:
+            if args:
+                expect(',')
+                position += 1
+            token = tokens[position] if position < len(tokens) else ''
+            if token == '?':
+                args.append(Literal(literal))
+                literal += 1
+            elif token.startswith('$'):
+                args.append(Param(token[1:]))
+            else:
+                raise QueryError('expected an argument of %s' % name)
+            position += 1
+        position += 1
+        steps.append((name, args))
+    if not steps:
+        raise QueryError('a query has at least one step, like g.V()')
+    if len(steps) > MAX_STEPS:
+        raise QueryError('a query has at most %d steps' % MAX_STEPS)
+    return steps
+
+def rel_types():
+    """Return the relationship types by the model type of their relation"""
+    return dict((model_type, handler.rel_type) for model_type, handler in pyprov.handlers.HANDLERS.iteritems()
+                if isinstance(handler, pyprov.handlers.RelationHandler))
+
+def _arguments(name, args, least, most=None):
+    if len(args) < least or (most is not None and len(args) > most):
+        count = least if most == least else '%d to %s' % (least, most if most is not None else 'any')
+        raise QueryError('%s takes %s arguments' % (name, count))
+
+def _value(node, key):
+    """Return a property of a node, or its identifier or types"""
+    if key in NODE_ATTRIBUTES:
+        return getattr(node, key)
+    return node.properties.get(key)
+
+def _equal(value, expected):
+    """Compare property values like the index of the store does"""
+    if value is None or expected is None:
+        return value is expected
+    return index_value(value) == index_value(expected)
+
+def node_record(node):
+    """Return the JSON object of a node"""
+    return {'id':node.id, 'prov_type':node.prov_type, 'type':node.type, 'properties':node.properties}
+
+class Plan(object):
+    """The compiled plan of a query.
+
+    The first operation reads nodes from the store, the following ones transform the
+    stream of nodes and the last one may turn it into records. A 'has' with a value
+    directly after 'V()' becomes the lookup of the nodes in the index of the store
+    and consecutive filters are evaluated together. Limits are passed on to the
+    store when the plan is bound (see 'bind').
+
+    parameters:
+    operations -- list of tuples of the kind of operation and its arguments (Literal, Param or values)
+    params -- the names of the parameters of the query
+    """
+    def __init__(self, steps):
+        self.operations = []
+        self.params = set()
+        for position, (name, args) in enumerate(steps):
+            for arg in args:
+                if isinstance(arg, Param):
+                    self.params.add(arg.name)
+            self._add(position, name, args, len(steps))
+
+    def _add(self, position, name, args, count):
+        operations = self.operations
+        if position == 0 and name not in ('V', 'activities'):
+            raise QueryError("the first step is V or activities, not %s" % name)
+        if position > 0 and name in ('V', 'activities'):
+            raise QueryError('%s is only the first step' % name)
+        if operations and operations[-1][0] in ('values', 'count'):
+            raise QueryError('%s is the last step' % operations[-1][0])
+        if name == 'V':
+            _arguments(name, args, 0, 2)
+            if len(args) == 1:
+                raise QueryError('V takes a key and a value or no arguments')
+            operations.append(('index', args[0], args[1]) if args else ('scan', None))
+        elif name == 'activities':
+            _arguments(name, args, 2, 2)
+            operations.append(('activities', args[0], args[1]))
+        elif name in DIRECTIONS:
+            _arguments(name, args, 1)
+            operations.append(('expand', DIRECTIONS[name], args))
+        elif name in ('has', 'hasNot'):
+            _arguments(name, args, 1, 2 if name == 'has' else 1)
+            predicate = (name, args[0], args[1] if len(args) > 1 else None)
+            previous = operations[-1]
+            # a filter of all nodes becomes the lookup of the nodes
+            if previous == ('scan', None) and name == 'has' and len(args) == 2:
+                operations[-1] = ('index', args[0], args[1])
+            elif previous[0] == 'filter':
+                operations[-1] = ('filter', previous[1] + (predicate,))
+            else:
+                operations.append(('filter', (predicate,)))
+        elif name == 'dedup':
+            _arguments(name, args, 0, 0)
+            operations.append(('dedup',))
+        elif name == 'limit':
+            _arguments(name, args, 1, 1)
+            operations.append(('limit', args[0]))
+        elif name == 'values':
+            _arguments(name, args, 1)
+            operations.append(('values', tuple(args)))
+        elif name == 'count':
+            _arguments(name, args, 0, 0)
+            operations.append(('count',))
+        else:
+            raise QueryError('unknown step: ' + name)
+
+    def bind(self, literals, params, limit=MAX_RESULTS):
+        """Return the operations with the values of their arguments and the maximum number
+        of nodes every operation needs to read, raise a QueryError if an argument is invalid
+
+        arguments:
+        literals -- the values of the literals of the query (see 'normalize')
+        params -- the values of the parameters by name
+        """
+        missing = self.params.difference(params or {})
+        if missing:
+            raise QueryError('missing parameters: ' + ', '.join(sorted(missing)))
+        def value(arg):
+            return literals[arg.position] if isinstance(arg, Literal) else params[arg.name]
+        def text(arg, name):
+            result = value(arg)
+            if not isinstance(result, basestring):
+                raise QueryError('%s has to be a string' % name)
+            return result
+        def number(arg, name):
+            result = value(arg)
+            if isinstance(result, bool) or not isinstance(result, (int, long, float)):
+                raise QueryError('%s has to be a number' % name)
+            return result
+
+        types = rel_types()
+        bound = []
+        for operation in self.operations:
+            kind = operation[0]
+            if kind == 'index':
+                bound.append((kind, text(operation[1], 'a key'), value(operation[2])))
+            elif kind == 'activities':
+                start, end = number(operation[1], 'the start'), number(operation[2], 'the end')
+                if time_partition(end) - time_partition(start) > MAX_PARTITIONS:
+                    raise QueryError('activities reads at most %d hours' % MAX_PARTITIONS)
+                bound.append((kind, start, end))
+            elif kind == 'expand':
+                names = [text(arg, 'a relationship') for arg in operation[2]]
+                for name in names:
+                    if name not in types and not re.match(r'^[A-Z_]+$', name):
+                        raise QueryError('unknown relationship: ' + name)
+                bound.append((kind, operation[1], [types.get(name, name) for name in names]))
+            elif kind == 'filter':
+                bound.append((kind, [(test, text(key, 'a key'), value(expected) if expected else None)
+                                     for test, key, expected in operation[1]]))
+            elif kind == 'limit':
+                count = number(operation[1], 'limit')
+                if count < 0 or count != int(count):
+                    raise QueryError('limit has to be a natural number')
+                bound.append((kind, int(count)))
+            elif kind == 'values':
+                bound.append((kind, [text(arg, 'a key') for arg in operation[1]]))
+            else:
+                bound.append(operation)
+
+        # the number of nodes every operation has to yield at most, as long as nothing in between drops nodes
+        limits = []
+        needed = limit
+        for operation in reversed(bound):
+            if operation[0] == 'limit':
+                needed = operation[1] if needed is None else min(needed, operation[1])
+            elif operation[0] in ('filter', 'dedup', 'count'):
+                limits.append(None)
+                needed = None
+                continue
+            limits.append(needed)
+            if operation[0] in ('index', 'scan', 'activities', 'expand'):
+                needed = None
+        limits.reverse()
+        return [operation + (bound_limit,) for operation, bound_limit in zip(bound, limits)]
+
+class Query(object):
+    """A plan bound to its arguments, iterate over it to run it against a store.
+
+    parameters:
+    store -- the provenance store to read (ProvenanceStore)
+    operations -- the bound operations (see Plan.bind)
+    visits -- number of nodes read from the store so far
+    """
+    def __init__(self, store, operations, limit=MAX_RESULTS, max_visits=MAX_VISITS):
+        self.store = store
+        self.operations = operations
+        self.limit = limit
+        self.max_visits = max_visits
+        self.visits = 0
+
+    def _visit(self, nodes):
+        """Count the nodes read from the store, raise a QueryError when there are too many"""
+        for node in nodes:
+            self.visits += 1
+            if self.visits > self.max_visits:
+                raise QueryError('the query read more than %d nodes' % self.max_visits)
+            yield node
+
+    def _scan(self, prov_type, limit):
+        after = None
+        while limit is None or limit > 0:
+            page = self.store.scan_nodes(prov_type, after, PAGE_SIZE if limit is None else min(limit, PAGE_SIZE))
+            for node in page:
+                yield node
+            if len(page) < PAGE_SIZE:
+                return
+            after = page[-1].id
+            if limit is not None:
+                limit -= len(page)
+
+    def _start(self, operation):
+        kind, limit = operation[0], operation[-1]
+        if kind == 'scan':
+            return self._scan(None, limit)
+        if kind == 'activities':
+            return itertools.islice((node for node, _, _ in self.store.iter_activities(operation[1], operation[2])),
+                                    limit)
+        key, expected = operation[1], operation[2]
+        if key == 'prov_type':
+            return self._scan(expected, limit)
+        if key in NODE_ATTRIBUTES or not expected:
+            # the index only knows properties with a value
+            nodes = (node for node in self._scan(None, None) if _equal(_value(node, key), expected))
+            return itertools.islice(nodes, limit)
+        return (node for node, _ in self.store.iter_nodes(key, expected, limit=limit))
+
+    def _expand(self, nodes, directions, types, limit):
+        for node in nodes:
+            for rel_type in types:
+                for reverse in directions:
+                    for neighbour, _ in self.store.neighbours(node, rel_type, reverse, limit=limit):
+                        yield neighbour
+
+    def nodes(self):
+        """Iterate over the nodes of the query, before they are turned into records"""
+        operations = self.operations
+        if operations[-1][0] in ('values', 'count'):
+            operations = operations[:-1]
+        nodes = self._visit(self._start(operations[0]))
+        for operation in operations[1:]:
+            kind = operation[0]
+            if kind == 'expand':
+                nodes = self._visit(self._expand(nodes, operation[1], operation[2], operation[-1]))
+            elif kind == 'filter':
+                nodes = self._filter(nodes, operation[1])
+            elif kind == 'dedup':
+                nodes = self._dedup(nodes)
+            elif kind == 'limit':
+                nodes = itertools.islice(nodes, operation[1])
+        return nodes
+
+    def _filter(self, nodes, predicates):
+        for node in nodes:
+            for test, key, expected in predicates:
+                value = _value(node, key)
+                if test == 'hasNot':
+                    if value is not None:
+                        break
+                elif value is None or (expected is not None and not _equal(value, expected)):
+                    break
+            else:
+                yield node
+
+    def _dedup(self, nodes):
+        seen = set()
+        for node in nodes:
+            if node.id not in seen:
+                seen.add(node.id)
+                yield node
+
+    def __iter__(self):
+        """Yield the results of the query as JSON objects, at most 'limit' of them"""
+        last = self.operations[-1]
+        if last[0] == 'count':
+            yield {'count':sum(1 for _ in self.nodes())}
+            return
+        nodes = itertools.islice(self.nodes(), self.limit)
+        if last[0] == 'values':
+            keys = last[1]
+            for node in nodes:
+                yield dict((key, _value(node, key)) for key in keys)
+        else:
+            for node in nodes:
+                yield node_record(node)
+
+class QueryEngine(object):
+    """Compile queries and run them against a store, keeping the plans of recent queries.
+
+    parameters:
+    store -- the provenance store to read (ProvenanceStore)
+    plans -- the compiled plans by normalized query text (LookupCache)
+    texts -- the plans and literals by the exact text of recent queries, so a query
+             which is sent again as it is is not even normalized (LookupCache)
+    """
+    def __init__(self, store, cache_size=QUERY_CACHE_SIZE, max_visits=MAX_VISITS):
+        self.store = store
+        self.plans = LookupCache(cache_size, None)
+        self.texts = LookupCache(cache_size, None)
+        self.max_visits = max_visits
+
+    def compile(self, text):
+        """Return the plan of a query and the values of its literals, raise a QueryError if it's invalid"""
+        compiled = self.texts.get(text) if isinstance(text, basestring) else None
+        if compiled is not None:
+            return compiled
+        normalized, literals = normalize(text)
+        plan = self.plans.get(normalized)
+        if plan is None:
+            with COMPILE_TIMER.time():
+                plan = Plan(_parse(normalized))
+            self.plans.put(normalized, plan)
+        self.texts.put(text, (plan, literals))
+        return plan, literals
+
+    def query(self, text, params=None, limit=MAX_RESULTS):
+        """Return a query bound to its parameters, iterate over it to get its results.
+
+        arguments:
+        text -- the text of the query
+
+        keyword arguments:
+        params -- the values of the parameters of the query by name
+        limit -- maximum number of results
+        """
+        plan, literals = self.compile(text)
+        limit = MAX_RESULTS if limit is None else min(limit, MAX_RESULTS)
+        return Query(self.store, plan.bind(literals, params or {}, limit), limit, self.max_visits)
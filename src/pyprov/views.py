@@ -22,7 +22,151 @@ Created on 26.03.2013
    limitations under the License.
 
 '''
-from flask import Blueprint, request, make_response
+import base64
+import itertools
+import json
+import math
+import time
+import uuid
+from flask import Blueprint, Response, request, make_response
+import pyprov.metrics
+from pyprov.cache import LookupCache
+from pyprov.ingest import QueueFull
+from pyprov.interchange import epoch_time, iso_time
+from pyprov.lineage import UPSTREAM, DOWNSTREAM
+from pyprov.reachability import ANCESTORS, DESCENDANTS
+from pyprov.store import time_partition
+from pyprov.traversal import MAX_PARTITIONS
+
+PARSE_TIMER = pyprov.metrics.histogram('view.parse')
+
+# number of paged results kept to continue them with their cursor, and the seconds they are kept
+PAGES = 1000
+PAGE_TTL = 300.0
+
+# maximum distance of a time argument from the epoch (about 30 million years)
+MAX_SECONDS = 10 ** 15
+
+def json_response(data, status=200):
+    """Return a response with JSON-encoded data"""
+    response = make_response(json.dumps(data), status)
+    response.mimetype = 'application/json'
+    return response
+
+def int_arg(name):
+    """Return a query parameter as integer or None if it's missing, raise a ValueError if it's invalid"""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    value = int(value)
+    if value < 0:
+        raise ValueError(name + ' must not be negative')
+    return value
+
+def time_arg(name):
+    """Return a query parameter with seconds since the epoch or an xsd:dateTime as seconds or None
+    if it's missing, raise a ValueError if it's invalid"""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = epoch_time(value)
+        if seconds is None:
+            raise ValueError(name + ' must be seconds since the epoch or an xsd:dateTime')
+    # the time partitions of the range have to be numbers of the platform
+    if math.isnan(seconds) or abs(seconds) > MAX_SECONDS:
+        raise ValueError('%s must be a number of seconds within %d of the epoch' % (name, MAX_SECONDS))
+    return seconds
+
+def encode_cursor(offset, token=None):
+    """Return an opaque cursor for the position within a result and the key of its kept rest"""
+    return base64.urlsafe_b64encode(str(offset) if token is None else '%d:%s' % (offset, token))
+
+def decode_cursor(cursor):
+    """Return the position within a result and the key of its kept rest (or None) for a cursor,
+    raise a ValueError if it's invalid"""
+    if not cursor:
+        return 0, None
+    try:
+        offset, _, token = base64.urlsafe_b64decode(str(cursor)).partition(':')
+        return int(offset), token or None
+    except TypeError:
+        raise ValueError('invalid cursor')
+
+def decode_activity_cursor(cursor):
+    """Return the timestamp and identifier of the last activity of the previous page for a cursor,
+    None for the first page, raise a ValueError if it's invalid"""
+    if not cursor:
+        return None
+    try:
+        timestamp, ident = base64.urlsafe_b64decode(str(cursor)).split(',')
+        return float(timestamp), int(ident)
+    except (TypeError, ValueError):
+        raise ValueError('invalid cursor')
+
+def stream_activities(activities, limit):
+    """Yield a page of activities as NDJSON, followed by a cursor for the next page if there is one
+
+    The cursor holds the timestamp and identifier of the last activity of the page, so the next
+    page continues right after it without reading the ones before again.
+    """
+    last = None
+    for count, (node, timestamp, values) in enumerate(activities):
+        if limit is not None and count == limit:
+            yield json.dumps({'cursor':encode_cursor('%r,%d' % last)}) + '\n'
+            return
+        last = (timestamp, node.id)
+        yield json.dumps({'name':values[0], 'timestamp':timestamp, 'time':iso_time(timestamp), 'id':node.id}) + '\n'
+
+def stream_results(results):
+    """Yield the results of a query as NDJSON, an error while running it ends the stream with an error line"""
+    try:
+        for result in results:
+            yield json.dumps(result) + '\n'
+    except ValueError as e:
+        yield json.dumps({'error':e.message}) + '\n'
+
+def stream_page(records, offset, limit, pages, query_key):
+    """Yield a page of records as NDJSON, followed by a cursor for the next page if there is one
+
+    The iterator of the records is kept in 'pages' under a new key in the cursor, so the
+    next page continues it instead of starting the query again (see 'continue_page').
+
+    arguments:
+    records -- iterator over the records behind the ones of former pages
+    offset -- number of records of former pages
+    limit -- maximum number of records of the page or None
+    pages -- the kept iterators and their offset by key (LookupCache)
+    query_key -- the parameters of the query, a cursor only continues the same query
+    """
+    for count, record in enumerate(records):
+        if limit is not None and count == limit:
+            token = uuid.uuid4().hex
+            pages.put((query_key, token), (itertools.chain([record], records), offset + limit))
+            yield json.dumps({'cursor':encode_cursor(offset + limit, token)}) + '\n'
+            return
+        yield json.dumps(record) + '\n'
+
+def continue_page(pages, cursor, query_key, query):
+    """Return an iterator over the records of a page and their offset, raise a ValueError if the cursor is invalid
+
+    The iterator kept for the cursor is taken, so a cursor is continued once. If it's gone,
+    e.g. expired or kept by another worker process, the query is run again and the records
+    of the former pages are skipped.
+
+    arguments:
+    pages -- the kept iterators and their offset by key (LookupCache)
+    cursor -- the cursor of the request or None for the first page
+    query_key -- the parameters of the query, a cursor only continues the same query
+    query -- function without arguments to run the query
+    """
+    offset, token = decode_cursor(cursor)
+    kept = pages.take((query_key, token)) if token else None
+    if kept is not None and kept[1] == offset:
+        return kept[0], offset
+    return itertools.islice(query(), offset, None), offset
 
 class View(Blueprint):
     def __init__(self, name, import_name, url_prefix=None):
@@ -36,8 +180,16 @@ class RestView(View):
     def __init__(self):
         #TODO: add version number in uri
         super(RestView, self).__init__('rest', __name__, url_prefix='/prov')
+        self.pages = LookupCache(PAGES, PAGE_TTL)
         self.add_url_rule('/', 'rest_index', self.rest_index)
         self.add_url_rule('/general', 'general', self.general, methods=['GET', 'POST'])
+        self.add_url_rule('/general/bulk', 'general_bulk', self.general_bulk, methods=['GET', 'POST'])
+        self.add_url_rule('/receipts/<receipt>', 'receipt', self.receipt)
+        self.add_url_rule('/lineage/<path:identifier>/<direction>', 'lineage', self.lineage)
+        self.add_url_rule('/reachable', 'reachable', self.reachable)
+        self.add_url_rule('/activities', 'activities', self.activities)
+        self.add_url_rule('/<model_type>', 'write', self.write, methods=['GET', 'POST'])
+        self.add_url_rule('/<model_type>/bulk', 'write_bulk', self.write_bulk, methods=['GET', 'POST'])
         
     def rest_index(self):
         """
@@ -57,19 +209,193 @@ class RestView(View):
         optional params:
             None
         """
-        if request.method == 'POST':
-            try:
-                process = request.json['process']
-                inp = request.json['input']
-                outp = request.json['output']
-                actor = request.json['actor']
-                self.server.write_prov('general', process, inp, outp, actor)
-                return 'True'
-            except (TypeError, ValueError) as e:
-                return make_response(''+e.message, 400)
         #TODO: GET must return the provenance data
-        else:
-            return self.general.__doc__
+        return self.write('general')
+    
+    def general_bulk(self):
+        """Save many general processes with one request (see 'write_bulk')."""
+        return self.write_bulk('general')
+    
+    def write(self, model_type):
+        """Save one record of a model type, e.g. a relation like 'wasDerivedFrom'.
+        
+        A GET returns the required and optional params of the model type.
+        """
+        try:
+            handler = self.server.handler(model_type)
+        except ValueError as e:
+            return make_response(''+e.message, 404)
+        if request.method != 'POST':
+            return handler.__doc__
+        try:
+            with PARSE_TIMER.time():
+                record = handler.from_json(request.json)
+            result = self.server.write_prov(model_type, record)
+        except (TypeError, ValueError) as e:
+            return make_response(''+e.message, 400)
+        except QueueFull as e:
+            return make_response(''+e.message, 503)
+        if self.server.queued:
+            return json_response({'receipt':result, 'status':'queued'}, 202)
+        return 'True'
+    
+    def write_bulk(self, model_type):
+        """Save many records of a model type with one request.
+        
+        The body is either a JSON array of records (Content-Type 'application/json')
+        or one record per line (Content-Type 'application/x-ndjson').
+        Every record needs the same params as a single one.
+        All records are validated first, then the valid ones are written in batches.
+        
+        returns:
+            a JSON object with the number of created and failed records and
+            a status ('created', 'invalid' or 'failed') for every record.
+            If provenance is written in the background, the status is 'queued'
+            with a receipt or 'rejected' if the queue is full.
+        """
+        try:
+            handler = self.server.handler(model_type)
+        except ValueError as e:
+            return make_response(''+e.message, 404)
+        if request.method != 'POST':
+            return self.write_bulk.__doc__
+        with PARSE_TIMER.time():
+            if request.mimetype == 'application/x-ndjson':
+                records = []
+                for line in request.stream:
+                    if line.strip():
+                        try:
+                            records.append(json.loads(line))
+                        except ValueError as e:
+                            records.append(e)
+            else:
+                records = request.json
+                if not isinstance(records, list):
+                    return make_response('expected a JSON array of records', 400)
+            
+            statuses = [None] * len(records)
+            valid = []
+            for index, record in enumerate(records):
+                try:
+                    if isinstance(record, ValueError):
+                        raise record
+                    valid.append((index, (handler.from_json(record),)))
+                except ValueError as e:
+                    statuses[index] = {'index':index, 'status':'invalid', 'error':e.message}
+        
+        results = self.server.write_prov_bulk(model_type, [args for _, args in valid])
+        for (index, _), result in zip(valid, results):
+            if result is None:
+                statuses[index] = {'index':index, 'status':'created'}
+            elif isinstance(result, QueueFull):
+                statuses[index] = {'index':index, 'status':'rejected', 'error':str(result)}
+            elif isinstance(result, Exception):
+                statuses[index] = {'index':index, 'status':'failed', 'error':str(result)}
+            else:
+                statuses[index] = {'index':index, 'status':'queued', 'receipt':result}
+        created = sum(1 for status in statuses if status['status'] in ('created', 'queued'))
+        return json_response({'created':created, 'failed':len(statuses) - created, 'records':statuses})
+    
+    def receipt(self, receipt):
+        """Return the status of provenance written in the background.
+        
+        The status is 'queued', 'written' or 'failed' (with an error).
+        """
+        status = self.server.prov_status(receipt)
+        if status is None:
+            return make_response('unknown receipt', 404)
+        return json_response(status)
+    
+    def lineage(self, identifier, direction):
+        """Return the lineage of an entity.
+        
+        The direction is either 'upstream' for all entities the entity was derived from
+        or 'downstream' for all entities derived from it.
+        The entities are streamed breadth-first as one JSON object per line, each with
+        identifier, version, depth, the connecting process and the entity it was reached from.
+        
+        The directions 'ancestors' and 'descendants' return the same entities (without 
+        depth and process) from the reachability index instead of traversing the database.
+        
+        optional params:
+            version - the version of the entity (default: all versions)
+            depth   - the maximum number of processes between the entity and a result
+            limit   - the maximum number of results (at least 1), followed by a line with a cursor for the next page
+            cursor  - the cursor returned by the previous page, it continues the same traversal
+        """
+        if direction not in (UPSTREAM, DOWNSTREAM, ANCESTORS, DESCENDANTS):
+            return make_response('unknown direction: ' + direction, 404)
+        if direction in (ANCESTORS, DESCENDANTS) and not self.server.indexed:
+            return make_response('the reachability index is disabled', 501)
+        version = request.args.get('version')
+        def query():
+            if direction in (UPSTREAM, DOWNSTREAM):
+                return self.server.read_lineage(identifier, direction, version, depth)
+            return self.server.read_related(identifier, direction, version)
+        try:
+            depth = int_arg('depth')
+            limit = int_arg('limit')
+            if limit == 0:
+                raise ValueError('limit must be positive')
+            query_key = (identifier, direction, version, depth)
+            records, offset = continue_page(self.pages, request.args.get('cursor'), query_key, query)
+        except ValueError as e:
+            return make_response(''+e.message, 400)
+        return Response(stream_page(records, offset, limit, self.pages, query_key), mimetype='application/x-ndjson')
+    
+    def reachable(self):
+        """Tell if an entity was derived from another one, using the reachability index.
+        
+        required params:
+            from - the identifier of the source entity
+            to   - the identifier of the derived entity
+        
+        optional params:
+            from_version - the version of the source entity (default: any version)
+            to_version   - the version of the derived entity (default: any version)
+        """
+        if not self.server.indexed:
+            return make_response('the reachability index is disabled', 501)
+        source, target = request.args.get('from'), request.args.get('to')
+        if source is None or target is None:
+            return make_response('missing parameter: from and to are required', 400)
+        result = self.server.read_reachable(source, target, request.args.get('from_version'),
+                                            request.args.get('to_version'))
+        return json_response({'reachable':result})
+
+    def activities(self):
+        """Return the activities which started within a time range, in order of time.
+        
+        The activities are streamed as one JSON object per line, each with name, timestamp
+        (seconds since the epoch), time (xsd:dateTime in UTC) and the identifier of its node.
+        Only the time partitions of the range are read, so a query is as fast for an old
+        range as for a recent one. A range covers at most MAX_PARTITIONS hours.
+        
+        required params:
+            from   - the earliest time, as seconds since the epoch or xsd:dateTime
+        
+        optional params:
+            to     - the time after the latest activity (default: now)
+            limit  - the maximum number of results (at least 1), followed by a line with a cursor for the next page
+            cursor - the cursor returned by the previous page
+        """
+        try:
+            start = time_arg('from')
+            end = time_arg('to')
+            limit = int_arg('limit')
+            after = decode_activity_cursor(request.args.get('cursor'))
+        except ValueError as e:
+            return make_response(''+e.message, 400)
+        if start is None:
+            return make_response('missing parameter: from is required', 400)
+        if limit == 0:
+            return make_response('limit must be positive', 400)
+        if end is None:
+            end = time.time()
+        if time_partition(end) - time_partition(start) > MAX_PARTITIONS:
+            return make_response('activities reads at most %d hours' % MAX_PARTITIONS, 400)
+        activities = self.server.read_activities(start, end, after)
+        return Response(stream_activities(activities, limit), mimetype='application/x-ndjson')
 
 class GremlinView(View):
     """Set up path to the gremlin query interface"""
@@ -85,8 +411,51 @@ class GremlinView(View):
         return 'Gremlin Interface'
     
     def query(self):
-        if request.method == 'POST':
-            pass
-        else:
-            return 'Query!'
-    
\ No newline at end of file
+        """Run a traversal query and stream its results (see pyprov.traversal).
+        
+        The body is a JSON object with the query, for example
+        {"query":"g.V('identifier', $id).in('wasGeneratedBy').out('used').limit(10)", "params":{"id":"id4"}}
+        The results are streamed as one JSON object per line: nodes with id, prov_type,
+        type and properties, the requested properties ('values') or their number ('count').
+        
+        required params:
+            query  - the query
+        
+        optional params:
+            params - the values of the parameters of the query ('$name') by name
+            limit  - the maximum number of results (at most 10000)
+        """
+        if request.method != 'POST':
+            return self.query.__doc__
+        body = request.json
+        if not isinstance(body, dict) or 'query' not in body:
+            return make_response('expected a JSON object with a query', 400)
+        params, limit = body.get('params') or {}, body.get('limit')
+        if not isinstance(params, dict):
+            return make_response('params must be a JSON object', 400)
+        if limit is not None and (not isinstance(limit, (int, long)) or isinstance(limit, bool) or limit < 0):
+            return make_response('limit must be a natural number', 400)
+        try:
+            results = self.server.run_query(body['query'], params, limit)
+        except ValueError as e:
+            return make_response(''+e.message, 400)
+        return Response(stream_results(results), mimetype='application/x-ndjson')
+    
+
+class MetricsView(View):
+    """Set up path to the metrics in the Prometheus text format"""
+    def __init__(self):
+        super(MetricsView, self).__init__('metrics', __name__)
+        self.add_url_rule('/metrics', 'metrics', self.metrics)
+    
+    def metrics(self):
+        """
+        Return latency histograms per operation, round trips to the database,
+        cache statistics and the depth of the ingest queue.
+        
+        The metrics are those of the worker process answering the request, they are
+        not summed up over several workers.
+        """
+        response = make_response(self.server.metrics())
+        response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+        return response
@@ -0,0 +1,429 @@
+'''
+Write-ahead log for provenance records.
+
+Records are appended to a local log and acknowledged as soon as they are on disk.
+A background thread replays the log into the provenance store and remembers its
+progress in a checkpoint, so accepted provenance survives store outages and restarts.
+
+The log is split into segments. Every segment is named after the sequence number
+of its first record and holds frames of the form
+
+    payload length (4 bytes) | CRC32 of payload (4 bytes) | payload (JSON)
+
+A torn frame at the end of the last segment is cut off when the log is opened.
+Segments which are completely replayed are deleted.
+
+Records which the store keeps rejecting are moved to the dead-letter segment,
+which has the same frames. Their payload is the JSON array
+[sequence number, model type, arguments, error].
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import httplib
+import json
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import zlib
+from pyprov.ingest import QueueFull
+from pyprov.pool import HTTPError, PoolTimeout
+
+SEGMENT_SIZE = 64 * 1024 * 1024
+SEGMENT_SUFFIX = '.wal'
+CHECKPOINT = 'checkpoint'
+DEAD_LETTER = 'dead-letter'
+MAX_BACKOFF = 30.0
+MAX_ATTEMPTS = 5
+
+FRAME = struct.Struct('>II')
+
+QUEUED, WRITTEN = 'queued', 'written'
+
+logger = logging.getLogger(__name__)
+
+def _encode(value):
+    """Return the JSON object of a model object within the arguments of a record (see Process.to_json)"""
+    try:
+        return value.to_json()
+    except AttributeError:
+        raise TypeError('%r is not JSON serializable' % (value,))
+
+def _transient(error):
+    """Return True if an error of the store will probably go away by itself, e.g. an outage"""
+    if isinstance(error, HTTPError):
+        return error.status >= 500
+    if isinstance(error, sqlite3.OperationalError):
+        # other operational errors, e.g. "no such table", stay until the database is changed
+        message = str(error).lower()
+        return 'locked' in message or 'busy' in message
+    return isinstance(error, (EnvironmentError, httplib.HTTPException, PoolTimeout))
+
+def _segment_name(base):
+    return '%020d%s' % (base, SEGMENT_SUFFIX)
+
+def read_frames(path):
+    """Yield the payload of every intact frame of a segment together with the offset behind it.
+
+    Reading stops at the first incomplete or corrupt frame.
+
+    arguments:
+    path -- the path of the segment file
+    """
+    with open(path, 'rb') as segment:
+        offset = 0
+        while True:
+            header = segment.read(FRAME.size)
+            if len(header) < FRAME.size:
+                return
+            length, checksum = FRAME.unpack(header)
+            payload = segment.read(length)
+            if len(payload) < length or zlib.crc32(payload) & 0xffffffff != checksum:
+                return
+            offset += FRAME.size + length
+            yield payload, offset
+
+class WriteAheadLog(object):
+    """Append provenance records to a local log and replay them into the store.
+
+    The log offers the same interface as the IngestQueue. The receipt of a record
+    is its sequence number within the log. Appending threads share their fsync calls,
+    so every record is acknowledged with the next sync of the log.
+    Records are replayed in order, one batch of consecutive records of the same type
+    at a time, and the checkpoint is saved after every written batch.
+    Records are replayed at least once, i.e. a crash between writing a batch and
+    saving the checkpoint writes that batch again.
+    While the store is unavailable, replay is retried forever. A batch the store
+    rejects otherwise MAX_ATTEMPTS times is replayed record by record, and a record
+    rejected MAX_ATTEMPTS times is moved to the dead-letter segment.
+
+    parameters:
+    dev_factory -- the factory to write the records (DevFactory)
+    directory -- the directory of the segments and the checkpoint
+    segment_size -- size in bytes after which a new segment is started
+    batch_size -- maximum number of records replayed together
+    appended -- sequence number of the last appended record
+    durable -- sequence number of the last record synced to disk
+    applied -- sequence number of the last record written to the store
+    pending -- read records which are not written yet, ordered by sequence number
+    attempts -- number of failed attempts to write the first pending record
+    isolate -- sequence number up to which records are replayed one by one
+    """
+    def __init__(self, dev_factory, directory, segment_size=SEGMENT_SIZE, batch_size=None):
+        self.dev_factory = dev_factory
+        self.directory = directory
+        self.segment_size = segment_size
+        self.batch_size = batch_size or dev_factory.batch_size
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(threading.Lock())
+        self.segment = None
+        self.appended = 0
+        self.durable = 0
+        self.applied = 0
+        self.syncing = False
+        self.pending = []
+        self.attempts = 0
+        self.isolate = 0
+        self.reader = None
+        self.reader_base = 0
+        self.reader_next = 0
+        self.reader_seq = 0
+        self.replayer = None
+        self.running = False
+        self._open()
+
+    def _segments(self):
+        """Return the sorted base sequence numbers of all segments"""
+        return sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.directory)
+                      if name.endswith(SEGMENT_SUFFIX))
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _open(self):
+        """Read the checkpoint, repair the last segment and open it for appending"""
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        try:
+            with open(self._path(CHECKPOINT)) as checkpoint:
+                self.applied = int(checkpoint.read().strip() or 0)
+        except IOError:
+            self.applied = 0
+
+        segments = self._segments()
+        if not segments:
+            base = self.applied + 1
+            self.segment = open(self._path(_segment_name(base)), 'ab')
+            self.appended = self.applied
+        else:
+            base = segments[-1]
+            path = self._path(_segment_name(base))
+            count, end = 0, 0
+            for _, end in read_frames(path):
+                count += 1
+            with open(path, 'r+b') as segment:
+                segment.truncate(end)
+            self.segment = open(path, 'ab')
+            self.appended = base + count - 1
+        os.fsync(self.segment.fileno())
+        self.durable = self.appended
+        self.reader_seq = self.applied + 1
+
+    def _rotate(self):
+        """Sync the current segment and start a new one"""
+        self.segment.flush()
+        os.fsync(self.segment.fileno())
+        self.segment.close()
+        self.segment = open(self._path(_segment_name(self.appended + 1)), 'ab')
+
+    def _append(self, payloads):
+        """Append the encoded records and return the sequence number of the last one,
+        raise a QueueFull error if the log is closed"""
+        with self.lock:
+            if self.segment.closed:
+                raise QueueFull('write-ahead log is stopped')
+            for payload in payloads:
+                if self.segment.tell() >= self.segment_size:
+                    self._rotate()
+                self.segment.write(FRAME.pack(len(payload), zlib.crc32(payload) & 0xffffffff))
+                self.segment.write(payload)
+                self.appended += 1
+            self.segment.flush()
+            return self.appended
+
+    def _sync(self, seq):
+        """Wait until the record with the given sequence number is on disk.
+
+        Only one thread calls fsync at a time. All records appended before
+        that call are durable afterwards, so waiting threads usually don't need another one.
+        """
+        with self.condition:
+            while self.durable < seq:
+                if self.syncing:
+                    self.condition.wait()
+                    continue
+                self.syncing = True
+                self.condition.release()
+                try:
+                    with self.lock:
+                        target = self.appended
+                        # a closed segment was synced by 'stop'
+                        if not self.segment.closed:
+                            os.fsync(self.segment.fileno())
+                finally:
+                    self.condition.acquire()
+                    self.syncing = False
+                self.durable = max(self.durable, target)
+                self.condition.notify_all()
+
+    def start(self):
+        """Start replaying the log into the store"""
+        self.running = True
+        self.replayer = threading.Thread(target=self._replay, name='wal-replayer')
+        self.replayer.daemon = True
+        self.replayer.start()
+
+    def stop(self):
+        """Replay as much of the log as the store accepts, then stop and close the log"""
+        if not self.running:
+            return
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.replayer.join()
+        with self.lock:
+            self.segment.flush()
+            os.fsync(self.segment.fileno())
+            self.segment.close()
+        if self.reader:
+            self.reader.close()
+
+    def depth(self):
+        """Return the number of durable records which are not written to the store yet"""
+        return self.durable - self.applied
+
+    def submit(self, model_type, args):
+        """Append a record to the log and return its receipt once it is durable.
+
+        arguments:
+        model_type -- the type of the record, as passed to DevFactory.create
+        args -- tuple of arguments, as passed to DevFactory.create
+
+        raises:
+        QueueFull -- if the log is stopped
+        """
+        result = self.submit_many(model_type, [args])[0]
+        if isinstance(result, QueueFull):
+            raise result
+        return result
+
+    def submit_many(self, model_type, records):
+        """Append many records to the log and return their receipts once they are durable.
+
+        Instead of a receipt, a QueueFull error is returned for every record if the log is stopped.
+
+        arguments:
+        model_type -- the type of the records, as passed to DevFactory.create_many
+        records -- list of argument tuples, as passed to DevFactory.create_many
+        """
+        if not records:
+            return []
+        payloads = [json.dumps([model_type, list(args)], separators=(',', ':'), default=_encode) for args in records]
+        try:
+            last = self._append(payloads)
+        except QueueFull as e:
+            return [e] * len(records)
+        self._sync(last)
+        with self.condition:
+            self.condition.notify_all()
+        return [str(seq) for seq in xrange(last - len(records) + 1, last + 1)]
+
+    def status(self, receipt):
+        """Return the status of an appended record or None if the receipt is unknown"""
+        try:
+            seq = int(receipt)
+        except ValueError:
+            return None
+        if seq < 1 or seq > self.durable:
+            return None
+        return {'receipt':receipt, 'status':WRITTEN if seq <= self.applied else QUEUED}
+
+    def _read(self, count):
+        """Read up to 'count' durable records behind the last read one"""
+        records = []
+        while len(records) < count and self.reader_seq <= self.durable:
+            if self.reader is None:
+                bases = [base for base in self._segments() if base <= self.reader_seq]
+                self.reader = open(self._path(_segment_name(bases[-1])), 'rb', 0)
+                self.reader_base = bases[-1]
+                self.reader_next = bases[-1]
+            header = self.reader.read(FRAME.size)
+            if len(header) < FRAME.size:
+                # end of a completely synced segment, continue with the next one
+                self.reader.close()
+                self.reader = None
+                continue
+            length, _ = FRAME.unpack(header)
+            payload = self.reader.read(length)
+            seq = self.reader_next
+            self.reader_next += 1
+            if seq >= self.reader_seq:
+                model_type, args = json.loads(payload)
+                records.append((seq, model_type, tuple(args)))
+                self.reader_seq = seq + 1
+        return records
+
+    def _replay(self):
+        """Write durable records to the store until the log is stopped"""
+        backoff = 0.0
+        while True:
+            with self.condition:
+                while self.running and not self.pending and self.durable < self.reader_seq:
+                    self.condition.wait()
+                if not self.running and (backoff or (not self.pending and self.durable < self.reader_seq)):
+                    return
+            if len(self.pending) < self.batch_size:
+                self.pending.extend(self._read(self.batch_size - len(self.pending)))
+                if not self.pending:
+                    continue
+            chunk = self._chunk()
+            error = self._apply(chunk)
+            if error is None:
+                self._applied(chunk)
+                backoff = 0.0
+                continue
+            if not _transient(error):
+                self.attempts += 1
+                if self.attempts >= MAX_ATTEMPTS:
+                    self.attempts = 0
+                    if len(chunk) > 1:
+                        # find the rejected records by replaying the batch record by record
+                        self.isolate = chunk[-1][0]
+                    else:
+                        self._dead_letter(chunk, error)
+                        self._applied(chunk)
+                    backoff = 0.0
+                    continue
+            backoff = min(MAX_BACKOFF, backoff * 2 or 0.1)
+            with self.condition:
+                if self.running:
+                    self.condition.wait(backoff)
+
+    def _chunk(self):
+        """Return the next pending records to write with one batch,
+        i.e. consecutive records of the same type"""
+        if self.pending[0][0] <= self.isolate:
+            size = 1
+        else:
+            size = min(self.batch_size, self.dev_factory.batch_size)
+        model_type = self.pending[0][1]
+        chunk = []
+        for record in self.pending[:size]:
+            if record[1] != model_type:
+                break
+            chunk.append(record)
+        return chunk
+
+    def _apply(self, records):
+        """Write records of the same type with one batch and return None or the error which prevented it"""
+        seq, model_type, _ = records[0]
+        try:
+            errors = self.dev_factory.create_many(model_type, [args for _, _, args in records])
+        except ValueError as e:
+            # an unknown type won't become known by retrying
+            self._dead_letter(records, e)
+            return None
+        failed = [error for error in errors if error is not None]
+        if failed:
+            logger.warning('replaying record %d of the log failed, retrying: %s', seq, failed[0])
+            return failed[0]
+        return None
+
+    def _applied(self, records):
+        """Remove the first pending records and save the checkpoint behind them"""
+        del self.pending[:len(records)]
+        self.applied = records[-1][0]
+        self.attempts = 0
+        self._checkpoint()
+
+    def _dead_letter(self, records, error):
+        """Append records to the dead-letter segment instead of writing them to the store"""
+        logger.error('moving records %d to %d of the log to %s: %s',
+                     records[0][0], records[-1][0], DEAD_LETTER, error)
+        with open(self._path(DEAD_LETTER), 'ab') as dead:
+            for seq, model_type, args in records:
+                payload = json.dumps([seq, model_type, list(args), str(error)], separators=(',', ':'))
+                dead.write(FRAME.pack(len(payload), zlib.crc32(payload) & 0xffffffff))
+                dead.write(payload)
+            dead.flush()
+            os.fsync(dead.fileno())
+
+    def _checkpoint(self):
+        """Save the number of the last applied record and delete completely applied segments"""
+        path = self._path(CHECKPOINT)
+        with open(path + '.tmp', 'w') as checkpoint:
+            checkpoint.write(str(self.applied))
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+        os.rename(path + '.tmp', path)
+
+        segments = self._segments()
+        for base, next_base in zip(segments, segments[1:]):
+            if next_base <= self.applied + 1 and base < self.reader_base:
+                os.remove(self._path(_segment_name(base)))
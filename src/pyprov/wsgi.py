@@ -0,0 +1,258 @@
+'''
+Production serving of the application.
+
+'application' is a WSGI application for any WSGI server, e.g.
+    WEB_CONCURRENCY=4 gunicorn --threads 8 --worker-class gthread pyprov.wsgi:application
+It is configured by environment variables (see ENVIRONMENT) and creates its
+Controller at the first request, so every worker process gets its own store
+and connections after the fork and workers start fast. The number of workers
+is taken from WEB_CONCURRENCY, which Gunicorn reads as well, to refuse options
+which need a single worker (see check_workers); '--workers' isn't seen by the application.
+
+'serve' runs the application with Gunicorn if it's installed and falls back
+to the threaded development server of Werkzeug otherwise. With 'green', every
+request is handled by a greenlet of gevent instead of a thread, so a process can
+keep thousands of requests in flight while they wait for the database.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import logging
+import multiprocessing
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+HOST = '127.0.0.1'
+PORT = 5000
+THREADS = 8
+KEEPALIVE = 5
+TIMEOUT = 60
+GRACEFUL_TIMEOUT = 30
+CONNECTIONS = 1000
+
+def _bool(value):
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+# keyword arguments of the Controller by environment variable
+ENVIRONMENT = {
+    'PYPROV_STORE':('store', str),
+    'PYPROV_URL':('url', str),
+    'PYPROV_DATABASE':('database', str),
+    'PYPROV_SHARDS':('shards', str),
+    'PYPROV_SHARD_DIRECTORY':('shard_directory', str),
+    'PYPROV_REBALANCE':('rebalance', _bool),
+    'PYPROV_BATCH_SIZE':('batch_size', int),
+    'PYPROV_ASYNC_INGEST':('async_ingest', _bool),
+    'PYPROV_QUEUE_SIZE':('queue_size', int),
+    'PYPROV_WRITERS':('writers', int),
+    'PYPROV_WAL_DIR':('wal_dir', str),
+    'PYPROV_CACHE_SIZE':('cache_size', int),
+    'PYPROV_CACHE_TTL':('cache_ttl', float),
+    'PYPROV_POOL_SIZE':('pool_size', int),
+    'PYPROV_POOL_TIMEOUT':('pool_timeout', float),
+    'PYPROV_COALESCE':('coalesce', _bool),
+    'PYPROV_QUERY_CACHE_SIZE':('query_cache_size', int),
+    'PYPROV_REACHABILITY':('reachability', _bool),
+    'PYPROV_REACHABILITY_FILE':('reachability_file', str),
+    'PYPROV_PROFILE_THRESHOLD':('profile_threshold', float),
+    'PYPROV_PROFILE_RATE':('profile_rate', float),
+    'PYPROV_PROFILE_DIR':('profile_dir', str),
+}
+
+def options_from_environ(environ=None):
+    """Return the keyword arguments of the Controller given by environment variables"""
+    environ = os.environ if environ is None else environ
+    options = {}
+    for variable, (option, parse) in ENVIRONMENT.iteritems():
+        if environ.get(variable):
+            options[option] = parse(environ[variable])
+    return options
+
+def workers_from_environ(environ=None):
+    """Return the number of worker processes Gunicorn starts by default (WEB_CONCURRENCY) or 1"""
+    environ = os.environ if environ is None else environ
+    return int(environ.get('WEB_CONCURRENCY') or 1)
+
+def check_workers(options, workers):
+    """Raise a ValueError if the options need all requests in one process but there are several workers.
+
+    The memory store, the sharded store (its router cache and lock file), the write-ahead log,
+    the ingest queue and the reachability index keep their state within the process, so they
+    only work with a single worker process. The receipts of the ingest queue, for example, are
+    only known to the worker which queued them.
+
+    Several workers may share a Neo4J or SQLite store, the identifiers SQLite assigns are taken
+    within the write transaction. But the locks of the DevFactory and the caches of nodes and
+    lookups belong to one process, so two workers which write the same entity or agent at once
+    may both create it. Use a single worker with threads where these duplicates matter.
+    """
+    if workers <= 1:
+        return
+    store = options.get('store', 'neo4j')
+    if store in ('memory', 'sharded'):
+        raise ValueError('the %s store needs a single worker process, use threads instead' % store)
+    for option in ('async_ingest', 'wal_dir', 'reachability', 'reachability_file'):
+        if options.get(option):
+            raise ValueError('%s needs a single worker process, use threads instead' % option)
+
+class LazyApplication(object):
+    """A WSGI application which creates its Controller at the first request.
+
+    The options are checked against the number of worker processes (see check_workers)
+    before the controller is created.
+
+    parameters:
+    options -- keyword arguments of the Controller or None to read them from the environment
+    workers -- the number of worker processes or None to read it from WEB_CONCURRENCY
+    controller -- the controller of this process (Controller) or None before the first request
+    """
+    def __init__(self, options=None, workers=None):
+        self.options = options
+        self.workers = workers
+        self.controller = None
+        self.app = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Create and prepare the controller, return the Flask application"""
+        with self.lock:
+            if self.app is None:
+                from pyprov.main import Controller
+                options = self.options if self.options is not None else options_from_environ()
+                check_workers(options, self.workers if self.workers is not None else workers_from_environ())
+                controller = Controller(**options)
+                controller.prepare()
+                self.controller = controller
+                self.app = controller.server.app
+        return self.app
+
+    def __call__(self, environ, start_response):
+        app = self.app or self.load()
+        return app(environ, start_response)
+
+    def stop(self):
+        """Stop the controller after all queued provenance is written"""
+        with self.lock:
+            if self.controller is not None:
+                self.controller.stop()
+                self.controller, self.app = None, None
+
+application = LazyApplication()
+
+def create_app(**options):
+    """Return a WSGI application for a Controller with the given keyword arguments (LazyApplication)"""
+    return LazyApplication(options)
+
+def serve(options, host=HOST, port=PORT, workers=1, threads=THREADS, keepalive=KEEPALIVE,
+          timeout=TIMEOUT, graceful_timeout=GRACEFUL_TIMEOUT, green=False, connections=CONNECTIONS):
+    """Serve the application until it's terminated.
+
+    With Gunicorn, all worker processes share the listening socket and every worker
+    handles 'threads' requests at once. Gunicorn reloads the workers gracefully on SIGHUP.
+    Every worker writes its queued provenance before it exits.
+    Without Gunicorn, a single process handles every request in its own thread.
+    
+    With 'green', the workers handle up to 'connections' requests at once in greenlets of gevent
+    (threads are ignored) and the calls of concurrent requests to the store are combined
+    (see pyprov.coalesce) unless the options say otherwise.
+
+    arguments:
+    options -- keyword arguments of the Controller
+
+    keyword arguments:
+    host, port -- the address to listen on
+    workers -- number of worker processes or None for one per CPU core
+    threads -- number of threads per worker process
+    keepalive -- seconds to wait for the next request on a kept-alive connection
+    timeout -- seconds a worker may be silent before it's restarted
+    graceful_timeout -- seconds a worker may take to finish its requests when it's stopped
+    green -- True to handle requests in greenlets of gevent
+    connections -- maximum number of requests handled at once by a worker with 'green'
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    check_workers(options, workers)
+    if green:
+        options = dict(options)
+        options.setdefault('coalesce', True)
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        BaseApplication = None
+
+    if BaseApplication is None:
+        if workers > 1:
+            logger.warning('Gunicorn is not installed, serving with a single process')
+        if green:
+            serve_green(options, host, port, connections)
+            return
+        from werkzeug.serving import run_simple
+        app = LazyApplication(options, 1)
+        try:
+            run_simple(host, port, app, threaded=threads > 1)
+        finally:
+            app.stop()
+        return
+
+    def worker_exit(server, worker):
+        if isinstance(worker.wsgi, LazyApplication):
+            worker.wsgi.stop()
+
+    settings = {'bind':'%s:%d' % (host, port), 'workers':workers, 'threads':threads,
+                'worker_class':'gthread' if threads > 1 else 'sync', 'keepalive':keepalive,
+                'timeout':timeout, 'graceful_timeout':graceful_timeout, 'worker_exit':worker_exit}
+    if green:
+        settings.update({'worker_class':'gevent', 'worker_connections':connections})
+
+    class GunicornApplication(BaseApplication):
+        def load_config(self):
+            for key, value in settings.iteritems():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return LazyApplication(options, workers)
+
+    GunicornApplication().run()
+
+def serve_green(options, host=HOST, port=PORT, connections=CONNECTIONS):
+    """Serve the application with the WSGI server of gevent in a single process until it's terminated.
+
+    The standard library is patched by gevent first, so threads, locks and the
+    sockets of the store cooperate with the greenlets of the requests.
+
+    arguments:
+    options -- keyword arguments of the Controller
+
+    keyword arguments:
+    host, port -- the address to listen on
+    connections -- maximum number of requests handled at once
+    """
+    from gevent import monkey
+    monkey.patch_all()
+    from gevent.pool import Pool
+    from gevent.pywsgi import WSGIServer
+    app = LazyApplication(options, 1)
+    server = WSGIServer((host, port), app, spawn=Pool(connections), log=None)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        app.stop()
@@ -0,0 +1,298 @@
+'''
+Ingest benchmarks for the DevFactory and ProvenanceStore path.
+
+Synthetic processes are posted to /prov/general (or /prov/general/bulk) through the
+Flask application of the Server, using the Flask test client, so only the application
+and the store are measured. The Neo4J store talks to a mock Neo4J REST server
+(see pyprov_test.mock_neo4j) which counts the round trips and can inject latency.
+
+For every workload the benchmark reports the throughput in records per second,
+the 50th and 99th percentile of the request latency, the round trips to the
+database per record and the growth of the resident memory per record.
+
+Usage (with src and test on the PYTHONPATH):
+    python -m pyprov_test.benchmark                          # all workloads against the mock Neo4J
+    python -m pyprov_test.benchmark -w fan_in -n 2000 --latency 0.001
+    python -m pyprov_test.benchmark --store memory --bulk 100
+    python -m pyprov_test.benchmark --clients 50 --coalesce --latency 0.005
+    python -m pyprov_test.benchmark --shards 4 --clients 16 --latency 0.002 --commit-time 0.005
+    python -m pyprov_test.benchmark --save baseline.json
+    python -m pyprov_test.benchmark --baseline baseline.json --threshold 0.2
+
+With a baseline, every result is compared to the baseline result of the same workload
+and the benchmark exits with status 1 if any metric regressed by more than the threshold.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import argparse
+import gc
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pyprov.main import Controller
+from pyprov_test.mock_neo4j import MockNeo4J
+
+RECORDS = 1000
+SEED = 4711
+THRESHOLD = 0.2
+
+# metrics where a higher value is better, all others should be as low as possible
+HIGHER_IS_BETTER = ('throughput',)
+METRICS = ('throughput', 'p50', 'p99', 'round_trips', 'memory')
+
+class Workload(object):
+    """A reproducible stream of general processes.
+
+    Every process uses 'fan_in' entities and generates 'fan_out' new ones. Inputs are
+    taken from the outputs of earlier processes where possible, so the processes form
+    a derivation graph like real pipelines do.
+
+    parameters:
+    name -- the name of the workload
+    fan_in -- number of inputs of every process
+    fan_out -- number of outputs of every process
+    actors -- number of distinct actors the processes are associated with
+    payload -- minimum length of process names and identifiers in characters
+    """
+    def __init__(self, name, fan_in=1, fan_out=1, actors=10, payload=16):
+        self.name = name
+        self.fan_in = fan_in
+        self.fan_out = fan_out
+        self.actors = actors
+        self.payload = payload
+
+    def _pad(self, text):
+        return text + 'x' * (self.payload - len(text)) if len(text) < self.payload else text
+
+    def records(self, count, seed=SEED):
+        """Return 'count' processes as JSON objects for /prov/general"""
+        rand = random.Random(seed)
+        generated = []
+        records = []
+        for number in xrange(count):
+            inputs = []
+            for position in xrange(self.fan_in):
+                if generated and rand.random() < 0.8:
+                    inputs.append(rand.choice(generated))
+                else:
+                    inputs.append({'identifier':self._pad('raw/%d/%d' % (number, position)), 'version':1})
+            outputs = [{'identifier':self._pad('derived/%d/%d' % (number, position)), 'version':1}
+                       for position in xrange(self.fan_out)]
+            generated.extend(outputs)
+            records.append({'process':self._pad('process-%d' % number), 'input':inputs, 'output':outputs,
+                            'actor':self._pad('actor-%d' % rand.randrange(self.actors))})
+        return records
+
+WORKLOADS = [
+    Workload('chain'),
+    Workload('fan_in', fan_in=10),
+    Workload('fan_out', fan_out=10),
+    Workload('actors', fan_in=2, fan_out=2, actors=100000),
+    Workload('payload', fan_in=2, fan_out=2, payload=2048),
+]
+
+def resident_memory():
+    """Return the resident memory of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except IOError:
+        # the peak is the best we can get without /proc, ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def percentile(values, fraction):
+    """Return the value below which the given fraction of the sorted values lies"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+def post_all(client, url, bodies, bulk, latencies):
+    """Post request bodies one after another and add the latency of every request to a list"""
+    for body in bodies:
+        request_started = time.time()
+        response = client.post(url, data=body, content_type='application/json')
+        latencies.append(time.time() - request_started)
+        if response.status_code != 200 or (bulk and json.loads(response.data)['failed']):
+            raise RuntimeError('request failed with status %d: %s' % (response.status_code, response.data[:500]))
+
+def run_workload(workload, records=RECORDS, store='neo4j', latency=0.0, bulk=None, seed=SEED,
+                 clients=1, coalesce=False, shards=0, commit_time=0.0):
+    """Post the processes of a workload and return the measured metrics.
+
+    arguments:
+    workload -- the workload to run (Workload)
+
+    keyword arguments:
+    records -- number of processes to post
+    store -- the kind of provenance store ('neo4j' uses the mock server, 'memory' or 'sqlite')
+    latency -- seconds every request to the mock server is delayed
+    bulk -- number of processes per request to /prov/general/bulk or None to post them one by one
+    seed -- the seed of the random workload
+    clients -- number of clients posting concurrently, each in its own thread
+    coalesce -- True to combine the store calls of concurrent requests (see pyprov.coalesce)
+    shards -- number of stores of the given kind behind a sharded store (see pyprov.shard), 0 for a single store
+    commit_time -- seconds every writing request to the mock server takes, one after another
+    """
+    data = workload.records(records, seed)
+    mocks = [MockNeo4J(latency, commit_time=commit_time) for _ in xrange(max(shards, 1))] if store == 'neo4j' else []
+    directory = tempfile.mkdtemp(prefix='pyprov-benchmark-')
+    controller = None
+    try:
+        for mock in mocks:
+            mock.start()
+        if shards:
+            arguments = {'neo4j':[mock.url for mock in mocks],
+                         'sqlite':[os.path.join(directory, 'shard%d.db' % number) for number in xrange(shards)],
+                         'memory':[''] * shards}[store]
+            controller = Controller(store='sharded', shards=','.join('%s:%s' % (store, argument) for argument in arguments),
+                                    shard_directory=os.path.join(directory, 'directory.db'), coalesce=coalesce)
+        else:
+            controller = Controller(store=store, url=mocks[0].url if mocks else None,
+                                    database=os.path.join(directory, 'pyprov.db'), coalesce=coalesce)
+        controller.prepare()
+        app = controller.server.app
+        for mock in mocks:
+            mock.reset()
+
+        if bulk:
+            bodies = [json.dumps(data[start:start + bulk]) for start in xrange(0, len(data), bulk)]
+            url = '/prov/general/bulk'
+        else:
+            bodies = [json.dumps(record) for record in data]
+            url = '/prov/general'
+
+        gc.collect()
+        memory = resident_memory()
+        latencies = []
+        errors = []
+        def post(bodies):
+            try:
+                post_all(app.test_client(), url, bodies, bulk, latencies)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=post, args=(bodies[number::clients],)) for number in xrange(clients)]
+        started = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.time() - started
+        if errors:
+            raise errors[0]
+        gc.collect()
+        memory = resident_memory() - memory
+
+        latencies.sort()
+        return {'workload':workload.name, 'store':store, 'records':records, 'bulk':bulk, 'latency':latency,
+                'clients':clients, 'coalesce':coalesce, 'shards':shards,
+                'seconds':seconds, 'throughput':records / seconds if seconds else None,
+                'p50':percentile(latencies, 0.5), 'p99':percentile(latencies, 0.99),
+                'round_trips':float(sum(mock.stats()['round_trips'] for mock in mocks)) / records if mocks else None,
+                'memory':float(max(memory, 0)) / records}
+    finally:
+        if controller:
+            controller.stop()
+        for mock in mocks:
+            mock.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+
+def compare(result, baseline, threshold=THRESHOLD):
+    """Return a description of every metric of a result which regressed against the baseline.
+
+    arguments:
+    result -- the metrics of a workload (see run_workload)
+    baseline -- the metrics of the same workload from an earlier run
+
+    keyword arguments:
+    threshold -- the tolerated relative regression, e.g. 0.2 for 20%
+    """
+    regressions = []
+    for metric in METRICS:
+        value, expected = result.get(metric), baseline.get(metric)
+        if value is None or not expected:
+            continue
+        if metric in HIGHER_IS_BETTER:
+            change = (expected - value) / expected
+        else:
+            change = (value - expected) / expected
+        if change > threshold:
+            regressions.append('%s: %s %.4g -> %.4g (%+.0f%%)' % (result['workload'], metric, expected, value,
+                                                                  100 * change if metric not in HIGHER_IS_BETTER
+                                                                  else -100 * change))
+    return regressions
+
+def format_result(result):
+    def number(value, scale=1.0, digits=1):
+        return '%.*f' % (digits, value * scale) if value is not None else '-'
+    return '%-10s %8s rec/s  p50 %8s ms  p99 %8s ms  %6s trips/rec  %8s bytes/rec' % (
+        result['workload'], number(result['throughput']), number(result['p50'], 1000.0, 2),
+        number(result['p99'], 1000.0, 2), number(result['round_trips'], digits=2), number(result['memory'], digits=0))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the ingest of general processes')
+    parser.add_argument('-w', '--workload', action='append', choices=[workload.name for workload in WORKLOADS],
+                        help='workload to run, may be repeated (default: all)')
+    parser.add_argument('-n', '--records', type=int, default=RECORDS, help='processes per workload')
+    parser.add_argument('--store', default='neo4j', choices=('neo4j', 'memory', 'sqlite'))
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds every mock Neo4J request is delayed')
+    parser.add_argument('--bulk', type=int, help='post this many processes per request to /prov/general/bulk')
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--clients', type=int, default=1, help='clients posting concurrently')
+    parser.add_argument('--coalesce', action='store_true', help='combine the store calls of concurrent requests')
+    parser.add_argument('--shards', type=int, default=0, help='spread the records over this many stores of --store')
+    parser.add_argument('--commit-time', type=float, default=0.0,
+                        help='seconds every writing request to the mock Neo4J takes, one after another')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare the results to this JSON file written with --save')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help='tolerated relative regression')
+    args = parser.parse_args(argv)
+
+    workloads = [workload for workload in WORKLOADS if not args.workload or workload.name in args.workload]
+    results = []
+    for workload in workloads:
+        result = run_workload(workload, args.records, args.store, args.latency, args.bulk, args.seed,
+                              args.clients, args.coalesce, args.shards, args.commit_time)
+        print format_result(result)
+        results.append(result)
+
+    if args.save:
+        with open(args.save, 'w') as results_file:
+            json.dump(results, results_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baselines = dict((baseline['workload'], baseline) for baseline in json.load(baseline_file))
+        regressions = []
+        for result in results:
+            if result['workload'] in baselines:
+                regressions.extend(compare(result, baselines[result['workload']], args.threshold))
+        for regression in regressions:
+            print 'REGRESSION', regression
+        if regressions:
+            return 1
+        print 'no regression above %.0f%%' % (100 * args.threshold)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+'''
+Helpers shared by the unit tests: controllers for every kind of store which are
+cleaned up after the test, and synthetic records for the DevFactory.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import logging
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from pyprov.main import Controller
+
+# the stores every test runs against
+STORES = ('memory', 'sqlite')
+
+# errors the tests provoke are logged by the package, but not printed
+logging.getLogger('pyprov').addHandler(logging.NullHandler())
+
+def process(name, inputs, outputs, actor='actor', version=1):
+    """Return the JSON object of a general process with entities of one version"""
+    return {'process':name, 'actor':actor,
+            'input':[{'identifier':identifier, 'version':version} for identifier in inputs],
+            'output':[{'identifier':identifier, 'version':version} for identifier in outputs]}
+
+def chain(count):
+    """Return processes which derive the entity e<i + 1> from e<i>"""
+    return [process('p%d' % i, ['e%d' % i], ['e%d' % (i + 1)], 'actor%d' % (i % 3)) for i in xrange(count)]
+
+def random_graph(count, seed=1):
+    """Return processes which derive e<i + 1> from up to three random earlier entities"""
+    generator = random.Random(seed)
+    return [process('p%d' % i, ['e%d' % generator.randrange(max(i, 1)) for _ in xrange(generator.randint(1, 3))],
+                    ['e%d' % (i + 1)], 'actor%d' % (i % 5)) for i in xrange(count)]
+
+class StoreTestCase(unittest.TestCase):
+    """A test case with a temporary directory and controllers which are stopped after the test"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.controllers = []
+
+    def tearDown(self):
+        for controller in self.controllers:
+            controller.stop()
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def controller(self, store, **options):
+        """Return a prepared controller of a store, a SQLite store keeps its database in the temporary directory"""
+        if store == 'sqlite':
+            options.setdefault('database', self.path('pyprov.db'))
+        controller = Controller(store=store, **options)
+        controller.prepare()
+        self.controllers.append(controller)
+        return controller
+
+    def stop(self, controller):
+        """Stop a controller before the end of the test"""
+        self.controllers.remove(controller)
+        controller.stop()
+
+    def write(self, controller, processes, model_type='general'):
+        """Write JSON objects of records one by one with the DevFactory"""
+        handler = controller.dev_factory.handler(model_type)
+        for record in processes:
+            controller.dev_factory.create(model_type, handler.from_json(record))
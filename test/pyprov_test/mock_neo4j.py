@@ -0,0 +1,561 @@
+'''
+A stand-in for the REST API of a Neo4J 1.9 server.
+
+The mock keeps a small graph in memory and answers the requests of the Neo4J
+store of pyprov (and of other REST clients like py2neo): the service root, nodes,
+relationships, the legacy node index, batches and the few Cypher queries used by
+pyprov.neo4j. It counts every
+HTTP request (round trip) and can delay every request to simulate network latency.
+With a commit time, every writing request takes that long, one after another, so the
+writes of all clients queue up like the commits of a single database server.
+
+Usage:
+    mock = MockNeo4J(latency=0.001)
+    mock.start()
+    controller = Controller(store='neo4j', url=mock.url)
+    ...
+    print mock.stats()['round_trips']
+    mock.stop()
+
+or from the command line (serves until interrupted):
+    python -m pyprov_test.mock_neo4j --port 7474 --latency 0.001
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import argparse
+import collections
+import json
+import multiprocessing
+import re
+import socket
+import threading
+import time
+import urllib
+import urllib2
+import urlparse
+from SocketServer import ThreadingMixIn
+from wsgiref.simple_server import make_server, ServerHandler, WSGIServer, WSGIRequestHandler
+
+SERVICE_PATH = '/db/data/'
+STATS_PATH = '/_mock/stats'
+RESET_PATH = '/_mock/reset'
+NEO4J_VERSION = '1.9.4'
+
+STATUS = {200:'200 OK', 201:'201 Created', 204:'204 No Content', 400:'400 Bad Request',
+          404:'404 Not Found', 405:'405 Method Not Allowed', 500:'500 Internal Server Error'}
+
+# the columns of requested node properties, e.g. ', n.identifier?, n.version?'
+COLUMNS = r'((?:, n\.\w+\?)*)'
+NODE_QUERY = re.compile(r'^START n=node:(\w+)\((\w+)=\{value\}\) RETURN n' + COLUMNS +
+                        r' ORDER BY ID\(n\)( DESC LIMIT 1| LIMIT \{limit\})?$')
+NEIGHBOUR_QUERY = re.compile(r'^START a=node\(\{a\}\) MATCH \(a\)(<?)-\[r:(\w+)\]-(>?)\(n\) RETURN n' + COLUMNS +
+                             r' ORDER BY ID\(r\)( LIMIT \{limit\})?$')
+RELATIONSHIP_QUERY = re.compile(r'^START (?:a=node\(\{a\}\))?(?:, )?(?:b=node\(\{b\}\))? '
+                                r'MATCH \(a\)-\[r(?::(\w+))?\]-(>?)\(b\) RETURN r, a, b ORDER BY ID\(r\) DESC LIMIT 1$')
+ALL_RELATIONSHIPS_QUERY = re.compile(r'^START r=relationship\(\*\) MATCH \(a\)-\[r\]->\(b\)'
+                                     r'( WHERE type\(r\) = \{type\})? RETURN r, a, b ORDER BY ID\(r\) DESC LIMIT 1$')
+NODE_SCAN_QUERY = re.compile(r'^START n=node\(\*\) WHERE ID\(n\) > \{after\} AND '
+                             r'(?:HAS\(n\.prov_type\)|n\.prov_type! = \{prov_type\}) RETURN n ORDER BY ID\(n\) LIMIT \{limit\}$')
+RELATIONSHIP_SCAN_QUERY = re.compile(r'^START r=relationship\(\*\) MATCH \(a\)-\[r\]->\(b\) WHERE ID\(r\) > \{after\}'
+                                     r'( AND type\(r\) = \{type\})? RETURN r, a, b ORDER BY ID\(r\) LIMIT \{limit\}$')
+DELETE_QUERY = re.compile(r'^START n=node\(\{ids\}\) MATCH \(n\)-\[r\?\]-\(\) DELETE r, n$')
+DELETE_RELATIONSHIPS_QUERY = re.compile(r'^START r=relationship\(\{ids\}\) DELETE r$')
+GET_NODES_QUERY = re.compile(r'^START n=node\(\{ids\}\) RETURN n$')
+NODE_RELATIONSHIPS_QUERY = re.compile(r'^START a=node\(\{a\}\) MATCH \(a\)-\[r\]-\(b\) RETURN r, a, b ORDER BY ID\(r\)$')
+
+class MockError(Exception):
+    """An error answered with a status code and a Neo4J-like error body"""
+    def __init__(self, status, message, exception='BadInputException'):
+        super(MockError, self).__init__(message)
+        self.status = status
+        self.exception = exception
+
+def _ident(uri):
+    """Return the number at the end of a node or relationship URI"""
+    try:
+        return int(str(uri).rstrip('/').rsplit('/', 1)[-1])
+    except ValueError:
+        raise MockError(400, 'invalid reference: %s' % uri)
+
+class MockGraph(object):
+    """The graph of the mock server and the REST resources to access it.
+
+    parameters:
+    base -- the URI of the service root
+    nodes -- the properties of every node by identifier
+    relationships -- type, start node, end node and properties of every relationship by identifier
+    indexes -- the node identifiers by key and value of every node index by name
+    round_trips -- number of answered HTTP requests
+    requests -- number of answered HTTP requests by kind, requests within batches are counted separately
+    """
+    def __init__(self, base):
+        self.base = base
+        self.lock = threading.RLock()
+        self.nodes = {0:{}}
+        self.relationships = {}
+        self.indexes = {}
+        self.next_node = 1
+        self.next_relationship = 1
+        self.round_trips = 0
+        self.requests = collections.Counter()
+
+    def node_repr(self, ident):
+        """Return the JSON representation of a node"""
+        if ident not in self.nodes:
+            raise MockError(404, 'node not found: %d' % ident, 'NodeNotFoundException')
+        uri = '%snode/%d' % (self.base, ident)
+        return {'self':uri, 'data':dict(self.nodes[ident]), 'extensions':{},
+                'properties':uri + '/properties', 'property':uri + '/properties/{key}',
+                'create_relationship':uri + '/relationships',
+                'all_relationships':uri + '/relationships/all',
+                'outgoing_relationships':uri + '/relationships/out',
+                'incoming_relationships':uri + '/relationships/in',
+                'traverse':uri + '/traverse/{returnType}'}
+
+    def relationship_repr(self, ident):
+        """Return the JSON representation of a relationship"""
+        if ident not in self.relationships:
+            raise MockError(404, 'relationship not found: %d' % ident, 'RelationshipNotFoundException')
+        rel_type, start, end, properties = self.relationships[ident]
+        uri = '%srelationship/%d' % (self.base, ident)
+        return {'self':uri, 'type':rel_type, 'data':dict(properties), 'extensions':{},
+                'start':'%snode/%d' % (self.base, start), 'end':'%snode/%d' % (self.base, end),
+                'properties':uri + '/properties', 'property':uri + '/properties/{key}'}
+
+    def index_repr(self, name):
+        """Return the JSON representation of a node index"""
+        return {'template':'%sindex/node/%s/{key}/{value}' % (self.base, name),
+                'provider':'lucene', 'type':'exact'}
+
+    def service_root(self):
+        """Return the JSON representation of the service root"""
+        return {'extensions':{}, 'node':self.base + 'node', 'reference_node':self.base + 'node/0',
+                'node_index':self.base + 'index/node', 'relationship_index':self.base + 'index/relationship',
+                'extensions_info':self.base + 'ext', 'relationship_types':self.base + 'relationship/types',
+                'batch':self.base + 'batch', 'cypher':self.base + 'cypher', 'neo4j_version':NEO4J_VERSION}
+
+    def create_node(self, properties):
+        ident = self.next_node
+        self.next_node += 1
+        self.nodes[ident] = dict(properties or {})
+        return ident
+
+    def create_relationship(self, rel_type, start, end, properties):
+        if start not in self.nodes or end not in self.nodes:
+            raise MockError(404, 'node not found', 'NodeNotFoundException')
+        ident = self.next_relationship
+        self.next_relationship += 1
+        self.relationships[ident] = (rel_type, start, end, dict(properties or {}))
+        return ident
+
+    def handle(self, method, uri, body):
+        """Answer a single request.
+
+        arguments:
+        method -- the HTTP method
+        uri -- the absolute URI or the path relative to the service root
+        body -- the decoded JSON body or None
+
+        returns:
+        status code, decoded JSON body and location (or None)
+        """
+        if isinstance(uri, unicode):
+            uri = uri.encode('utf-8')
+        path = urlparse.urlparse(uri).path if '://' in uri else uri.split('?', 1)[0]
+        if (path + '/').startswith(SERVICE_PATH):
+            path = path[len(SERVICE_PATH) - 1:]
+        path = path.strip('/')
+        parts = [urllib.unquote(part) for part in path.split('/')] if path else []
+        kind = parts[0] if parts else 'root'
+        self.requests[kind] += 1
+
+        if not parts:
+            return 200, self.service_root(), None
+        if kind == 'batch' and method == 'POST':
+            return 200, self.batch(body), None
+        if kind == 'cypher' and method == 'POST':
+            return 200, self.cypher(body.get('query', ''), body.get('params') or {}), None
+        if kind == 'node':
+            return self.handle_node(method, parts[1:], body)
+        if kind == 'relationship':
+            return self.handle_relationship(method, parts[1:], body)
+        if kind == 'index' and len(parts) > 1 and parts[1] == 'node':
+            return self.handle_index(method, parts[2:], body)
+        raise MockError(404, 'not supported by the mock: %s %s' % (method, path), 'NotFoundException')
+
+    def handle_node(self, method, parts, body):
+        if not parts and method == 'POST':
+            ident = self.create_node(body)
+            return 201, self.node_repr(ident), self.base + 'node/%d' % ident
+        ident = _ident(parts[0]) if parts else None
+        if ident not in self.nodes:
+            raise MockError(404, 'node not found: %s' % ident, 'NodeNotFoundException')
+        rest = parts[1:]
+        if not rest and method == 'GET':
+            return 200, self.node_repr(ident), None
+        if rest == ['properties'] and method == 'GET':
+            return 200, dict(self.nodes[ident]), None
+        if rest == ['properties'] and method == 'PUT':
+            self.nodes[ident] = dict(body or {})
+            return 204, None, None
+        if len(rest) == 2 and rest[0] == 'properties' and method == 'PUT':
+            self.nodes[ident][rest[1]] = body
+            return 204, None, None
+        if rest == ['relationships'] and method == 'POST':
+            rel = self.create_relationship(body['type'], ident, _ident(body['to']), body.get('data'))
+            return 201, self.relationship_repr(rel), self.base + 'relationship/%d' % rel
+        raise MockError(405, 'not supported by the mock: %s node/%s' % (method, '/'.join(parts)))
+
+    def handle_relationship(self, method, parts, body):
+        if parts == ['types'] and method == 'GET':
+            return 200, sorted(set(rel[0] for rel in self.relationships.itervalues())), None
+        ident = _ident(parts[0]) if parts else None
+        if ident not in self.relationships:
+            raise MockError(404, 'relationship not found: %s' % ident, 'RelationshipNotFoundException')
+        rest = parts[1:]
+        if not rest and method == 'GET':
+            return 200, self.relationship_repr(ident), None
+        if rest == ['properties'] and method == 'PUT':
+            rel_type, start, end, _ = self.relationships[ident]
+            self.relationships[ident] = (rel_type, start, end, dict(body or {}))
+            return 204, None, None
+        raise MockError(405, 'not supported by the mock: %s relationship/%s' % (method, '/'.join(parts)))
+
+    def handle_index(self, method, parts, body):
+        if not parts and method == 'GET':
+            return 200, dict((name, self.index_repr(name)) for name in self.indexes), None
+        if not parts and method == 'POST':
+            self.indexes.setdefault(body['name'], {})
+            return 201, self.index_repr(body['name']), self.base + 'index/node/' + body['name']
+        name = parts[0]
+        if name not in self.indexes:
+            raise MockError(404, 'index not found: ' + name, 'NotFoundException')
+        entries = self.indexes[name]
+        if len(parts) == 1 and method == 'POST':
+            ident = _ident(body['uri'])
+            key = (body['key'], unicode(body['value']))
+            if ident not in entries.get(key, ()):
+                entries.setdefault(key, []).append(ident)
+            result = self.node_repr(ident)
+            result['indexed'] = '%sindex/node/%s/%s/%s/%d' % (self.base, name, body['key'],
+                                                              urllib.quote(unicode(body['value']).encode('utf-8'), ''), ident)
+            return 201, result, result['indexed']
+        if len(parts) == 3 and method == 'GET':
+            key = (parts[1].decode('utf-8'), parts[2].decode('utf-8'))
+            return 200, [self.node_repr(ident) for ident in entries.get(key, ())], None
+        if len(parts) == 4 and method == 'DELETE':
+            key = (parts[1].decode('utf-8'), parts[2].decode('utf-8'))
+            ident = _ident(parts[3])
+            if ident not in entries.get(key, ()):
+                raise MockError(404, 'index entry not found', 'NotFoundException')
+            entries[key] = [node for node in entries[key] if node != ident]
+            if not entries[key]:
+                del entries[key]
+            return 204, None, None
+        raise MockError(405, 'not supported by the mock: %s index/node/%s' % (method, '/'.join(parts)))
+
+    def batch(self, jobs):
+        """Answer all requests of a batch, references '{id}' are replaced by the locations of earlier jobs"""
+        locations = {}
+        def resolve(value):
+            if isinstance(value, basestring):
+                return re.sub(r'\{(\d+)\}', lambda match: locations.get(int(match.group(1)), match.group(0)), value)
+            if isinstance(value, dict):
+                return dict((key, resolve(item)) for key, item in value.iteritems())
+            if isinstance(value, list):
+                return [resolve(item) for item in value]
+            return value
+
+        results = []
+        for job in jobs:
+            uri = resolve(job['to'])
+            status, body, location = self.handle(job['method'], uri, resolve(job.get('body')))
+            job_id = job.get('id', len(results))
+            if location is not None:
+                locations[job_id] = location
+            result = {'id':job_id, 'from':job['to'], 'status':status}
+            if body is not None:
+                result['body'] = body
+            if location is not None:
+                result['location'] = location
+            results.append(result)
+        return results
+
+    def cypher(self, query, params):
+        """Answer one of the Cypher queries sent by pyprov.neo4j"""
+        query = ' '.join(query.split())
+        match = NODE_QUERY.match(query)
+        if match:
+            name, key, columns, latest = match.groups()
+            idents = sorted(self.indexes.get(name, {}).get((key, unicode(params.get('value'))), ()))
+            if latest == ' DESC LIMIT 1':
+                idents = idents[-1:]
+            elif latest:
+                idents = idents[:params['limit']]
+            return self._node_rows(idents, columns)
+        match = NEIGHBOUR_QUERY.match(query)
+        if match:
+            incoming, rel_type, outgoing, columns, limited = match.groups()
+            start = params.get('a')
+            if incoming:
+                idents = [rel[1] for _, rel in sorted(self.relationships.iteritems())
+                          if rel[0] == rel_type and rel[2] == start]
+            else:
+                idents = [rel[2] for _, rel in sorted(self.relationships.iteritems())
+                          if rel[0] == rel_type and rel[1] == start]
+            if limited:
+                idents = idents[:params['limit']]
+            return self._node_rows(idents, columns)
+        match = RELATIONSHIP_QUERY.match(query)
+        if match:
+            rel_type, directed = match.groups()
+            start, end = params.get('a'), params.get('b')
+            def matches(rel):
+                if rel_type and rel[0] != rel_type:
+                    return False
+                if (start is None or rel[1] == start) and (end is None or rel[2] == end):
+                    return True
+                return not directed and (start is None or rel[2] == start) and (end is None or rel[1] == end)
+            return self._relationship_rows([ident for ident, rel in self.relationships.iteritems() if matches(rel)])
+        match = ALL_RELATIONSHIPS_QUERY.match(query)
+        if match:
+            rel_type = params.get('type') if match.group(1) else None
+            return self._relationship_rows([ident for ident, rel in self.relationships.iteritems()
+                                            if rel_type is None or rel[0] == rel_type])
+        match = NODE_SCAN_QUERY.match(query)
+        if match:
+            prov_type = params.get('prov_type')
+            idents = [ident for ident, properties in sorted(self.nodes.iteritems()) if ident > params['after']
+                      and 'prov_type' in properties and (prov_type is None or properties['prov_type'] == prov_type)]
+            return self._node_rows(idents[:params['limit']], '')
+        match = RELATIONSHIP_SCAN_QUERY.match(query)
+        if match:
+            rel_type = params.get('type') if match.group(1) else None
+            idents = [ident for ident, rel in sorted(self.relationships.iteritems())
+                      if ident > params['after'] and (rel_type is None or rel[0] == rel_type)]
+            return self._relationship_rows(idents[:params['limit']], latest=False)
+        if GET_NODES_QUERY.match(query):
+            return self._node_rows(params['ids'], '')
+        if NODE_RELATIONSHIPS_QUERY.match(query):
+            node = params['a']
+            self.node_repr(node)
+            data = []
+            for ident, rel in sorted(self.relationships.iteritems()):
+                # like Neo4J, a relationship of the node with itself is matched in both directions
+                for other in [end for start, end in ((rel[1], rel[2]), (rel[2], rel[1])) if start == node]:
+                    data.append([self.relationship_repr(ident), self.node_repr(node), self.node_repr(other)])
+            return {'columns':['r', 'a', 'b'], 'data':data}
+        if DELETE_QUERY.match(query):
+            self.delete_nodes(params['ids'])
+            return {'columns':[], 'data':[]}
+        if DELETE_RELATIONSHIPS_QUERY.match(query):
+            for ident in params['ids']:
+                self.relationships.pop(ident, None)
+            return {'columns':[], 'data':[]}
+        raise MockError(400, 'query not supported by the mock: ' + query, 'SyntaxException')
+
+    def delete_nodes(self, idents):
+        """Delete nodes with all their relationships, like Neo4J they are removed from every index"""
+        idents = set(idents)
+        for ident, rel in self.relationships.items():
+            if rel[1] in idents or rel[2] in idents:
+                del self.relationships[ident]
+        for ident in idents:
+            self.nodes.pop(ident, None)
+        for entries in self.indexes.itervalues():
+            for key, nodes in entries.items():
+                nodes = [node for node in nodes if node not in idents]
+                if nodes:
+                    entries[key] = nodes
+                else:
+                    del entries[key]
+
+    def _node_rows(self, idents, columns):
+        keys = re.findall(r'n\.(\w+)\?', columns)
+        return {'columns':['n'] + ['n.%s?' % key for key in keys],
+                'data':[[self.node_repr(ident)] + [self.nodes[ident].get(key) for key in keys] for ident in idents]}
+
+    def _relationship_rows(self, idents, latest=True):
+        """Return the rows of relationships and their nodes, only the one with the highest identifier if 'latest'"""
+        if latest:
+            idents = [max(idents)] if idents else []
+        data = []
+        for ident in idents:
+            _, start, end, _ = self.relationships[ident]
+            data.append([self.relationship_repr(ident), self.node_repr(start), self.node_repr(end)])
+        return {'columns':['r', 'a', 'b'], 'data':data}
+
+    def stats(self):
+        """Return the request counters and the size of the graph"""
+        return {'round_trips':self.round_trips, 'requests':dict(self.requests),
+                'nodes':len(self.nodes) - 1, 'relationships':len(self.relationships)}
+
+    def reset(self):
+        """Reset the request counters, the graph is kept"""
+        self.round_trips = 0
+        self.requests.clear()
+
+def _writes(method, path, body):
+    """Return True if a request changes the graph"""
+    if method == 'GET':
+        return False
+    if path.endswith('/batch'):
+        return any(job.get('method', 'GET') != 'GET' for job in body or ())
+    if path.endswith('/cypher'):
+        return ' DELETE ' in (body or {}).get('query', '')
+    return True
+
+def create_app(graph, latency=0.0, commit_time=0.0):
+    """Return a WSGI application serving a graph, every request is delayed by 'latency' seconds
+
+    Writing requests additionally take 'commit_time' seconds one after another,
+    reading requests are answered meanwhile.
+    """
+    commits = threading.Lock()
+    def app(environ, start_response):
+        path = environ.get('PATH_INFO', '/')
+        method = environ['REQUEST_METHOD']
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        raw = environ['wsgi.input'].read(length) if length else ''
+        location = None
+        if path == STATS_PATH:
+            with graph.lock:
+                status, body = 200, graph.stats()
+        elif path == RESET_PATH:
+            with graph.lock:
+                graph.reset()
+            status, body = 204, None
+        elif path == '/':
+            status, body = 200, {'data':graph.base, 'management':graph.base.replace(SERVICE_PATH, '/db/manage/')}
+        else:
+            if latency:
+                time.sleep(latency)
+            try:
+                request_body = json.loads(raw) if raw else None
+                if commit_time and _writes(method, path, request_body):
+                    with commits:
+                        time.sleep(commit_time)
+                with graph.lock:
+                    graph.round_trips += 1
+                    status, body, location = graph.handle(method, path, request_body)
+            except MockError as e:
+                status, body = e.status, {'message':str(e), 'exception':e.exception, 'stacktrace':[]}
+            except (KeyError, TypeError, ValueError) as e:
+                status, body = 400, {'message':repr(e), 'exception':'BadInputException', 'stacktrace':[]}
+        headers = [('Content-Type', 'application/json; charset=UTF-8')]
+        if location:
+            headers.append(('Location', location.encode('utf-8')))
+        start_response(STATUS.get(status, str(status)), headers)
+        return [json.dumps(body)] if body is not None else []
+    return app
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+class KeepAliveHandler(WSGIRequestHandler):
+    """Answer requests over one connection until the client closes it (HTTP/1.1 keep-alive), without logging"""
+    protocol_version = 'HTTP/1.1'
+
+    # headers and body are written separately, don't let the body wait for the acknowledgement of the headers
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        while True:
+            self.raw_requestline = self.rfile.readline(65537)
+            if not self.raw_requestline or not self.parse_request():
+                return
+            handler = ServerHandler(self.rfile, self.wfile, self.get_stderr(), self.get_environ())
+            handler.http_version = '1.1'
+            handler.request_handler = self
+            handler.run(self.server.get_app())
+            if self.close_connection:
+                return
+
+    def log_message(self, *args):
+        pass
+
+def serve(host, port, latency, ports=None, commit_time=0.0):
+    """Serve a new graph until the process is stopped, the bound port is put into 'ports' if given"""
+    httpd = make_server(host, port, None, ThreadingWSGIServer, KeepAliveHandler)
+    base = 'http://%s:%d%s' % (host, httpd.server_port, SERVICE_PATH)
+    httpd.set_app(create_app(MockGraph(base), latency, commit_time))
+    if ports is not None:
+        ports.put(httpd.server_port)
+    httpd.serve_forever()
+
+class MockNeo4J(object):
+    """A mock Neo4J server running in its own process.
+
+    The graph lives in the other process, so it doesn't count to the memory of the benchmarked client.
+
+    keyword arguments:
+    latency -- seconds every request is delayed
+    host -- the address to listen on
+    port -- the port to listen on, 0 for any free port
+    commit_time -- seconds every writing request takes, one after another
+    """
+    def __init__(self, latency=0.0, host='127.0.0.1', port=0, commit_time=0.0):
+        self.latency = latency
+        self.commit_time = commit_time
+        self.host = host
+        self.port = port
+        self.process = None
+
+    @property
+    def url(self):
+        """The URL of the service root, as expected by the Neo4J store"""
+        return 'http://%s:%d%s' % (self.host, self.port, SERVICE_PATH)
+
+    def start(self):
+        ports = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=serve, args=(self.host, self.port, self.latency, ports,
+                                                                   self.commit_time))
+        self.process.daemon = True
+        self.process.start()
+        self.port = ports.get(timeout=10)
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.process = None
+
+    def stats(self):
+        """Return the request counters of the server (see MockGraph.stats)"""
+        return json.loads(urllib2.urlopen('http://%s:%d%s' % (self.host, self.port, STATS_PATH)).read())
+
+    def reset(self):
+        """Reset the request counters of the server"""
+        urllib2.urlopen(urllib2.Request('http://%s:%d%s' % (self.host, self.port, RESET_PATH), data=''))
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a mock Neo4J REST API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7474)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds every request is delayed')
+    parser.add_argument('--commit-time', type=float, default=0.0, help='seconds every writing request takes, one after another')
+    args = parser.parse_args()
+    print 'serving a mock Neo4J at http://%s:%d%s' % (args.host, args.port, SERVICE_PATH)
+    serve(args.host, args.port, args.latency, commit_time=args.commit_time)
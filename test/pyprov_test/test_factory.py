@@ -0,0 +1,117 @@
+'''
+Tests of the DevFactory: every actor and entity is stored once, by concurrent
+writers and within one batch, and a failing batch doesn't stop the others.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import json
+import threading
+import unittest
+from pyprov_test.fixtures import STORES, StoreTestCase, process
+
+THREADS = 8
+RECORDS = 20
+
+class StoreDown(Exception):
+    pass
+
+class DevFactoryTest(StoreTestCase):
+
+    def count(self, controller, key, value):
+        return sum(1 for _ in controller.graph_db.iter_nodes(key, value))
+
+    def test_concurrent_writers_share_entities(self):
+        for store in STORES:
+            controller = self.controller(store, database=self.path('%s.db' % store))
+            def work(thread):
+                self.write(controller, [process('p%d-%d' % (thread, i), ['shared%d' % i], ['out%d-%d' % (thread, i)], 'actor')
+                                        for i in xrange(RECORDS)])
+            threads = [threading.Thread(target=work, args=(thread,)) for thread in xrange(THREADS)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual([self.count(controller, 'identifier', 'shared%d' % i) for i in xrange(RECORDS)], [1] * RECORDS)
+            self.assertEqual(self.count(controller, 'identifier', 'actor'), 1)
+            self.assertEqual(sum(1 for _ in controller.graph_db.iter_all_nodes('ACTIVITY')), THREADS * RECORDS)
+
+    def test_batch_shares_entities(self):
+        for store in STORES:
+            controller = self.controller(store, database=self.path('%s.db' % store))
+            records = [(process('p%d' % i, ['shared', 'e%d' % i], ['e%d' % (i + 1)], 'actor'),) for i in xrange(5)]
+            self.assertEqual(controller.dev_factory.create_many('general', records), [None] * 5)
+            # written again, the stored nodes are reused
+            self.assertEqual(controller.dev_factory.create_many('general', records[:1]), [None])
+            self.assertEqual(self.count(controller, 'identifier', 'shared'), 1)
+            self.assertEqual(self.count(controller, 'identifier', 'actor'), 1)
+            self.assertEqual([self.count(controller, 'identifier', 'e%d' % i) for i in xrange(6)], [1] * 6)
+            # other versions are other entities
+            self.write(controller, [process('p5', ['e5'], ['shared'], version=2)])
+            self.assertEqual(self.count(controller, 'identifier', 'shared'), 2)
+
+    def test_text_versions(self):
+        for store in STORES:
+            controller = self.controller(store, database=self.path('%s.db' % store))
+            records = [process('p%d' % i, ['in'], ['out%d' % i], version=u'\xe9') for i in xrange(2)]
+            self.write(controller, records)
+            self.assertEqual(self.count(controller, 'identifier', 'in'), 1)
+            node = next(controller.graph_db.iter_nodes('identifier', 'in'))[0]
+            self.assertEqual(node.properties['version'], u'\xe9')
+            response = controller.server.app.test_client().get('/prov/lineage/in/downstream?version=%C3%A9')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(sorted(json.loads(line)['identifier'] for line in response.data.splitlines()), ['out0', 'out1'])
+
+    def test_failing_chunk_doesnt_stop_the_others(self):
+        for store in STORES:
+            controller = self.controller(store, database=self.path('%s.db' % store), batch_size=2)
+            graph_db = controller.graph_db
+            submit_batch, calls = graph_db.submit_batch, []
+            def failing(batch):
+                calls.append(batch)
+                if len(calls) == 2:
+                    raise StoreDown('store down')
+                return submit_batch(batch)
+            graph_db.submit_batch = failing
+            records = [(process('p%d' % i, ['e%d' % i], ['e%d' % (i + 1)]),) for i in xrange(6)]
+            results = controller.dev_factory.create_many('general', records)
+            self.assertEqual([result is None for result in results], [True, True, False, False, True, True])
+            self.assertTrue(all(isinstance(result, StoreDown) for result in results[2:4]))
+            self.assertEqual([self.count(controller, 'name', 'p%d' % i) for i in xrange(6)], [1, 1, 0, 0, 1, 1])
+            # e3 is only referred to by the failed chunk, e4 is the input of p4 as well
+            self.assertEqual([self.count(controller, 'identifier', 'e%d' % i) for i in xrange(7)], [1, 1, 1, 0, 1, 1, 1])
+
+            # written again, the failed records don't duplicate what's stored
+            graph_db.submit_batch = submit_batch
+            self.assertEqual(controller.dev_factory.create_many('general', records[2:4]), [None, None])
+            self.assertEqual([self.count(controller, 'identifier', 'e%d' % i) for i in xrange(7)], [1] * 7)
+            self.assertRaises(ValueError, controller.dev_factory.create_many, 'unknown', records)
+
+    def test_bulk_reports_every_record(self):
+        for store in STORES:
+            controller = self.controller(store, database=self.path('%s.db' % store))
+            client = controller.server.app.test_client()
+            records = [process('p0', ['e0'], ['e1']), {'process':'p1'}, process('p2', ['e1'], ['e2'])]
+            response = client.post('/prov/general/bulk', data=json.dumps(records), content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            result = json.loads(response.data)
+            self.assertEqual((result['created'], result['failed']), (2, 1))
+            self.assertEqual([status['status'] for status in result['records']], ['created', 'invalid', 'created'])
+            self.assertEqual(self.count(controller, 'identifier', 'e1'), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+'''
+Tests of the in-memory store while it's read and written by several threads at once.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import sys
+import threading
+import unittest
+from pyprov.memory import MemoryStore
+
+TYPES = 3000
+READERS = 4
+
+class MemoryStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        # switch threads as often as possible, so readers see the store between the steps of a write
+        self.check_interval = sys.getcheckinterval()
+        sys.setcheckinterval(1)
+
+    def tearDown(self):
+        sys.setcheckinterval(self.check_interval)
+
+    def test_new_types_while_reading(self):
+        store = MemoryStore(None)
+        start = store.create_node('ENTITY', 'FILE', identifier='start')
+        end = store.create_node('ENTITY', 'FILE', identifier='end')
+        done = threading.Event()
+        errors = []
+
+        def read():
+            try:
+                while not done.is_set():
+                    store.relationships(start)
+                    store.find_relationship(start_node=start)
+                    store.find_relationship(end_node=end, bidirectional=True)
+            except Exception as e:
+                errors.append(e)
+
+        readers = [threading.Thread(target=read) for _ in xrange(READERS)]
+        for reader in readers:
+            reader.start()
+        try:
+            for i in xrange(TYPES):
+                store.create_relationship('TYPE_%d' % i, start, end)
+        finally:
+            done.set()
+            for reader in readers:
+                reader.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(store.relationships(end)), TYPES)
+        self.assertEqual(store.find_relationship(start_node=start).type, 'TYPE_%d' % (TYPES - 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+'''
+Tests of the reachability index against the lineage read from the store,
+maintained while writing, rebuilt from the store and restored from its file.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import os
+import unittest
+from array import array
+from pyprov.lineage import Lineage, UPSTREAM, DOWNSTREAM
+from pyprov.reachability import ANCESTORS, DESCENDANTS, ReachabilityIndex, _union
+from pyprov_test.fixtures import STORES, StoreTestCase, process, random_graph
+
+ENTITIES = 200
+
+def _keys(entities):
+    return set((identifier, str(version)) for identifier, version in entities)
+
+class ReachabilityIndexTest(StoreTestCase):
+
+    def indexed(self, store):
+        return self.controller(store, reachability=True, reachability_file=self.path('%s.idx' % store),
+                               database=self.path('%s.db' % store))
+
+    def assertMatchesLineage(self, index, store):
+        lineage = Lineage(store)
+        for number in xrange(0, ENTITIES + 1, 7):
+            identifier = 'e%d' % number
+            upstream = _keys((entity['identifier'], entity['version']) for entity in lineage.traverse(identifier, UPSTREAM))
+            downstream = _keys((entity['identifier'], entity['version']) for entity in lineage.traverse(identifier, DOWNSTREAM))
+            self.assertEqual(_keys(index.related(identifier, ANCESTORS)), upstream, identifier)
+            self.assertEqual(_keys(index.related(identifier, DESCENDANTS)), downstream, identifier)
+
+    def test_index_matches_lineage(self):
+        for store in STORES:
+            controller = self.indexed(store)
+            self.write(controller, random_graph(ENTITIES))
+            self.assertMatchesLineage(controller.reachability, controller.graph_db)
+            rebuilt = ReachabilityIndex()
+            rebuilt.rebuild(controller.graph_db, page_size=13)
+            self.assertMatchesLineage(rebuilt, controller.graph_db)
+
+            # derivations aren't part of the lineage of processes, but of the reachability
+            self.write(controller, [{'generated_entity':{'identifier':'copy', 'version':1},
+                                     'used_entity':{'identifier':'e%d' % ENTITIES, 'version':1}}], 'wasDerivedFrom')
+            rebuilt.rebuild(controller.graph_db, page_size=13)
+            self.assertTrue(controller.reachability.reachable('e0', 'copy'))
+            self.assertFalse(controller.reachability.reachable('copy', 'e0'))
+            self.assertTrue(rebuilt.reachable('e0', 'copy', 1, 1))
+            self.assertFalse(rebuilt.reachable('e0', 'copy', 2))
+            self.assertFalse(rebuilt.reachable('e0', 'unknown'))
+
+    def test_restore(self):
+        for store in STORES:
+            controller = self.indexed(store)
+            self.write(controller, random_graph(ENTITIES))
+            entities = len(controller.reachability.entities)
+            expected = _keys(controller.reachability.related('e%d' % ENTITIES, ANCESTORS))
+            self.stop(controller)
+
+            # the index is loaded from the file written when the controller stopped
+            controller = self.indexed(store)
+            self.assertEqual(len(controller.reachability.entities), entities)
+            if store == 'sqlite':
+                self.assertEqual(_keys(controller.reachability.related('e%d' % ENTITIES, ANCESTORS)), expected)
+            self.stop(controller)
+
+            # after a crash, the index which was loaded at start is rebuilt with what was written since
+            controller = self.indexed(store)
+            self.assertFalse(os.path.exists(self.path('%s.idx' % store)))
+            self.write(controller, [process('late', ['e%d' % ENTITIES], ['late'])])
+            crashed = self.indexed(store)
+            if store == 'sqlite':
+                self.assertTrue(crashed.reachability.reachable('e0', 'late'))
+                self.assertMatchesLineage(crashed.reachability, crashed.graph_db)
+            self.stop(crashed)
+            self.stop(controller)
+
+            # a damaged file is rebuilt from the store
+            with open(self.path('%s.idx' % store), 'wb') as damaged:
+                damaged.write('garbage')
+            controller = self.indexed(store)
+            if store == 'sqlite':
+                self.assertEqual(len(controller.reachability.entities), entities + 1)
+                self.assertMatchesLineage(controller.reachability, controller.graph_db)
+            else:
+                self.assertEqual(len(controller.reachability.entities), 0)
+
+    def test_union(self):
+        self.assertEqual(list(_union(array('l', [1, 3, 5, 7]), array('l', [3, 5, 8, 9]))), [1, 7, 8, 9])
+        self.assertEqual(list(_union(array('l', [1, 2]), array('l', [0, 10]))), [0, 10])
+        first = array('l', [1, 2])
+        self.assertIs(_union(first, array('l')), first)
+        self.assertEqual(list(first), [1, 2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+'''
+Tests of the sharded store: nodes are kept by the shard which owns them, adding a
+shard and rebalancing keeps the graph, and a batch failing on one shard or the
+edge directory is rolled back on all of them.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import unittest
+from pyprov.lineage import Lineage, UPSTREAM
+from pyprov_test.fixtures import STORES, StoreTestCase, chain, process
+
+SHARDS = 3
+RECORDS = 60
+ACTORS = 24
+
+class StoreDown(Exception):
+    pass
+
+class ShardedStoreTest(StoreTestCase):
+
+    def sharded(self, store, count=SHARDS, **options):
+        if store == 'sqlite':
+            shards = ','.join('sqlite:%s' % self.path('shard%d.db' % shard) for shard in xrange(count))
+            options.setdefault('shard_directory', self.path('directory.db'))
+        else:
+            shards = ','.join([store] * count)
+        return self.controller('sharded', shards=shards, **options)
+
+    def graph(self, graph_db):
+        """Return the names of all nodes and the names of the ends of all relationships"""
+        name = lambda node: node.properties.get('name') or node.properties.get('identifier')
+        nodes = sorted(name(node) for node in graph_db.iter_all_nodes())
+        relationships = sorted((relationship.type, name(relationship.start_node), name(relationship.end_node))
+                               for relationship in graph_db.iter_all_relationships())
+        return nodes, relationships
+
+    def assertOwned(self, graph_db):
+        for shard, store in enumerate(graph_db.shards):
+            for node in store.iter_all_nodes():
+                self.assertEqual(graph_db.owner(graph_db._global_node(shard, node)), shard)
+
+    def test_routing(self):
+        for store in STORES:
+            controller = self.sharded(store)
+            graph_db = controller.graph_db
+            # activities and entities follow their actors, so every record has its own
+            self.write(controller, [process('p%d' % i, ['e%d' % i], ['e%d' % (i + 1)], 'actor%d' % i) for i in xrange(RECORDS)])
+            self.assertOwned(graph_db)
+            counts = [sum(1 for _ in shard.iter_all_nodes()) for shard in graph_db.shards]
+            self.assertEqual(sum(counts), 3 * RECORDS + 1)
+            self.assertTrue(all(counts), counts)
+            nodes = list(graph_db.iter_all_nodes())
+            self.assertEqual(len(set(node.id for node in nodes)), len(nodes))
+            self.assertEqual(sum(1 for _ in graph_db.iter_all_relationships()), 3 * RECORDS)
+            self.assertEqual(len(list(Lineage(graph_db).traverse('e%d' % RECORDS, UPSTREAM))), RECORDS)
+            self.stop(controller)
+
+    def test_rebalance(self):
+        for store in STORES:
+            controller = self.sharded(store, 2)
+            self.write(controller, chain(RECORDS))
+            graph_db = controller.graph_db
+            before = self.graph(graph_db)
+            old = dict((node.properties.get('name') or node.properties.get('identifier'), node.id)
+                       for node in graph_db.iter_all_nodes())
+            graph_db.add_shard('%s#new' % store, controller.create_shard(store, self.path('new.db')))
+            self.assertGreater(graph_db.rebalance(batch_size=7), 0)
+            self.assertEqual(graph_db.rebalance(), 0)
+            self.assertOwned(graph_db)
+            self.assertEqual(self.graph(graph_db), before)
+            self.assertTrue(sum(1 for _ in graph_db.shards[-1].iter_all_nodes()))
+            # the old identifiers are forwarded to the moved nodes
+            nodes = graph_db.get_nodes(old.values())
+            self.assertEqual(sorted(node.properties.get('name') or node.properties.get('identifier') for node in nodes),
+                             sorted(old))
+            self.assertEqual(len(list(Lineage(graph_db).traverse('e%d' % RECORDS, UPSTREAM))), RECORDS)
+            self.stop(controller)
+
+    def break_store(self, store):
+        """Let every batch written to a store raise StoreDown, return the function to repair it"""
+        submit_batch = store.submit_batch
+        def failing(batch):
+            raise StoreDown('store down')
+        store.submit_batch = failing
+        def repair():
+            store.submit_batch = submit_batch
+        return repair
+
+    def assertWritten(self, graph_db, record, written):
+        self.assertEqual(bool(list(graph_db.iter_nodes('name', record['process']))), written)
+        for entity in record['output']:
+            self.assertEqual(bool(list(graph_db.iter_nodes('identifier', entity['identifier']))), written)
+
+    def test_failing_shard_is_rolled_back(self):
+        for store in STORES:
+            controller = self.sharded(store)
+            graph_db = controller.graph_db
+            self.write(controller, [process('p%d' % i, ['shared'], ['out%d' % i], 'actor%d' % i) for i in xrange(ACTORS)])
+            before = self.graph(graph_db)
+            # the processes are written to the shards of their actors, which are spread over all shards
+            actor = graph_db.find_node('identifier', 'actor0')
+            repair = self.break_store(graph_db.shards[graph_db._shard(actor)])
+            records = [process('q%d' % i, ['shared'], ['other%d' % i], 'actor%d' % i) for i in xrange(ACTORS)]
+            results = [controller.dev_factory.create_many('general', [(record,)])[0] for record in records]
+            repair()
+            failed = [error is not None for error in results]
+            self.assertTrue(any(failed) and not all(failed), failed)
+            for record, error in zip(records, results):
+                self.assertWritten(graph_db, record, error is None)
+            # nothing of the failed records is left on the other shards
+            nodes, relationships = self.graph(graph_db)
+            written = [record for record, error in zip(records, results) if error is None]
+            self.assertEqual(len(nodes), len(before[0]) + 2 * len(written))
+            self.assertEqual(len(relationships), len(before[1]) + 3 * len(written))
+            self.stop(controller)
+
+    def test_failing_directory_is_rolled_back(self):
+        for store in STORES:
+            controller = self.sharded(store)
+            graph_db = controller.graph_db
+            self.write(controller, [process('p%d' % i, ['shared'], ['out%d' % i], 'actor%d' % i) for i in xrange(ACTORS)])
+            before = self.graph(graph_db)
+            repair = self.break_store(graph_db.directory.store)
+            records = [process('q%d' % i, ['shared'], ['other%d' % i], 'actor%d' % i) for i in xrange(ACTORS)]
+            results = [controller.dev_factory.create_many('general', [(record,)])[0] for record in records]
+            repair()
+            # only the processes on other shards than the shared entity need the directory
+            self.assertTrue(any(isinstance(error, StoreDown) for error in results), results)
+            for record, error in zip(records, results):
+                self.assertWritten(graph_db, record, error is None)
+            nodes, relationships = self.graph(graph_db)
+            written = sum(1 for error in results if error is None)
+            self.assertEqual(len(nodes), len(before[0]) + 2 * written)
+            self.assertEqual(len(relationships), len(before[1]) + 3 * written)
+            self.stop(controller)
+
+if __name__ == '__main__':
+    unittest.main()
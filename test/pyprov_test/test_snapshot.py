@@ -0,0 +1,111 @@
+'''
+Tests of the snapshots in compressed sparse rows: written from every store, their
+lineage equals the one read from the store, versions keep their type and the
+format is checked when a snapshot is opened. Skipped without NumPy.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import json
+import os
+import unittest
+from pyprov.lineage import Lineage, UPSTREAM, DOWNSTREAM
+from pyprov_test.fixtures import STORES, StoreTestCase, process, random_graph
+try:
+    from pyprov.snapshot import MANIFEST, Snapshot, write_snapshot
+except ImportError:
+    Snapshot = None
+
+ENTITIES = 150
+STEPS = [('WAS_GENERATED_BY', False), ('USED', False)]
+
+def _entities(records):
+    return sorted((record['identifier'], record['version'], record['depth']) for record in records)
+
+@unittest.skipIf(Snapshot is None, 'snapshots need NumPy')
+class SnapshotTest(StoreTestCase):
+
+    def snapshot(self, store):
+        controller = self.controller(store, database=self.path('%s.db' % store))
+        self.write(controller, random_graph(ENTITIES))
+        # entities with text versions and a second version of an entity
+        self.write(controller, [process('text', ['e1'], ['doc'], version='v1'), process('again', ['e2'], ['e3'], version=2)])
+        path = self.path('%s.snapshot' % store)
+        self.assertEqual(write_snapshot(controller.graph_db, path, page_size=17),
+                         (sum(1 for _ in controller.graph_db.iter_all_nodes()),
+                          sum(1 for _ in controller.graph_db.iter_all_relationships())))
+        return controller, Snapshot(path)
+
+    def test_lineage_equals_store(self):
+        for store in STORES:
+            controller, snapshot = self.snapshot(store)
+            lineage = Lineage(controller.graph_db)
+            for identifier in ('e1', 'e3', 'e50', 'e%d' % ENTITIES, 'doc'):
+                for direction in (UPSTREAM, DOWNSTREAM):
+                    records = list(snapshot.lineage(identifier, direction))
+                    self.assertEqual(_entities(records), _entities(lineage.traverse(identifier, direction)),
+                                     (identifier, direction))
+                    # of several entities as near, any may be the one an entity was reached from
+                    depths = dict(((record['identifier'], record['version']), record['depth']) for record in records)
+                    for record in records:
+                        source = record['from']['identifier'], record['from']['version']
+                        self.assertEqual(depths.get(source, 0 if source[0] == identifier else None), record['depth'] - 1)
+                    self.assertEqual(_entities(snapshot.lineage(identifier, direction, max_depth=2)),
+                                     _entities(lineage.traverse(identifier, direction, max_depth=2)))
+                self.assertEqual(_entities(snapshot.lineage(identifier, UPSTREAM, 1)),
+                                 _entities(lineage.traverse(identifier, UPSTREAM, 1)))
+
+    def test_nodes(self):
+        for store in STORES:
+            controller, snapshot = self.snapshot(store)
+            self.assertEqual(len(snapshot.find('e3')), 2)
+            self.assertEqual(len(snapshot.find('e3', 2)), 1)
+            self.assertEqual(len(snapshot.find('e3', '2')), 1)
+            self.assertEqual(len(snapshot.find('unknown')), 0)
+            number = snapshot.find('doc')[0]
+            self.assertEqual(snapshot.version(number), 'v1')
+            self.assertEqual(snapshot.version(snapshot.find('e3', 2)[0]), 2)
+            node = snapshot.node(number)
+            stored = controller.graph_db.get_nodes([node.id])[0]
+            self.assertEqual((node.prov_type, node.type), (stored.prov_type, stored.type))
+            self.assertEqual(node.properties['identifier'], 'doc')
+            self.assertEqual(snapshot.number(node.id), number)
+            self.assertIsNone(snapshot.number(-1))
+            activity = snapshot.node(snapshot.find('p0')[0])
+            self.assertEqual(activity.properties['name'], 'p0')
+            self.assertIsNone(snapshot.version(snapshot.find('p0')[0]))
+
+    def test_reachable(self):
+        for store in STORES:
+            _, snapshot = self.snapshot(store)
+            last, first = snapshot.find('e%d' % ENTITIES), snapshot.find('e0')
+            self.assertTrue(snapshot.reachable(last, first, STEPS))
+            self.assertFalse(snapshot.reachable(first, last, STEPS))
+            self.assertFalse(snapshot.reachable(last, first, STEPS, max_depth=1))
+
+    def test_format(self):
+        _, snapshot = self.snapshot('memory')
+        path = self.path('memory.snapshot')
+        with open(os.path.join(path, MANIFEST)) as manifest_file:
+            manifest = json.load(manifest_file)
+        manifest['format'] = 0
+        with open(os.path.join(path, MANIFEST), 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+        self.assertRaises(ValueError, Snapshot, path)
+
+if __name__ == '__main__':
+    unittest.main()
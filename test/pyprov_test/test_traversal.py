@@ -0,0 +1,93 @@
+'''
+Tests of the traversal language: steps, parameters, the cache of compiled plans
+and the errors of invalid queries.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import json
+import unittest
+from pyprov.traversal import QueryEngine, QueryError, normalize
+from pyprov_test.fixtures import STORES, StoreTestCase, chain
+
+RECORDS = 10
+
+class QueryEngineTest(StoreTestCase):
+
+    def engines(self):
+        """Yield a query engine of every store with a chain of processes"""
+        for store in STORES:
+            controller = self.controller(store, database=self.path('%s.db' % store))
+            self.write(controller, chain(RECORDS))
+            yield QueryEngine(controller.graph_db)
+
+    def test_steps(self):
+        for engine in self.engines():
+            run = lambda text, **params: list(engine.query(text, params))
+            self.assertEqual(run("g.V('identifier', $id).out('wasGeneratedBy').out('used').values('identifier', 'version')",
+                                 id='e5'), [{'identifier':'e4', 'version':1}])
+            self.assertEqual(run("g.V('identifier', 'e5').out('WAS_GENERATED_BY').values('name')"), [{'name':'p4'}])
+            self.assertEqual(sorted(record['identifier'] for record in
+                                    run("g.V('name', 'p4').both('used', 'wasGeneratedBy').values('identifier')")),
+                             ['e4', 'e5'])
+            self.assertEqual(run("g.V('identifier', 'actor1').in('WAS_ASSOCIATED_WITH').count()"), [{'count':3}])
+            self.assertEqual(run("g.V().has('prov_type', 'ENTITY').count()"), [{'count':RECORDS + 1}])
+            self.assertEqual(run("g.V().has('prov_type', 'ACTIVITY').hasNot('name').count()"), [{'count':0}])
+            self.assertEqual(run("g.V('identifier', 'e0').in('used').out('WAS_ASSOCIATED_WITH').in('WAS_ASSOCIATED_WITH')"
+                                 ".dedup().count()"), [{'count':4}])
+            self.assertEqual(len(run("g.V().has('prov_type', 'ENTITY').limit(3).values('identifier')")), 3)
+            self.assertEqual(run("g.V('identifier', 'unknown').out('used')"), [])
+            node = run("g.V('name', 'p0')")[0]
+            self.assertEqual((node['prov_type'], node['type'], node['properties']['name']), ('ACTIVITY', 'PROCESS', 'p0'))
+
+    def test_limit(self):
+        for engine in self.engines():
+            self.assertEqual(len(list(engine.query("g.V().has('prov_type', 'ENTITY')", limit=4))), 4)
+            self.assertEqual(len(list(engine.query("g.V().has('prov_type', 'ENTITY').limit($n)", {'n':2}))), 2)
+
+    def test_plans_are_cached(self):
+        for engine in self.engines():
+            first, literals = engine.compile("g.V('identifier', 'e1').out('used')")
+            second, other = engine.compile('g.V( "identifier" , "e2" ).out("used")')
+            self.assertIs(first, second)
+            self.assertNotEqual(literals, other)
+            self.assertIs(engine.compile("g.V('identifier', 'e1').out('used')")[0], first)
+            self.assertEqual(normalize("g.V('identifier', 'e1')")[0], normalize('g.V("identifier",\'e3\')')[0])
+
+    def test_errors(self):
+        for engine in self.engines():
+            for text, params in (('g.V().foo()', None), ("g.V('identifier')", None), ("g.V().V()", None),
+                                 ("g.V().count().limit(1)", None), ("g.V('identifier', $id)", None),
+                                 ("g.V().limit(-1)", None), ("g.V().limit($n)", {'n':'many'}), ("g.V(", None),
+                                 ("out('used')", None), ('g', None), ('', None)):
+                self.assertRaises(QueryError, lambda: list(engine.query(text, params)))
+
+    def test_view(self):
+        controller = self.controller('memory')
+        self.write(controller, chain(RECORDS))
+        client = controller.server.app.test_client()
+        response = client.post('/gremlin/query', content_type='application/json',
+                               data=json.dumps({'query':"g.V('identifier', $id).out('wasGeneratedBy').values('name')",
+                                                'params':{'id':'e3'}}))
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertIn('p2', response.data)
+        for query in ('g.V().foo()', 'g'):
+            response = client.post('/gremlin/query', content_type='application/json', data=json.dumps({'query':query}))
+            self.assertEqual(response.status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
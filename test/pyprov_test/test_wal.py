@@ -0,0 +1,179 @@
+'''
+Tests of the write-ahead log: recovery after a restart, outages of the store,
+records the store rejects and appending to a stopped log.
+
+Created on 18.10.2026
+
+   Copyright [2013] [Clemens.Teichmann@dlr.de]
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+'''
+import os
+import shutil
+import socket
+import sqlite3
+import time
+import unittest
+import pyprov.wal
+from pyprov.ingest import QueueFull
+from pyprov.wal import DEAD_LETTER, SEGMENT_SUFFIX, read_frames
+from pyprov_test.fixtures import STORES, StoreTestCase, chain, process
+
+# seconds to wait for the log to replay
+TIMEOUT = 10.0
+
+class WriteAheadLogTest(StoreTestCase):
+
+    def setUp(self):
+        StoreTestCase.setUp(self)
+        self.max_backoff = pyprov.wal.MAX_BACKOFF
+        pyprov.wal.MAX_BACKOFF = 0.01
+
+    def tearDown(self):
+        pyprov.wal.MAX_BACKOFF = self.max_backoff
+        StoreTestCase.tearDown(self)
+
+    def logged(self, store, **options):
+        return self.controller(store, wal_dir=self.path('wal'), batch_size=4, **options)
+
+    def wait(self, log, seq):
+        deadline = time.time() + TIMEOUT
+        while log.applied < seq and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertGreaterEqual(log.applied, seq)
+
+    def break_store(self, controller, calls, error):
+        """Let the next calls of 'submit_batch' of the store of a controller raise an error"""
+        store = controller.graph_db
+        submit_batch = store.submit_batch
+        remaining = [calls]
+        def failing(batch):
+            if remaining[0] > 0:
+                remaining[0] -= 1
+                raise error
+            return submit_batch(batch)
+        store.submit_batch = failing
+        return remaining
+
+    def count(self, controller, key, value):
+        return sum(1 for _ in controller.graph_db.iter_nodes(key, value))
+
+    def test_recovery_after_restart(self):
+        for store in STORES:
+            controller = self.logged(store)
+            # the store is down until the log is stopped, so nothing is written
+            self.break_store(controller, 10 ** 6, socket.error('store down'))
+            receipts = controller.ingest.submit_many('general', [(record,) for record in chain(10)])
+            self.assertEqual(receipts, [str(seq) for seq in xrange(1, 11)])
+            self.stop(controller)
+            self.assertEqual(controller.ingest.applied, 0)
+
+            if store == 'sqlite':
+                os.remove(self.path('pyprov.db'))
+            controller = self.logged(store)
+            self.wait(controller.ingest, 10)
+            for i in xrange(11):
+                self.assertEqual(self.count(controller, 'identifier', 'e%d' % i), 1)
+            self.assertEqual(controller.ingest.status('10'), {'receipt':'10', 'status':'written'})
+            self.stop(controller)
+
+            # a completely replayed log isn't replayed again
+            controller = self.logged(store)
+            self.assertEqual(controller.ingest.applied, 10)
+            self.assertEqual(self.count(controller, 'name', 'p0'), 1 if store == 'sqlite' else 0)
+            self.stop(controller)
+            shutil.rmtree(self.path('wal'))
+
+    def test_torn_frame_is_cut_off(self):
+        controller = self.logged('memory')
+        self.break_store(controller, 10 ** 6, socket.error('store down'))
+        controller.ingest.submit_many('general', [(record,) for record in chain(3)])
+        self.stop(controller)
+        segment = [name for name in os.listdir(self.path('wal')) if name.endswith(SEGMENT_SUFFIX)][-1]
+        with open(self.path('wal/' + segment), 'ab') as torn:
+            torn.write('\x00\x00\x01\x00partial')
+
+        controller = self.logged('memory')
+        self.wait(controller.ingest, 3)
+        self.assertEqual(controller.ingest.appended, 3)
+        self.assertEqual(len(list(read_frames(self.path('wal/' + segment)))), 3)
+        self.assertEqual(controller.ingest.submit('general', (process('p3', ['e3'], ['e4']),)), '4')
+        self.wait(controller.ingest, 4)
+        self.assertEqual(self.count(controller, 'identifier', 'e4'), 1)
+
+    def test_outage_is_retried_without_duplicates(self):
+        for store in STORES:
+            controller = self.logged(store, database=self.path('%s.db' % store))
+            remaining = self.break_store(controller, 3, socket.error('store down'))
+            controller.ingest.submit_many('general', [(record,) for record in chain(10)])
+            self.wait(controller.ingest, 10)
+            self.assertEqual(remaining[0], 0)
+            for i in xrange(11):
+                self.assertEqual(self.count(controller, 'identifier', 'e%d' % i), 1)
+            self.assertFalse(os.path.exists(self.path('wal/' + DEAD_LETTER)))
+            self.stop(controller)
+            shutil.rmtree(self.path('wal'))
+
+    def test_only_locked_sqlite_is_retried(self):
+        controller = self.logged('sqlite')
+        remaining = self.break_store(controller, 3, sqlite3.OperationalError('database is locked'))
+        controller.ingest.submit_many('general', [(record,) for record in chain(3)])
+        self.wait(controller.ingest, 3)
+        self.assertEqual(remaining[0], 0)
+        self.assertFalse(os.path.exists(self.path('wal/' + DEAD_LETTER)))
+
+        # a missing table doesn't go away by itself
+        self.break_store(controller, 10 ** 6, sqlite3.OperationalError('no such table: nodes'))
+        controller.ingest.submit('general', (process('p3', ['e3'], ['e4']),))
+        self.wait(controller.ingest, 4)
+        self.assertEqual(len(list(read_frames(self.path('wal/' + DEAD_LETTER)))), 1)
+        self.assertEqual(self.count(controller, 'name', 'p3'), 0)
+
+    def test_rejected_records_are_dead_lettered(self):
+        for store in STORES:
+            controller = self.logged(store, database=self.path('%s.db' % store))
+            records = chain(6)
+            del records[2]['actor']
+            controller.ingest.submit_many('general', [(record,) for record in records])
+            controller.ingest.submit('unknown', ({},))
+            controller.ingest.submit('general', (process('p6', ['e6'], ['e7']),))
+            self.wait(controller.ingest, 8)
+            dead = [payload for payload, _ in read_frames(self.path('wal/' + DEAD_LETTER))]
+            self.assertEqual([payload.split(',')[:2] for payload in dead], [['[3', '"general"'], ['[7', '"unknown"']])
+            # the other records of the batch of the rejected one are written once
+            for i in (0, 1, 3, 4, 5, 6):
+                self.assertEqual(self.count(controller, 'name', 'p%d' % i), 1)
+            self.assertEqual(self.count(controller, 'name', 'p2'), 0)
+            self.stop(controller)
+            shutil.rmtree(self.path('wal'))
+
+    def test_keyword_arguments_are_rejected(self):
+        controller = self.logged('memory')
+        record = process('p0', ['e0'], ['e1'])
+        self.assertRaises(TypeError, controller.server.write_prov, 'general', record, version=2)
+        self.assertEqual(controller.ingest.appended, 0)
+        self.assertEqual(controller.server.write_prov('general', record), '1')
+
+    def test_stopped_log_rejects_records(self):
+        controller = self.logged('memory')
+        log = controller.ingest
+        self.stop(controller)
+        self.assertRaises(QueueFull, log.submit, 'general', (process('p0', ['e0'], ['e1']),))
+        errors = log.submit_many('general', [(record,) for record in chain(2)])
+        self.assertEqual(len(errors), 2)
+        self.assertTrue(all(isinstance(error, QueueFull) for error in errors))
+        self.assertEqual(log.appended, 0)
+
+if __name__ == '__main__':
+    unittest.main()